@@ -1,10 +1,15 @@
+from __future__ import annotations
+
 from dataclasses import dataclass
-from typing import Union
+from typing import TYPE_CHECKING, Dict, Union
 
 from .json_serializable import JsonSerializable
 from .piece import Piece
 from .vector2 import Vector2
 
+if TYPE_CHECKING:
+    from .pack import Pack
+
 
 @dataclass
 class MoveAction(JsonSerializable):
@@ -48,3 +53,18 @@ class CreateAction(JsonSerializable):
 
 
 Action = Union[MoveAction, DestroyAction, CreateAction]
+
+
+def action_from_json(data: dict, packs: Dict[str, Pack]) -> Action:
+    to_pos = Vector2(data['to_pos_row'], data['to_pos_col'])
+
+    if data['type'] == 'move':
+        return MoveAction(Vector2(data['from_pos_row'], data['from_pos_col']), to_pos)
+
+    if data['type'] == 'destroy':
+        return DestroyAction(to_pos)
+
+    if data['type'] == 'create':
+        return CreateAction(Piece.from_json(data['piece'], packs), to_pos)
+
+    raise ValueError(f'Unknown action type {data["type"]}.')
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+from .game import board_to_json
+
+if TYPE_CHECKING:
+    from .game import Game
+
+ARCHIVE_FLUSH_INTERVAL = 1
+ARCHIVE_EVICT_DELAY = 300
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    owner_id TEXT NOT NULL,
+    owner_display_name TEXT NOT NULL,
+    controller_pack_id TEXT NOT NULL,
+    controller_id TEXT NOT NULL,
+    winners TEXT NOT NULL,
+    reason TEXT,
+    finished_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS game_players (
+    game_id TEXT NOT NULL REFERENCES games (id) ON DELETE CASCADE,
+    player_id TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    color INTEGER NOT NULL,
+    PRIMARY KEY (game_id, color)
+);
+CREATE INDEX IF NOT EXISTS games_controller ON games (controller_pack_id, controller_id, finished_at);
+CREATE INDEX IF NOT EXISTS games_finished_at ON games (finished_at);
+CREATE INDEX IF NOT EXISTS game_players_player ON game_players (player_id, game_id);
+'''
+
+
+class Archive:
+    """ SQLite store of finished games, so they can be dropped from memory and still be replayed.
+
+    Like the journal, games are batched in memory and inserted on a timer, and the database is only used from a single
+    worker thread. """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = ARCHIVE_FLUSH_INTERVAL,
+        evict_delay: float = ARCHIVE_EVICT_DELAY,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.evict_delay = evict_delay
+
+        self.pending: Dict[str, dict] = {}
+        # The batch being inserted by the current flush, which is only stored once its transaction commits.
+        self.writing: Dict[str, dict] = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='archive')
+        self.connection: Optional[sqlite3.Connection] = None
+
+        self.executor.submit(self._open).result()
+
+    def _open(self) -> None:
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def add(self, game: Game) -> None:
+        """ Queues a finished game to be stored. """
+
+        snapshot = game.to_snapshot()
+        history = game.game_data.history
+
+        self.pending[game.id] = {
+            'game_id': game.id,
+            'display_name': game.name,
+            'creator': game.owner.id,
+            'creator_display_name': game.owner.display_name,
+            'controller_pack_id': snapshot['controller_pack_id'],
+            'controller_id': snapshot['controller_id'],
+            'options': snapshot['options'],
+            'players': {
+                color.value: {
+                    'id': connection.id,
+                    'display_name': connection.display_name,
+                } for color, connection in game.players.color_to_connection.items()
+            },
+            'winners': snapshot['winners'],
+            'finished_at': time.time(),
+            'start': 0,
+            'length': len(history),
+            'pieces': board_to_json(history[0].board),
+            'states': snapshot['plies'],
+        }
+
+    def is_stored(self, game_id: str) -> bool:
+        """ Returns True if an added game has been committed to the database, and so is safe to drop from memory. """
+
+        return game_id not in self.pending and game_id not in self.writing
+
+    def _insert(self, batch: List[dict]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(
+                    game['game_id'],
+                    game['display_name'],
+                    game['creator'],
+                    game['creator_display_name'],
+                    game['controller_pack_id'],
+                    game['controller_id'],
+                    json.dumps(game['winners']['colors']),
+                    game['winners']['reason'],
+                    game['finished_at'],
+                    json.dumps(game, separators=(',', ':')),
+                ) for game in batch],
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO game_players VALUES (?, ?, ?, ?)',
+                [(
+                    game['game_id'],
+                    player['id'],
+                    player['display_name'],
+                    color,
+                ) for game in batch for color, player in game['players'].items()],
+            )
+
+    def _select(self, game_id: str) -> Optional[dict]:
+        row = self.connection.execute('SELECT data FROM games WHERE id = ?', (game_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, {}
+        self.writing = batch
+
+        try:
+            await asyncio.get_event_loop().run_in_executor(self.executor, self._insert, list(batch.values()))
+        except sqlite3.Error:
+            # Keep the games so they are not evicted before they are stored, and try again on the next flush.
+            self.pending = {**batch, **self.pending}
+            raise
+        finally:
+            self.writing = {}
+
+    async def get(self, game_id: str) -> Optional[dict]:
+        """ Returns the archived game with its metadata, its starting board and every ply, or None if there is none. """
+
+        if game_id in self.pending:
+            return self.pending[game_id]
+        if game_id in self.writing:
+            return self.writing[game_id]
+
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self._select, game_id)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+            except sqlite3.Error as error:
+                print(f'Could not write to the archive: {error}')
+
+    def close(self) -> None:
+        """ Inserts any pending games and closes the database. """
+
+        batch, self.pending = list(self.pending.values()), {}
+        self.executor.submit(self._insert, batch).result()
+        self.executor.submit(self.connection.close).result()
+        self.executor.shutdown()
+
+
+def read_archive(path: str) -> Iterator[dict]:
+    """ Reads every archived game in the order they finished, without loading the whole archive at once. """
+
+    connection = sqlite3.connect(path)
+
+    try:
+        for row in connection.execute('SELECT data FROM games ORDER BY finished_at'):
+            yield json.loads(row[0])
+    finally:
+        connection.close()
@@ -0,0 +1,234 @@
+""" Load test for the websocket server, for comparing server settings on a few standard scenarios.
+
+    python -m chessmaker.benchmark [--clients N] [--rounds N] [--matrix]
+
+Each run starts a server in a child process, configured from the environment like the real server (see main.py), and
+drives it with websocket clients from this process. With --matrix, every entry of VARIANTS is run in turn.
+
+Scenarios:
+    chat    Every client sends messages to the server chat, which are broadcast to everyone. Latency is the time until
+            the sender receives its own message back.
+    play    Clients play fool's mate in pairs, over and over. Latency is the time from sending a move until the mover
+            is told it was applied. """
+
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import argh
+import websockets
+
+BENCHMARK_HOST = '127.0.0.1'
+
+# Settings compared by --matrix, as changes to the environment.
+VARIANTS: Dict[str, Dict[str, str]] = {
+    'default': {},
+    'no-compression': {'WS_COMPRESSION': 'none'},
+    'large-buffers': {'WS_WRITE_LIMIT': str(2 ** 20), 'WS_MAX_QUEUE': '256'},
+    'asyncio-loop': {'UVLOOP': '0'},
+}
+
+FOOLS_MATE = [(6, 5, 5, 5), (1, 4, 3, 4), (6, 6, 4, 6), (0, 3, 4, 7)]
+
+
+class Client:
+    """ A benchmark player, which can wait for the server to send a particular message. """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.waiters: List[Tuple[Callable[[dict], bool], asyncio.Future]] = []
+
+    async def run(self) -> None:
+        try:
+            async for raw_data in self.websocket:
+                message = json.loads(raw_data)
+
+                for waiter in list(self.waiters):
+                    matches, future = waiter
+                    if matches(message) and not future.done():
+                        future.set_result(message)
+                        self.waiters.remove(waiter)
+        except websockets.ConnectionClosed:
+            pass
+
+    def expect(self, matches: Callable[[dict], bool]) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        self.waiters.append((matches, future))
+        return future
+
+    async def send(self, command: str, **parameters) -> None:
+        await self.websocket.send(json.dumps({'command': command, 'parameters': parameters}))
+
+    async def request(self, command: str, matches: Callable[[dict], bool], **parameters) -> Tuple[dict, float]:
+        """ Sends a command and waits for the matching reply. Returns the reply and how long it took. """
+
+        reply = self.expect(matches)
+        start = time.perf_counter()
+        await self.send(command, **parameters)
+
+        return await reply, time.perf_counter() - start
+
+
+def is_command(command: str, **parameters) -> Callable[[dict], bool]:
+    return lambda message: message['command'] == command and all(
+        message['parameters'].get(key, None) == value for key, value in parameters.items()
+    )
+
+
+async def chat(clients: List[Client], rounds: int) -> Tuple[int, List[float]]:
+    latencies: List[float] = []
+
+    async def talk(index: int, client: Client) -> None:
+        for round_number in range(rounds):
+            text = f'{index}:{round_number}'
+            _, latency = await client.request(
+                'send_chat_message',
+                is_command('receive_server_chat_message', text=text),
+                game_id='server',
+                text=text,
+            )
+            latencies.append(latency)
+
+    await asyncio.gather(*(talk(index, client) for index, client in enumerate(clients)))
+
+    # Every message is delivered to every client.
+    return len(clients) * len(clients) * rounds, latencies
+
+
+async def play(clients: List[Client], rounds: int) -> Tuple[int, List[float]]:
+    latencies: List[float] = []
+
+    async def play_pair(white: Client, black: Client) -> None:
+        for round_number in range(rounds):
+            focus, _ = await white.request(
+                'create_game',
+                is_command('focus_game'),
+                name=f'Benchmark {round_number}',
+                controller_pack_id='standard',
+                controller_id='Chess',
+                options={},
+            )
+            game_id = focus['parameters']['game_id']
+
+            for color, client in enumerate([white, black]):
+                await client.request('show_game', is_command('update_game_data', id=game_id), game_id=game_id)
+                joined = is_command('game_changed', game_id=game_id)
+                await client.request('join_game', joined, game_id=game_id, color=color)
+
+            for index, (from_row, from_col, to_row, to_col) in enumerate(FOOLS_MATE):
+                _, latency = await [white, black][index % 2].request(
+                    'plies',
+                    is_command('apply_ply', game_id=game_id),
+                    game_id=game_id,
+                    from_row=from_row,
+                    from_col=from_col,
+                    to_row=to_row,
+                    to_col=to_col,
+                )
+                latencies.append(latency)
+
+            await white.request('delete_game', is_command('game_removed', game_id=game_id), game_id=game_id)
+
+    await asyncio.gather(*(play_pair(clients[index], clients[index + 1]) for index in range(0, len(clients) - 1, 2)))
+
+    return len(latencies), latencies
+
+
+SCENARIOS = {
+    'chat': chat,
+    'play': play,
+}
+
+
+def _serve(port: int, environment: Dict[str, str]) -> None:
+    from .main import install_event_loop, make_server_settings
+    from .pack import load_packs
+    from .server import Server
+
+    os.environ.update(environment)
+    install_event_loop()
+
+    Server(load_packs()).start(port, make_server_settings())
+
+
+def _free_port() -> int:
+    with socket.socket() as server_socket:
+        server_socket.bind((BENCHMARK_HOST, 0))
+        return server_socket.getsockname()[1]
+
+
+async def _connect(port: int, name: str, compression: Optional[str]):
+    # The server may still be starting up.
+    for _ in range(100):
+        try:
+            return await websockets.connect(
+                f'ws://{BENCHMARK_HOST}:{port}/display_name={name}',
+                compression=compression,
+                max_size=None,
+            )
+        except OSError:
+            await asyncio.sleep(0.1)
+
+    raise ConnectionError(f'Could not connect to the benchmark server on port {port}.')
+
+
+async def _run_scenario(port: int, scenario: str, clients: int, rounds: int, compression: Optional[str]) -> dict:
+    sockets = [await _connect(port, f'{scenario}-{index}', compression) for index in range(clients)]
+    players = [Client(websocket) for websocket in sockets]
+    readers = [asyncio.ensure_future(player.run()) for player in players]
+
+    start = time.perf_counter()
+    count, latencies = await SCENARIOS[scenario](players, rounds)
+    elapsed = time.perf_counter() - start
+
+    for websocket in sockets:
+        await websocket.close()
+    await asyncio.gather(*readers)
+
+    latencies.sort()
+    return {
+        'rate': count / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def run_variant(name: str, environment: Dict[str, str], clients: int, rounds: int) -> None:
+    port = _free_port()
+    server = multiprocessing.Process(target=_serve, args=(port, environment), daemon=True)
+    server.start()
+
+    compression = environment.get('WS_COMPRESSION', os.environ.get('WS_COMPRESSION', 'deflate'))
+    compression = None if compression == 'none' else compression
+
+    try:
+        for scenario in SCENARIOS:
+            result = asyncio.get_event_loop().run_until_complete(
+                _run_scenario(port, scenario, clients, rounds, compression)
+            )
+            print(f'{name:<16} {scenario:<6} {result["rate"]:>10.0f}/s {result["p50"]:>9.2f}ms {result["p99"]:>9.2f}ms')
+    finally:
+        server.terminate()
+        server.join()
+
+
+@argh.arg('--clients', help='number of connected clients')
+@argh.arg('--rounds', help='chat messages sent by each client, or games played by each pair')
+@argh.arg('--matrix', help='compare every variant instead of only the settings in the environment')
+def main(clients: int = 20, rounds: int = 20, matrix: bool = False) -> None:
+    """ Measures throughput and latency of the server on the standard scenarios. """
+
+    variants = VARIANTS if matrix else {'environment': {}}
+
+    print(f'{"variant":<16} {"test":<6} {"throughput":>12} {"p50":>11} {"p99":>11}')
+    for name, environment in variants.items():
+        run_variant(name, environment, clients, rounds)
+
+
+if __name__ == '__main__':
+    argh.dispatch_command(main)
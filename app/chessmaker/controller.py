@@ -7,6 +7,7 @@ if TYPE_CHECKING:
     from ply import Ply
     from color import Color
     from options import Option
+    from pack import Pack
 
 from abc import ABC
 
@@ -31,9 +32,69 @@ class Controller(ABC):
     def get_plies(self, color: Color, from_pos: Vector2, to_pos: Vector2) -> Iterable[Ply]:
         return self.game.board[from_pos].get_plies(from_pos, to_pos, self.game.game_data)
 
+    def get_destination_candidates(self, color: Color, from_pos: Vector2) -> Iterable[Vector2]:
+        """ Returns the positions the piece at `from_pos` might be able to move to, which `get_legal_destinations`
+        then checks with `get_plies`.
+
+        By default this is every other position on the board. Controllers can narrow it down if they know where their
+        pieces can go, as long as every position `get_plies` allows is still included. """
+
+        for row in range(self.board_size.row):
+            for col in range(self.board_size.col):
+                to_pos = Vector2(row, col)
+                if to_pos != from_pos:
+                    yield to_pos
+
+    def get_legal_destinations(self, color: Color, from_pos: Vector2) -> Dict[Vector2, List[Ply]]:
+        """ Returns every position the piece at `from_pos` can move to, along with the plies that move it there. """
+
+        from .ply import NoMovesError
+
+        result = {}
+
+        for to_pos in self.get_destination_candidates(color, from_pos):
+            try:
+                plies = list(self.get_plies(color, from_pos, to_pos))
+            except NoMovesError:
+                continue
+
+            if plies:
+                result[to_pos] = plies
+
+        return result
+
     # noinspection PyMethodMayBeStatic
     def get_inventory_plies(self, color: Color, piece: Piece, pos: Vector2) -> Iterable[Ply]:
         return []
 
     def after_ply(self) -> None:
         pass
+
+    # Set by controllers whose `evaluate_ply` is slow enough that it should not hold up the server's event loop.
+    evaluate_in_executor = False
+
+    # noinspection PyMethodMayBeStatic
+    def evaluate_ply(self) -> Any:
+        """ Does any slow analysis of the board after a ply, such as looking for checkmate, and returns the result.
+
+        When `evaluate_in_executor` is set and the game has an executor, this runs in a worker process on a
+        `GamePosition`, while the real game holds back new plies. The position only has the board, the plies back to
+        the last one of each color and the controller's state. Changes made to it are lost, and the result must be
+        picklable. It is passed to `after_evaluation` on the event loop. """
+
+        return None
+
+    def after_evaluation(self, result: Any) -> None:
+        pass
+
+    # noinspection PyMethodMayBeStatic
+    def get_state(self) -> dict:
+        """ Returns any state kept by the controller that cannot be rebuilt by replaying the game's plies.
+
+        This is saved in game snapshots and given back to `set_state` when the game is restored. Controllers that change
+        it outside of a ply call `Game.controller_state_changed`, so the change is also kept in the journal. """
+
+        return {}
+
+    def set_state(self, state: dict, packs: Dict[str, Pack]) -> None:
+        pass
@@ -1,3 +1,7 @@
+# Image of decorators that are not drawn, such as walls, which only hide the tiles under them.
+NO_DRAW_IMAGE = 'NO DRAW'
+
+
 class Decorator:
     name = ''
     image = ''
@@ -2,20 +2,28 @@ from __future__ import annotations
 
 import asyncio
 import sys
+import time
 import traceback
 from asyncio import Task
-from copy import deepcopy
+from collections import deque
+from concurrent.futures import Executor
+from copy import copy
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, List, Optional, Set, Dict, Type, Union, Callable, Awaitable
+from itertools import product
+from typing import (
+    TYPE_CHECKING, Any, List, Optional, Set, Deque, Dict, Iterable, Tuple, Type, Union, Callable, Awaitable,
+)
 from uuid import uuid4
 
 from .color import Color
 from .controller import Controller
 from .decorator import Decorator
 from .game_subscribers import GameSubscribers
+from .inbox import Inbox
 from .info_elements import InfoButton, InfoElement
 from .inventory_item import InventoryItem
 from .json_serializable import JsonSerializable
+from .metrics import game_inboxes, game_tasks
 from .pack_util import get_pack
 from .piece import Piece
 from .actions import MoveAction, DestroyAction, CreateAction
@@ -24,6 +32,65 @@ from .vector2 import Vector2
 
 if TYPE_CHECKING:
     from network import Network, Connection
+    from journal import Journal
+    from pack import Pack
+
+CHAT_HISTORY_SIZE = 500
+CHAT_PAGE_SIZE = 50
+HISTORY_PAGE_SIZE = 100
+
+# Tasks a game can run with `Game.run_async` at the same time.
+MAX_GAME_TASKS = 16
+
+
+def board_to_json(board: Dict[Vector2, Piece]) -> List[dict]:
+    return [{
+        'row': position.row,
+        'col': position.col,
+        'pack_id': get_pack(piece),  # TODO: Change to use piece.to_json().
+        'piece_type_id': piece.__class__.__name__,
+        'color': piece.color.value,
+        'direction': piece.direction.value,
+    } for position, piece in board.items()]
+
+
+def restore_piece(data: dict, packs: Dict[str, Pack]) -> Piece:
+    piece = Piece.from_json(data['piece'], packs)
+    piece.moves = data['moves']
+
+    return piece
+
+
+def board_after(board: Dict[Vector2, Piece], ply: Optional[Ply]) -> Dict[Vector2, Piece]:
+    """ Returns a copy of `board` with the actions of `ply` applied to it. """
+
+    # Pieces are shared between states and only copied when they are changed, which makes long games much cheaper
+    # to replay than copying the whole board every ply.
+    board = board.copy()
+
+    if ply is not None:
+        for action in ply.actions:
+            if isinstance(action, MoveAction):
+                piece = copy(board.pop(action.from_pos))
+                piece.moves += 1
+                board[action.to_pos] = piece
+
+            elif isinstance(action, DestroyAction):
+                board.pop(action.pos)
+
+            elif isinstance(action, CreateAction):
+                board[action.pos] = action.piece.copy()
+
+    return board
+
+
+def decorator_layers_to_json(decorator_layers: Dict[int, Dict[Vector2, Decorator]]) -> Dict[int, List[dict]]:
+    return {layer: [{
+        'row': position.row,
+        'col': position.col,
+        'pack_id': get_pack(decorator),
+        'decorator_type_id': decorator.__class__.__name__,
+    } for position, decorator in decorators.items()] for layer, decorators in decorator_layers.items()}
 
 
 class ColorConnections:
@@ -70,11 +137,25 @@ class GameData:
 
 
 @dataclass
-class GameState:
-    board: Dict[Vector2, Piece]
+class GameState(JsonSerializable):
+    # None for states older than a restored snapshot, until `Game.get_state_board` rebuilds them.
+    board: Optional[Dict[Vector2, Piece]]
     ply_color: Optional[Color]
     ply: Optional[Ply]
 
+    def to_json(self) -> Union[dict, list]:
+        return {
+            'color': None if self.ply_color is None else self.ply_color.value,
+            'ply': None if self.ply is None else self.ply.to_json(),
+        }
+
+
+@dataclass
+class PlyOffer:
+    state_version: int
+    plies: Dict[str, Ply]
+    regenerate: Callable[[], List[Ply]]
+
 
 @dataclass
 class WinnerData(JsonSerializable):
@@ -90,16 +171,105 @@ class WinnerData(JsonSerializable):
 
 @dataclass
 class ChatMessage(JsonSerializable):
+    index: int
     sender: Connection
     text: str
 
     def to_json(self) -> Union[dict, list]:
         return {
+            'index': self.index,
             'sender_id': self.sender.id,
             'text': self.text,
         }
 
 
+class ChatHistory:
+    """ Keeps the most recent chat messages, dropping the oldest ones once `max_size` is reached.
+
+    Every message is numbered so clients can page backwards through the history that is still kept. """
+
+    def __init__(self, max_size: int = CHAT_HISTORY_SIZE):
+        self.messages: Deque[ChatMessage] = deque(maxlen=max_size)
+        self.next_index = 0
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, sender: Connection, text: str) -> ChatMessage:
+        message = ChatMessage(self.next_index, sender, text)
+        self.messages.append(message)
+        self.next_index += 1
+
+        return message
+
+    def page(self, before: Optional[int] = None, size: int = CHAT_PAGE_SIZE) -> List[ChatMessage]:
+        """ Returns up to `size` messages that were sent before the message numbered `before`, oldest first.
+
+        If `before` is not given, the most recent messages are returned. """
+
+        if not self.messages:
+            return []
+
+        end = len(self.messages) if before is None else max(0, min(before - self.messages[0].index, len(self.messages)))
+        start = max(0, end - size)
+
+        return [self.messages[index] for index in range(start, end)]
+
+
+class GamePosition:
+    """ The parts of a game that `Controller.evaluate_ply` looks at: the board, the plies back to the last one of each
+    color, which is as far back as rules such as en passant look, and the controller's state.
+
+    This is sent to a process of the server's evaluation pool instead of the whole game, so evaluating a ply costs the
+    same however long the game has gone on. The controller is created again on the other side. """
+
+    def __init__(self, game: Game):
+        history = game.game_data.history
+        colors = set(game.controller.colors)
+
+        start = len(history)
+        while start > 0 and colors:
+            start -= 1
+            colors.discard(history[start].ply_color)
+
+        states = [GameState(None, state.ply_color, state.ply) for state in history[start:]]
+        states[-1].board = game.board
+
+        self.controller_type = type(game.controller)
+        self.controller_options = game.controller_options
+        self.controller_state = game.controller.get_state()
+        self.game_data = GameData(states, game.game_data.board_size, game.game_data.colors)
+
+    def evaluate(self, packs: Dict[str, Pack]) -> Any:
+        self.controller = self.controller_type(self, self.controller_options)
+
+        if self.controller_state:
+            self.controller.set_state(self.controller_state, packs)
+
+        return self.controller.evaluate_ply()
+
+    def next_state(self, color: Optional[Color], ply: Optional[Ply]) -> GameState:
+        return GameState(board_after(self.board, ply), color, ply)
+
+    # Restoring the controller's state may update what players are shown, which is not needed to evaluate a ply.
+
+    def update_decorator_layers(self, decorator_layers: Dict[int, Dict[Vector2, Decorator]]) -> None:
+        pass
+
+    def update_public_info(self, info_elements: List[InfoElement]) -> None:
+        pass
+
+    def update_private_info(self, color: Color, info_elements: List[InfoElement]) -> None:
+        pass
+
+    def update_inventory(self, color: Color, inventory_items: List[InventoryItem]) -> None:
+        pass
+
+    @property
+    def board(self) -> Dict[Vector2, Piece]:
+        return self.game_data.board
+
+
 class Game:
 
     def __init__(
@@ -110,26 +280,55 @@ class Game:
         controller_options: dict,
         network: Network,
         subscribers: GameSubscribers,
+        chat_history_size: int = CHAT_HISTORY_SIZE,
+        journal: Optional[Journal] = None,
+        game_id: Optional[str] = None,
+        on_finish: Optional[Callable[[Game], None]] = None,
+        evaluation_executor: Optional[Executor] = None,
     ):
         self.name = name
         self.owner = owner
         self.network = network
         self.subscribers = subscribers
+        self.journal = journal
+        self.on_finish = on_finish
+        self.evaluation_executor = evaluation_executor
+        self.controller_options = controller_options
 
-        self.id = str(uuid4())
+        self.id = str(uuid4()) if game_id is None else game_id
         self.players = ColorConnections()
         self.controller = controller_type(self, controller_options)
         self.game_data = GameData([], self.controller.board_size, self.controller.colors)
-        self.tasks: List[Task] = []
+        # Tasks started with `run_async` that are still running.
+        self.tasks: Set[Task] = set()
+
+        # Commands for the game, and changes made by its async tasks, are processed one at a time from here.
+        self.inbox = Inbox(game_inboxes.get(self.controller.name))
 
         self.decorator_layers: Dict[int, Dict[Vector2, Decorator]] = {}
         self.private_info_elements: Dict[Color, List[InfoElement]] = {color: [] for color in self.controller.colors}
         self.public_info_elements: List[InfoElement] = []
         self.inventories: Dict[Color, List[InventoryItem]] = {color: [] for color in self.controller.colors}
         self.winners: Optional[WinnerData] = None
-        self.chat_messages: List[ChatMessage] = []
+        self.chat_messages = ChatHistory(chat_history_size)
 
         self.active = True
+        self._metadata: Optional[dict] = None
+        self._public_data: Optional[dict] = None
+
+        # Incremented every time the board changes so stale offers can be detected.
+        self.state_version = 0
+        self.offers: Dict[Connection, PlyOffer] = {}
+
+        # Legal destinations of each piece for the current state, cleared whenever the board changes.
+        self.legal_destinations: Dict[Tuple[Optional[Color], Vector2], Dict[Vector2, List[Ply]]] = {}
+
+        # While the controller evaluates a ply in the executor, the game is locked and new plies wait here.
+        self.evaluation: Optional[asyncio.Future] = None
+        self.deferred_plies: Deque[Tuple[Optional[Color], Optional[Ply]]] = deque()
+
+        if self.journal is not None:
+            self.journal.game_created(self, controller_options)
 
         self._init_game()
 
@@ -149,46 +348,42 @@ class Game:
             self.active = False
 
     def get_metadata(self) -> dict:
-        return {
-            'display_name': self.name,
-            'creator': self.owner.id,
-            'controller_pack_id': get_pack(self.controller),
-            'controller_id': self.controller.name,
-            'players': {
-                color.value: connection.id for color, connection in self.players.color_to_connection.items()
-            },
-        }
+        # Metadata only changes when players join or leave, so it is cached between those events.
+        if self._metadata is None:
+            self._metadata = {
+                'display_name': self.name,
+                'creator': self.owner.id,
+                'controller_pack_id': get_pack(self.controller),
+                'controller_id': self.controller.name,
+                'players': {
+                    color.value: connection.id for color, connection in self.players.color_to_connection.items()
+                },
+            }
+
+        return self._metadata
+
+    def get_public_data(self) -> dict:
+        # The public part of the game data is the same for every subscriber, so it is built once and cached until the
+        # game changes.
+        if self._public_data is None:
+            self._public_data = {
+                'id': self.id,
+                'pieces': board_to_json(self.board),
+                'decorators': decorator_layers_to_json(self.decorator_layers),
+                'public_info_elements': [info_element.to_json() for info_element in self.public_info_elements],
+                'chat_messages': [chat_message.to_json() for chat_message in self.chat_messages.page()],
+                'winners': None if self.winners is None else self.winners.to_json(),
+            }
+
+        return self._public_data
 
     def get_full_data(self, connection: Connection) -> dict:
         color = self.players.get_color(connection)
         inventory_items = self.inventories.get(color, [])
 
-        pieces = [{
-            'row': position.row,
-            'col': position.col,
-            'pack_id': get_pack(piece),  # TODO: Change to use piece.to_json().
-            'piece_type_id': piece.__class__.__name__,
-            'color': piece.color.value,
-            'direction': piece.direction.value,
-        } for position, piece in self.board.items()]
-        decorators = {layer: [{
-            'row': position.row,
-            'col': position.col,
-            'pack_id': get_pack(decorator),
-            'decorator_type_id': decorator.__class__.__name__,
-        } for position, decorator in decorators.items()] for layer, decorators in self.decorator_layers.items()}
-        public_info_elements = [info_element.to_json() for info_element in self.public_info_elements]
-        chat_messages = [chat_message.to_json() for chat_message in self.chat_messages]
-        inventory = [inventory_item.to_json() for inventory_item in inventory_items]
-
         result = {
-            'id': self.id,
-            'pieces': pieces,
-            'decorators': decorators,
-            'public_info_elements': public_info_elements,
-            'inventory_items': inventory,
-            'chat_messages': chat_messages,
-            'winners': None if self.winners is None else self.winners.to_json(),
+            **self.get_public_data(),
+            'inventory_items': [inventory_item.to_json() for inventory_item in inventory_items],
         }
 
         if color is not None:
@@ -198,6 +393,80 @@ class Game:
 
         return result
 
+    def get_history_page(self, start: int, size: int = HISTORY_PAGE_SIZE) -> dict:
+        """ Serializes a window of the game's history for replaying it.
+
+        Only the board of the state at `start` is included. The states after it are described by the plies that led to
+        them, so clients can step through the window by applying plies in order. """
+
+        history = self.game_data.history
+        start = max(0, min(start, len(history) - 1))
+        end = min(start + 1 + max(0, min(size, HISTORY_PAGE_SIZE)), len(history))
+
+        return {
+            'game_id': self.id,
+            'start': start,
+            'length': len(history),
+            'pieces': board_to_json(self.get_state_board(start)),
+            'states': [history[index].to_json() for index in range(start + 1, end)],
+        }
+
+    def to_snapshot(self) -> dict:
+        """ Serializes everything needed to restore the game after a restart.
+
+        Only the current board is stored, along with the plies that led to it for replays. Anything else the controller
+        keeps is saved with `Controller.get_state`. """
+
+        return {
+            'game_id': self.id,
+            'name': self.name,
+            'owner_id': self.owner.id,
+            'owner_display_name': self.owner.display_name,
+            'controller_pack_id': get_pack(self.controller),
+            'controller_id': self.controller.name,
+            'options': self.controller_options,
+            'plies': [state.to_json() for state in self.game_data.history[1:]],
+            'board': [{
+                'row': position.row,
+                'col': position.col,
+                'piece': piece.to_json(),
+                'moves': piece.moves,
+            } for position, piece in self.board.items()],
+            'controller_state': self.controller.get_state(),
+            'winners': None if self.winners is None else self.winners.to_json(),
+        }
+
+    def restore(self, snapshot: dict, packs: Dict[str, Pack]) -> None:
+        """ Brings a newly created game to the state saved in `snapshot`.
+
+        The current board is taken from the snapshot, so the plies before it are not applied again. The boards of
+        older states are only rebuilt if they are asked for. The controller's state is restored separately too. """
+
+        for state in snapshot['plies']:
+            color = None if state['color'] is None else Color(state['color'])
+            ply = None if state['ply'] is None else Ply.from_json(state['ply'], packs)
+            self.game_data.history.append(GameState(None, color, ply))
+
+        if 'board' in snapshot:
+            self.game_data.history[-1].board = {
+                Vector2(data['row'], data['col']): restore_piece(data, packs) for data in snapshot['board']
+            }
+        else:
+            # Snapshots from before boards were stored have to be replayed.
+            self.get_state_board(-1)
+
+        self.state_version = len(snapshot['plies'])
+
+        if snapshot['controller_state'] is not None:
+            self.controller.set_state(snapshot['controller_state'], packs)
+
+        if snapshot['winners'] is not None:
+            winners = snapshot['winners']
+            self.winners = WinnerData([Color(color) for color in winners['colors']], winners['reason'])
+            self.shutdown()
+
+        self._public_data = None
+
     def get_available_colors(self) -> Set[Color]:
         colors = set(self.controller.colors.copy())
         taken_colors = set(self.players.color_to_connection.keys())
@@ -210,12 +479,14 @@ class Game:
 
     def update_decorator_layers(self, decorator_layers: Dict[int, Dict[Vector2, Decorator]]) -> None:
         self.decorator_layers.update(decorator_layers)
+        self._public_data = None
 
         for connection in self.subscribers.get_connections(self):
             connection.update_decorators(self, decorator_layers)
 
     def update_public_info(self, info_elements: List[InfoElement]) -> None:
         self.public_info_elements = info_elements
+        self._public_data = None
 
         for connection in self.subscribers.get_connections(self):
             connection.update_info_elements(self, info_elements, True)
@@ -236,7 +507,8 @@ class Game:
 
     def send_error(self, color: Color, message: str) -> None:
         connection = self.players.get_connection(color)
-        connection.show_error(message)
+        if connection is not None:
+            connection.show_error(message)
 
     def get_plies(self, connection: Connection, from_pos: Vector2, to_pos: Vector2) -> List[Ply]:
         if (
@@ -257,43 +529,174 @@ class Game:
             self.send_error(color, str(error))
             return []
 
+    def get_legal_destinations(self, connection: Connection, from_pos: Vector2) -> Dict[Vector2, List[Ply]]:
+        if self.winners is not None or from_pos not in self.board:
+            # Client must have sent stale data.
+            return {}
+
+        color = self.players.get_color(connection)
+        key = (color, from_pos)
+
+        if key not in self.legal_destinations:
+            self.legal_destinations[key] = self.controller.get_legal_destinations(color, from_pos)
+
+        return self.legal_destinations[key]
+
     def next_state(self, color: Optional[Color], ply: Optional[Ply]) -> GameState:
-        board = deepcopy(self.board)
+        return GameState(board_after(self.board, ply), color, ply)
 
-        if ply is not None:
-            for action in ply.actions:
-                if isinstance(action, MoveAction):
-                    board[action.from_pos].moves += 1
-                    board[action.to_pos] = board.pop(action.from_pos)
+    def get_state_board(self, index: int) -> Dict[Vector2, Piece]:
+        """ Returns the board of a state in the history, rebuilding it from the nearest earlier board if the state was
+        restored from a snapshot without one. """
 
-                elif isinstance(action, DestroyAction):
-                    board.pop(action.pos)
+        history = self.game_data.history
+        index %= len(history)
 
-                elif isinstance(action, CreateAction):
-                    board[action.pos] = action.piece.copy()
+        start = index
+        while history[start].board is None:
+            start -= 1
 
-        return GameState(board, color, ply)
+        for current in range(start + 1, index + 1):
+            history[current].board = board_after(history[current - 1].board, history[current].ply)
+
+        return history[index].board
+
+    def apply_ply(self, color: Optional[Color], ply: Optional[Ply], notify: bool = True) -> None:
+        if self.evaluation is not None:
+            # The controller is still looking at the last ply, so apply this one once it is done.
+            self.deferred_plies.append((color, ply))
+            return
 
-    def apply_ply(self, color: Optional[Color], ply: Optional[Ply]) -> None:
         self.game_data.history.append(self.next_state(color, ply))
+        self.state_version += 1
+        self.legal_destinations.clear()
+        self._public_data = None
+
+        if self.journal is not None:
+            self.journal.ply_applied(self, color, ply)
 
         # TODO: Investigate why ply is optional.
-        if ply:
+        if ply and notify:
             for connection in self.subscribers.get_connections(self):
                 connection.apply_ply(self, ply)
 
         self.controller.after_ply()
+        self._evaluate_ply()
+
+    def _evaluate_ply(self) -> None:
+        if not self.controller.evaluate_in_executor or self.evaluation_executor is None or not self.active:
+            self.controller.after_evaluation(self.controller.evaluate_ply())
+            return
+
+        from .recovery import evaluate_position
+
+        # The evaluation gets a copy of the position, so it can run in another process without touching the game.
+        self.evaluation = asyncio.get_event_loop().run_in_executor(
+            self.evaluation_executor,
+            evaluate_position,
+            GamePosition(self),
+        )
+        self.evaluation.add_done_callback(self._finish_evaluation)
+
+    async def wait_for_evaluation(self) -> None:
+        """ Waits until the controller has finished evaluating the last ply, and any plies deferred behind it. """
+
+        while self.evaluation is not None:
+            await asyncio.wait([self.evaluation])
+
+    def _finish_evaluation(self, evaluation: asyncio.Future) -> None:
+        self.evaluation = None
+
+        if not self.active:
+            # The game was deleted while it was being evaluated.
+            self.deferred_plies.clear()
+            return
+
+        # noinspection PyBroadException
+        try:
+            self.controller.after_evaluation(evaluation.result())
+        except Exception:
+            print(traceback.format_exc(), file=sys.stderr)
+
+        # Plies that arrived in the meantime are applied in order, until one of them needs evaluating again. Each was
+        # checked against the board before the plies ahead of it, so it is checked again now.
+        while self.deferred_plies and self.evaluation is None and self.winners is None:
+            color, ply = self.deferred_plies.popleft()
+
+            if color is not None and ply is not None and not self.is_legal(color, ply):
+                self.send_error(color, 'That move is no longer possible.')
+                continue
+
+            self.apply_ply(color, ply)
+
+        if self.winners is not None:
+            self.deferred_plies.clear()
+
+    def is_legal(self, color: Color, ply: Ply) -> bool:
+        """ Checks whether the controller would offer `ply` to `color` in the game's current state.
+
+        Plies do not say which squares the player picked, so every pair of a position the ply moves or removes a piece
+        from and a position it moves or creates a piece at is tried, as well as dropping every piece in the
+        inventory. """
+
+        data = ply.to_json()
+
+        from_positions = [action.from_pos for action in ply.actions if isinstance(action, MoveAction)]
+        from_positions += [action.pos for action in ply.actions if isinstance(action, DestroyAction)]
+        to_positions = [action.to_pos for action in ply.actions if isinstance(action, MoveAction)]
+        to_positions += [action.pos for action in ply.actions if isinstance(action, CreateAction)]
+
+        for from_pos, to_pos in product(from_positions, to_positions):
+            if from_pos in self.board and from_pos != to_pos:
+                try:
+                    if any(other.to_json() == data for other in self.controller.get_plies(color, from_pos, to_pos)):
+                        return True
+                except NoMovesError:
+                    pass
+
+        for action in ply.actions:
+            if isinstance(action, CreateAction):
+                for item in self.inventories[color]:
+                    plies = self.controller.get_inventory_plies(color, item.piece, action.pos)
+                    if any(other.to_json() == data for other in plies):
+                        return True
+
+        return False
+
+    def apply_plies(self, plies: Iterable[Tuple[Optional[Color], Optional[Ply]]]) -> None:
+        """ Applies many plies at once, sending subscribers the final state instead of every ply. """
+
+        for color, ply in plies:
+            self.apply_ply(color, ply, False)
+
+        self.send_update_to_subscribers()
 
     def undo_ply(self) -> None:
         self.game_data.history.pop()
+        self.get_state_board(-1)
+        self.state_version += 1
+        self.legal_destinations.clear()
+        self._public_data = None
+
+        if self.journal is not None:
+            self.journal.ply_undone(self)
+
         self.send_update_to_subscribers()
 
+    def controller_state_changed(self) -> None:
+        """ Records the controller's state, for controllers whose state changes without a ply, so the change is not lost
+        when the game is replayed from the journal. """
+
+        if self.journal is not None:
+            self.journal.state_changed(self)
+
     def apply_or_offer_choices(
         self,
         from_pos: Vector2,
         to_pos: Vector2,
         plies: List[Ply],
         connection: Connection,
+        regenerate: Callable[[], List[Ply]],
     ) -> None:
         if len(plies) == 0:
             # No plies available.
@@ -304,11 +707,35 @@ class Game:
             self.apply_ply(self.players.get_color(connection), plies[0])
             return
 
-        # There are multiple plies available, so present the user with a choice.
-        connection.offer_plies(from_pos, to_pos, plies)
+        # There are multiple plies available, so present the user with a choice. The offer is remembered so the choice
+        # can be applied without generating the plies again.
+        offer = PlyOffer(self.state_version, {uuid4().hex[:8]: ply for ply in plies}, regenerate)
+        self.offers[connection] = offer
+        connection.offer_plies(from_pos, to_pos, offer.plies)
+
+    def take_offered_ply(self, connection: Connection, ply_id: str) -> Optional[Ply]:
+        offer = self.offers.get(connection, None)
+        if offer is None or ply_id not in offer.plies:
+            return None
+
+        del self.offers[connection]
+        ply = offer.plies[ply_id]
+
+        if offer.state_version == self.state_version:
+            return ply
+
+        # The board has changed since the plies were offered, so make sure the ply is still available.
+        ply_data = ply.to_json()
+        return next((other_ply for other_ply in offer.regenerate() if other_ply.to_json() == ply_data), None)
 
     def add_player(self, connection: Connection, color: Color) -> None:
         self.players.set(color, connection)
+        self._metadata = None
+
+    def remove_player(self, connection: Connection) -> None:
+        self.players.remove_connection(connection)
+        self.offers.pop(connection, None)
+        self._metadata = None
 
     def click_button(self, connection: Connection, button_id: str) -> None:
         color = self.players.get_color(connection)
@@ -324,21 +751,63 @@ class Game:
 
     def winner(self, colors: List[Color], reason: str = None) -> None:
         self.winners = WinnerData(colors, reason)
+        self._public_data = None
 
         for connection in self.subscribers.get_connections(self):
             connection.update_winners(self)
 
         self.shutdown()
 
-    def run_async(self, function: Callable[[], Awaitable]):
+        if self.on_finish is not None:
+            self.on_finish(self)
+
+    def add_chat_message(self, sender: Connection, text: str) -> None:
+        message = self.chat_messages.add(sender, text)
+        self._public_data = None
+
+        for connection in self.subscribers.get_connections(self):
+            connection.receive_game_chat_message(self, message)
+
+    def run_async(self, function: Callable[[], Awaitable]) -> Optional[Task]:
+        """ Runs `function` in a task that is cancelled when the game ends. Returns None if the task was not started,
+        because the game has ended or already has `MAX_GAME_TASKS` running.
+
+        The task runs alongside the game's inbox, so it should make its changes to the game with `inbox.call` to keep
+        them in order with the plies players send. """
+
+        stats = game_tasks.get(self.controller.name)
+
+        if not self.active:
+            return None
+
+        if len(self.tasks) >= MAX_GAME_TASKS:
+            stats.rejected += 1
+            print(f'Game {self.id} already has {len(self.tasks)} tasks running, not starting another.', file=sys.stderr)
+            return None
+
         async def do_function():
             # noinspection PyBroadException
             try:
                 await function()
             except Exception:
+                stats.failed += 1
                 print(traceback.format_exc(), file=sys.stderr)
 
-        self.tasks.append(asyncio.create_task(do_function()))
+        start = time.perf_counter()
+
+        def done(finished: Task) -> None:
+            self.tasks.discard(finished)
+            stats.runtime.add(time.perf_counter() - start)
+
+            if finished.cancelled():
+                stats.cancelled += 1
+
+        task = asyncio.ensure_future(do_function())
+        task.add_done_callback(done)
+        self.tasks.add(task)
+        stats.started += 1
+
+        return task
 
     @property
     def board(self) -> Dict[Vector2, Piece]:
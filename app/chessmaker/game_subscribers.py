@@ -41,12 +41,62 @@ class GameSubscribers:
         return self.connection_to_game.get(connection, None)
 
     def remove_game(self, game: Game) -> None:
-        for connection in self.game_to_connections[game]:
+        for connection in self.game_to_connections.pop(game, set()):
             del self.connection_to_game[connection]
 
-        del self.game_to_connections[game]
-
     def remove_connection(self, connection: Connection) -> None:
         self.game_to_connections[self.connection_to_game[connection]].remove(connection)
 
         del self.connection_to_game[connection]
+
+
+class PlayerGames:
+
+    def __init__(self):
+        self.connection_to_games: Dict[Connection, Set[Game]] = {}
+
+    def add(self, connection: Connection, game: Game) -> None:
+        if connection in self.connection_to_games:
+            self.connection_to_games[connection].add(game)
+        else:
+            self.connection_to_games[connection] = {game}
+
+    def remove(self, connection: Connection, game: Game) -> None:
+        games = self.connection_to_games[connection]
+        games.remove(game)
+
+        if not games:
+            del self.connection_to_games[connection]
+
+    def get_games(self, connection: Connection) -> Set[Game]:
+        return self.connection_to_games.get(connection, set())
+
+    def remove_game(self, game: Game) -> None:
+        for connection in game.players.connection_to_color:
+            self.remove(connection, game)
+
+    def remove_connection(self, connection: Connection) -> Set[Game]:
+        return self.connection_to_games.pop(connection, set())
+
+
+class OwnedGames:
+    """ The ids of the games each connection owns, whether they are in memory or hibernated. """
+
+    def __init__(self):
+        self.connection_to_game_ids: Dict[Connection, Set[str]] = {}
+
+    def add(self, connection: Connection, game_id: str) -> None:
+        if connection in self.connection_to_game_ids:
+            self.connection_to_game_ids[connection].add(game_id)
+        else:
+            self.connection_to_game_ids[connection] = {game_id}
+
+    def remove(self, connection: Connection, game_id: str) -> None:
+        game_ids = self.connection_to_game_ids[connection]
+        game_ids.remove(game_id)
+
+        if not game_ids:
+            del self.connection_to_game_ids[connection]
+
+    def owns_any(self, connection: Connection) -> bool:
+        return connection in self.connection_to_game_ids
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .game import ChatHistory, ChatMessage
+
+if TYPE_CHECKING:
+    from .game import Game
+    from .network import Connection
+
+HIBERNATION_IDLE_TIMEOUT = 15 * 60
+
+
+class HibernatedGame:
+    """ What is kept in memory of a hibernated game: its lobby entry, and its owner so it can still be deleted. """
+
+    def __init__(self, game_id: str, metadata: dict, owner: Connection, record: dict):
+        self.id = game_id
+        self.metadata = metadata
+        self.owner = owner
+
+        # The saved game, until it has been written to disk.
+        self.record: Optional[dict] = record
+        # Set while the game is being read back, so commands that arrive meanwhile wait for the same game.
+        self.waking: Optional[asyncio.Future] = None
+
+    def get_metadata(self) -> dict:
+        return self.metadata
+
+
+def chat_to_json(chat_messages: ChatHistory) -> dict:
+    return {
+        'next_index': chat_messages.next_index,
+        'messages': [[message.index, message.sender.id, message.text] for message in chat_messages.messages],
+    }
+
+
+def restore_chat(chat_messages: ChatHistory, data: dict, get_sender: Callable[[str], Connection]) -> None:
+    chat_messages.messages.extend(
+        ChatMessage(index, get_sender(sender_id), text) for index, sender_id, text in data['messages']
+    )
+    chat_messages.next_index = data['next_index']
+
+
+class Hibernation:
+    """ Keeps idle games on disk instead of in memory, one file per game.
+
+    Like the journal, files are only touched from a single worker thread, so a game's file is always written before it
+    is read back or removed. The files only hold games for the running server, so they are removed on startup. Anything
+    else in the directory, such as the directories of sharded workers, is left alone. """
+
+    def __init__(self, directory: str, idle_timeout: float = HIBERNATION_IDLE_TIMEOUT):
+        self.directory = directory
+        self.idle_timeout = idle_timeout
+
+        self.hibernated = 0
+        self.woken = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hibernation')
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+
+            if name.endswith(('.json', '.json.tmp')) and os.path.isfile(path):
+                os.remove(path)
+
+    def path(self, game_id: str) -> str:
+        return os.path.join(self.directory, f'{game_id}.json')
+
+    @staticmethod
+    def to_record(game: Game) -> dict:
+        """ Serializes a game with its chat, which `Game.to_snapshot` leaves out. """
+
+        return {
+            'snapshot': game.to_snapshot(),
+            'chat_messages': chat_to_json(game.chat_messages),
+        }
+
+    def _write(self, game_id: str, record: dict) -> None:
+        path = self.path(game_id)
+
+        with open(path + '.tmp', 'w') as file:
+            json.dump(record, file, separators=(',', ':'))
+
+        os.replace(path + '.tmp', path)
+
+    def _read(self, game_id: str) -> dict:
+        with open(self.path(game_id)) as file:
+            return json.load(file)
+
+    def _remove(self, game_id: str) -> None:
+        try:
+            os.remove(self.path(game_id))
+        except FileNotFoundError:
+            pass
+
+    async def save(self, game: HibernatedGame) -> None:
+        """ Writes a hibernated game to disk, after which only its lobby entry is kept in memory. """
+
+        await asyncio.get_event_loop().run_in_executor(self.executor, self._write, game.id, game.record)
+        game.record = None
+
+    async def load(self, game: HibernatedGame) -> dict:
+        if game.record is not None:
+            return game.record
+
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self._read, game.id)
+
+    def discard(self, game: HibernatedGame) -> None:
+        self.executor.submit(self._remove, game.id)
+
+    def close(self) -> None:
+        self.executor.shutdown()
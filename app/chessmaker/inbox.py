@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import sys
+import time
+import traceback
+from typing import Any, Callable, Optional, Tuple
+
+from .metrics import InboxStats
+
+
+class Inbox:
+    """ Queue of work for one game, which is done in order by the inbox's own task.
+
+    Every game's commands go through its inbox, so a game never sees two commands at once and a slow game only holds up
+    its own queue. The task yields to the event loop between items, so busy games take turns. """
+
+    def __init__(self, stats: Optional[InboxStats] = None):
+        self.queue: Optional[asyncio.Queue[Tuple[Callable[[], Any], Optional[asyncio.Future], float]]] = None
+        self.task: Optional[asyncio.Task] = None
+        # Shared by the inboxes of every game with the same controller.
+        self.stats = InboxStats() if stats is None else stats
+
+    def __len__(self):
+        return 0 if self.queue is None else self.queue.qsize()
+
+    def post(self, function: Callable[[], Any]) -> None:
+        """ Queues `function` to be called after everything already in the inbox. Errors are logged.
+
+        If `function` returns an awaitable, the inbox waits for it before moving on to the next item. """
+
+        self._put(function, None)
+
+    async def call(self, function: Callable[[], Any]) -> Any:
+        """ Queues `function` and waits for its result, so async work can change the game in order with commands. """
+
+        future = asyncio.get_event_loop().create_future()
+        self._put(function, future)
+
+        return await future
+
+    def _put(self, function: Callable[[], Any], future: Optional[asyncio.Future]) -> None:
+        # The queue and task are made on first use, since games can be created before the event loop is running.
+        if self.task is None:
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self.run())
+
+        self.queue.put_nowait((function, future, time.perf_counter()))
+
+    async def run(self) -> None:
+        while True:
+            function, future, queued_at = await self.queue.get()
+            start = time.perf_counter()
+
+            # noinspection PyBroadException
+            try:
+                result = function()
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as error:
+                if future is None:
+                    print(traceback.format_exc(), file=sys.stderr)
+                elif not future.cancelled():
+                    future.set_exception(error)
+            else:
+                if future is not None and not future.cancelled():
+                    future.set_result(result)
+
+            end = time.perf_counter()
+            self.stats.processed += 1
+            self.stats.wait_time.add(start - queued_at)
+            self.stats.run_time.add(end - start)
+
+            # Let other games have a turn.
+            await asyncio.sleep(0)
+
+    def close(self) -> None:
+        """ Stops the task and drops anything still queued. """
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+            while not self.queue.empty():
+                _, future, _ = self.queue.get_nowait()
+                self.stats.dropped += 1
+
+                if future is not None:
+                    future.cancel()
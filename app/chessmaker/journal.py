@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import TYPE_CHECKING, Collection, Dict, List, Optional, Set, Tuple
+from zlib import crc32
+
+from .pack_util import get_pack
+
+if TYPE_CHECKING:
+    from .color import Color
+    from .game import Game
+    from .ply import Ply
+
+JOURNAL_FLUSH_INTERVAL = 0.05
+JOURNAL_SHARDS = 4
+JOURNAL_SNAPSHOT_INTERVAL = 600
+
+
+class Durability(Enum):
+    # Records are handed to the operating system, but may be lost if the machine crashes.
+    WRITE = 'write'
+    # Records are written to disk with fsync before each group commit completes.
+    FSYNC = 'fsync'
+
+
+def shard_of(game_id: str, shards: int) -> int:
+    return crc32(game_id.encode()) % shards
+
+
+class Journal:
+    """ Append-only record of every game's creation and the plies applied to it.
+
+    Records are kept in memory and group-committed to one file per shard on a timer. All file access happens on a
+    single worker thread, so recording a ply never blocks the event loop and records are written in order. """
+
+    def __init__(
+        self,
+        directory: str,
+        shards: int = JOURNAL_SHARDS,
+        flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+        durability: Durability = Durability.FSYNC,
+        snapshot_interval: float = JOURNAL_SNAPSHOT_INTERVAL,
+    ):
+        self.directory = directory
+        self.shards = shards
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.snapshot_interval = snapshot_interval
+
+        self.pending: Dict[int, List[str]] = {}
+        # Incremented by every compaction, after which records from before it must not be written again.
+        self.compactions = 0
+        # While snapshots are being taken for a compaction, the games that have one, and their records since.
+        self.snapshotted: Optional[Set[str]] = None
+        self.since_snapshots: Dict[int, List[str]] = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='journal')
+
+        os.makedirs(directory, exist_ok=True)
+
+    def shard_path(self, shard: int) -> str:
+        return os.path.join(self.directory, f'shard-{shard}.jsonl')
+
+    def snapshot_path(self, shard: int) -> str:
+        return os.path.join(self.directory, f'snapshot-{shard}.jsonl')
+
+    def _append(self, game_id: str, record: dict) -> None:
+        shard = shard_of(game_id, self.shards)
+        line = json.dumps({'game_id': game_id, **record}, separators=(',', ':'))
+
+        if shard in self.pending:
+            self.pending[shard].append(line)
+        else:
+            self.pending[shard] = [line]
+
+        if self.snapshotted is not None and game_id in self.snapshotted:
+            self.since_snapshots.setdefault(shard, []).append(line)
+
+    def game_created(self, game: Game, controller_options: dict) -> None:
+        self._append(game.id, {
+            'type': 'create',
+            'name': game.name,
+            'owner_id': game.owner.id,
+            'owner_display_name': game.owner.display_name,
+            'controller_pack_id': get_pack(game.controller),
+            'controller_id': game.controller.name,
+            'options': controller_options,
+        })
+
+    def ply_applied(self, game: Game, color: Optional[Color], ply: Optional[Ply]) -> None:
+        self._append(game.id, {
+            'type': 'ply',
+            'color': None if color is None else color.value,
+            'ply': None if ply is None else ply.to_json(),
+        })
+
+    def ply_undone(self, game: Game) -> None:
+        self._append(game.id, {
+            'type': 'undo',
+        })
+
+    def state_changed(self, game: Game) -> None:
+        self._append(game.id, {
+            'type': 'state',
+            'state': game.controller.get_state(),
+        })
+
+    def game_deleted(self, game: Game) -> None:
+        self._append(game.id, {
+            'type': 'delete',
+        })
+
+    def _write(self, batch: Dict[int, List[str]]) -> None:
+        """ Appends each shard's lines to its file, removing the shard from `batch` once its lines are written. """
+
+        for shard in list(batch):
+            _append(self.shard_path(shard), '\n'.join(batch[shard]) + '\n', self.durability == Durability.FSYNC)
+            del batch[shard]
+
+    def _requeue(self, batch: Dict[int, List[str]]) -> None:
+        # The records go ahead of anything recorded since, so each game's records stay in order.
+        for shard, lines in batch.items():
+            self.pending[shard] = lines + self.pending.get(shard, [])
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, {}
+        compactions = self.compactions
+
+        try:
+            await asyncio.get_event_loop().run_in_executor(self.executor, self._write, batch)
+        except OSError:
+            # Keep the shards that were not written and try again on the next flush, unless a compaction has already
+            # put them in a snapshot.
+            if compactions == self.compactions:
+                self._requeue(batch)
+
+            raise
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            try:
+                await self.flush()
+            except OSError as error:
+                print(f'Could not write to the journal: {error}')
+
+    def prepare_compaction(self) -> None:
+        """ Starts taking the snapshots for a compaction, which can be done a few games at a time with `take_snapshot`.
+        Records of games made after their snapshot was taken are kept by `compact`. """
+
+        self.snapshotted = set()
+        self.since_snapshots = {}
+
+    def take_snapshot(self, game: Game) -> dict:
+        if self.snapshotted is not None:
+            self.snapshotted.add(game.id)
+
+        return game.to_snapshot()
+
+    def _write_snapshots(
+        self,
+        snapshots: Dict[int, List[str]],
+        carried: Collection[str],
+        carried_pending: Dict[int, List[str]],
+    ) -> None:
+        for shard in range(self.shards):
+            path = self.snapshot_path(shard)
+            lines = snapshots.get(shard, [])
+            records = []
+
+            if carried:
+                lines = lines + [line for line, data in _read_raw_lines(path) if data['game_id'] in carried]
+                records = [
+                    line for line, record in _read_raw_lines(self.shard_path(shard)) if record['game_id'] in carried
+                ]
+
+            records += carried_pending.get(shard, [])
+
+            # Write the new snapshot next to the old one and swap them, so a crash never leaves a partial snapshot.
+            _replace(path, lines)
+
+            # Everything else in the journal is now part of the snapshot.
+            _replace(self.shard_path(shard), records)
+
+    async def compact(self, snapshots: List[dict], carried: Collection[str] = ()) -> None:
+        """ Replaces the snapshots with `snapshots` and empties the journal.
+
+        `snapshots` must include every change recorded so far, except to the games in `carried`, whose snapshots and
+        records are kept as they are. This is for games that are not in memory, which cannot have changed since they
+        were last recorded. Changes recorded after a snapshot was taken with `take_snapshot` are kept too. Other
+        pending records are dropped rather than written, and the rewrite is queued after any earlier writes, so no
+        record can end up both in a snapshot and the journal. """
+
+        lines: Dict[int, List[str]] = {}
+        for snapshot in snapshots:
+            shard = shard_of(snapshot['game_id'], self.shards)
+            lines.setdefault(shard, []).append(json.dumps(snapshot, separators=(',', ':')))
+
+        # A game that was put away after its snapshot was taken has nothing older worth keeping.
+        carried = set(carried).difference(snapshot['game_id'] for snapshot in snapshots)
+
+        carried_pending: Dict[int, List[str]] = {}
+        if carried:
+            for shard, pending in self.pending.items():
+                carried_pending[shard] = [line for line in pending if json.loads(line)['game_id'] in carried]
+
+        for shard, since_snapshot in self.since_snapshots.items():
+            carried_pending[shard] = carried_pending.get(shard, []) + since_snapshot
+
+        self.snapshotted = None
+        self.since_snapshots = {}
+        self.pending = {}
+        self.compactions += 1
+        await asyncio.get_event_loop().run_in_executor(
+            self.executor,
+            self._write_snapshots,
+            lines,
+            carried,
+            carried_pending,
+        )
+
+    def read(self) -> Tuple[Dict[str, dict], Dict[str, List[dict]]]:
+        """ Reads the latest snapshot of every game and the records written since, grouped by game id. """
+
+        snapshots: Dict[str, dict] = {}
+        records: Dict[str, List[dict]] = {}
+
+        for shard in range(self.shards):
+            for snapshot in _read_lines(self.snapshot_path(shard)):
+                snapshots[snapshot['game_id']] = snapshot
+
+            for record in _read_lines(self.shard_path(shard)):
+                records.setdefault(record['game_id'], []).append(record)
+
+        return snapshots, records
+
+    def sync(self) -> None:
+        """ Writes any pending records, blocking until they are written. For use outside the event loop. """
+
+        batch, self.pending = self.pending, {}
+
+        try:
+            self.executor.submit(self._write, batch).result()
+        except OSError:
+            self._requeue(batch)
+            raise
+
+    def close(self) -> None:
+        """ Writes any pending records and waits for the worker thread to finish. """
+
+        self.sync()
+        self.executor.shutdown()
+
+
+def _append(path: str, text: str, fsync: bool) -> None:
+    """ Appends `text` to a file. If it cannot all be written, the file is cut back to where it was, so writing it again
+    later does not leave part of a record in front of it. """
+
+    data = text.encode()
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    try:
+        start = os.lseek(fd, 0, os.SEEK_END)
+
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        except OSError:
+            os.ftruncate(fd, start)
+            raise
+
+        # Once the records are written they are kept, even if syncing them fails, so they are never written twice.
+        if fsync:
+            try:
+                os.fsync(fd)
+            except OSError as error:
+                print(f'Could not sync {path}: {error}')
+    finally:
+        os.close(fd)
+
+
+def _replace(path: str, lines: List[str]) -> None:
+    with open(path + '.tmp', 'w') as file:
+        file.write(''.join(line + '\n' for line in lines))
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(path + '.tmp', path)
+
+
+def _read_raw_lines(path: str) -> List[Tuple[str, dict]]:
+    """ Reads the records in a file, each with its line as written. """
+
+    if not os.path.exists(path):
+        return []
+
+    result = []
+    with open(path) as file:
+        for line in file:
+            try:
+                result.append((line.rstrip('\n'), json.loads(line)))
+            except ValueError:
+                # The server stopped part of the way through writing this record.
+                print(f'Skipping incomplete record in {path}')
+
+    return result
+
+
+def _read_lines(path: str) -> List[dict]:
+    return [record for line, record in _read_raw_lines(path)]
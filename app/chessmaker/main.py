@@ -1,7 +1,17 @@
+import asyncio
 import os
+from typing import Optional
 
+from .archive import Archive, ARCHIVE_FLUSH_INTERVAL, ARCHIVE_EVICT_DELAY
+from .game import ChatHistory, CHAT_HISTORY_SIZE
+from .hibernation import Hibernation, HIBERNATION_IDLE_TIMEOUT
+from .journal import Journal, Durability, JOURNAL_SHARDS, JOURNAL_FLUSH_INTERVAL, JOURNAL_SNAPSHOT_INTERVAL
+from .network import ServerSettings, LOG_SAMPLE_RATE
 from .pack import load_packs
-from .server import Server
+from .prometheus import MetricsServer, METRICS_HOST
+from .server import Server, EvaluationPool, EVALUATION_WORKERS, TEST_GAME_IDLE_TIMEOUT, SERVER_CHAT_HISTORY_SIZE
+from .shard import FrontServer
+from .watchdog import Watchdog, WATCHDOG_THRESHOLD, WATCHDOG_LOG_INTERVAL
 
 
 def splash() -> None:
@@ -12,7 +22,161 @@ def splash() -> None:
     print(r"                                                 ")
 
 
+def make_journal(name: Optional[str] = None) -> Optional[Journal]:
+    """ Creates the journal configured by the environment. Each `name` gets its own journal inside the directory. """
+
+    if 'JOURNAL_DIRECTORY' not in os.environ:
+        return None
+
+    directory = os.environ['JOURNAL_DIRECTORY']
+
+    return Journal(
+        directory if name is None else os.path.join(directory, name),
+        int(os.environ.get('JOURNAL_SHARDS', JOURNAL_SHARDS)),
+        float(os.environ.get('JOURNAL_FLUSH_INTERVAL', JOURNAL_FLUSH_INTERVAL)),
+        Durability(os.environ.get('JOURNAL_DURABILITY', Durability.FSYNC.value)),
+        float(os.environ.get('JOURNAL_SNAPSHOT_INTERVAL', JOURNAL_SNAPSHOT_INTERVAL)),
+    )
+
+
+def make_archive(name: Optional[str] = None) -> Optional[Archive]:
+    """ Creates the archive configured by the environment. Each `name` gets its own database next to the path. """
+
+    if 'ARCHIVE_PATH' not in os.environ:
+        return None
+
+    path = os.environ['ARCHIVE_PATH']
+    root, extension = os.path.splitext(path)
+
+    return Archive(
+        path if name is None else f'{root}-{name}{extension}',
+        float(os.environ.get('ARCHIVE_FLUSH_INTERVAL', ARCHIVE_FLUSH_INTERVAL)),
+        float(os.environ.get('ARCHIVE_EVICT_DELAY', ARCHIVE_EVICT_DELAY)),
+    )
+
+
+def make_hibernation(name: Optional[str] = None) -> Optional[Hibernation]:
+    """ Creates the store for idle games configured by the environment. Each `name` gets its own directory in it. """
+
+    if 'HIBERNATION_DIRECTORY' not in os.environ:
+        return None
+
+    directory = os.environ['HIBERNATION_DIRECTORY']
+
+    return Hibernation(
+        directory if name is None else os.path.join(directory, name),
+        float(os.environ.get('HIBERNATION_IDLE_TIMEOUT', HIBERNATION_IDLE_TIMEOUT)),
+    )
+
+
+def make_watchdog() -> Optional[Watchdog]:
+    """ Creates the event loop watchdog configured by the environment. A threshold of 0 turns it off. """
+
+    threshold = float(os.environ.get('WATCHDOG_THRESHOLD', WATCHDOG_THRESHOLD))
+    if threshold <= 0:
+        return None
+
+    return Watchdog(threshold, log_interval=float(os.environ.get('WATCHDOG_LOG_INTERVAL', WATCHDOG_LOG_INTERVAL)))
+
+
+def install_event_loop() -> None:
+    """ Switches asyncio to uvloop if it is installed, unless UVLOOP is set to 0. """
+
+    if os.environ.get('UVLOOP', '1') == '0':
+        return
+
+    try:
+        import uvloop
+    except ImportError:
+        return
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+def _optional_number(name: str, default, parse):
+    # Lets settings that can be turned off be set to "none".
+    value = os.environ.get(name, None)
+    if value is None:
+        return default
+
+    return None if value.lower() == 'none' else parse(value)
+
+
+def make_server_settings() -> ServerSettings:
+    """ Reads the websocket server's settings from the environment, falling back to websockets' defaults. """
+
+    defaults = ServerSettings()
+    compression = os.environ.get('WS_COMPRESSION', defaults.compression)
+
+    return ServerSettings(
+        compression=None if compression == 'none' else compression,
+        max_size=_optional_number('WS_MAX_SIZE', defaults.max_size, int),
+        max_queue=_optional_number('WS_MAX_QUEUE', defaults.max_queue, int),
+        ping_interval=_optional_number('WS_PING_INTERVAL', defaults.ping_interval, float),
+        ping_timeout=_optional_number('WS_PING_TIMEOUT', defaults.ping_timeout, float),
+        write_limit=int(os.environ.get('WS_WRITE_LIMIT', defaults.write_limit)),
+    )
+
+
+def make_metrics_server(offset: int = 0) -> Optional[MetricsServer]:
+    """ Creates the metrics endpoint if METRICS_PORT is set. Shard workers pass an `offset` to get their own port. """
+
+    if 'METRICS_PORT' not in os.environ:
+        return None
+
+    return MetricsServer(int(os.environ['METRICS_PORT']) + offset, os.environ.get('METRICS_HOST', METRICS_HOST))
+
+
+def configure_metrics(server: Server) -> None:
+    """ Applies the environment's logging and metrics options to a server's network. """
+
+    server.network.log_sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', LOG_SAMPLE_RATE))
+    server.network.metrics.by_controller = os.environ.get('METRICS_BY_CONTROLLER', '0') == '1'
+
+
+def configure_test_games(server: Server) -> None:
+    """ Applies the environment's idle timeout for players' test games. A timeout of 0 keeps them forever. """
+
+    server.test_game_idle_timeout = float(os.environ.get('TEST_GAME_IDLE_TIMEOUT', TEST_GAME_IDLE_TIMEOUT))
+
+
+def configure_chat_history(server: Server) -> None:
+    """ Applies the environment's limits on how many chat messages each game and the server chat keep. """
+
+    server.chat_history_size = int(os.environ.get('CHAT_HISTORY_SIZE', CHAT_HISTORY_SIZE))
+    server.chat_messages = ChatHistory(int(os.environ.get('SERVER_CHAT_HISTORY_SIZE', SERVER_CHAT_HISTORY_SIZE)))
+
+
+def configure_evaluation(server: Server) -> None:
+    """ Applies the environment's size for the process pool that slow evaluations run in. 0 runs them on the event
+    loop instead. """
+
+    if server.evaluation_executor is None:
+        # The sharded front end has no games of its own to evaluate.
+        return
+
+    workers = int(os.environ.get('EVALUATION_WORKERS', EVALUATION_WORKERS))
+    server.evaluation_executor = EvaluationPool(workers) if workers > 0 else None
+
+
 if __name__ == '__main__':
     splash()
-    server = Server(load_packs())
-    server.start(int(os.environ['PORT']))
+    install_event_loop()
+
+    if int(os.environ.get('SHARD_WORKERS', 0)) > 0:
+        server = FrontServer(load_packs(), int(os.environ['SHARD_WORKERS']), make_watchdog(), make_metrics_server())
+    else:
+        server = Server(
+            load_packs(),
+            make_journal(),
+            make_archive(),
+            make_watchdog(),
+            make_metrics_server(),
+            make_hibernation(),
+        )
+
+    configure_metrics(server)
+    configure_test_games(server)
+    configure_chat_history(server)
+    configure_evaluation(server)
+    server.start(int(os.environ['PORT']), make_server_settings())
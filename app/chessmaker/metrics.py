@@ -0,0 +1,178 @@
+""" Counts and timings of the commands the server handles, and of the tasks and inboxes of games. """
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds of the histogram buckets, in seconds and bytes.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, float('inf'))
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, float('inf'))
+TASK_BUCKETS = (0.01, 0.1, 1, 10, 60, 600, float('inf'))
+
+
+@dataclass
+class RunningCommand:
+    command: str
+    game_id: Optional[str] = None
+    controller: Optional[str] = None
+    connection_id: Optional[str] = None
+
+    received_at: float = field(default_factory=time.perf_counter)
+    # Size of the message the command came in, in bytes.
+    size: int = 0
+    errors: int = 0
+    # Set while the command waits to be handled later, such as on a game's inbox.
+    deferred: bool = False
+    # Whether the command is written to the log once it has been handled.
+    sampled: bool = False
+
+    def __str__(self):
+        result = self.command
+
+        if self.game_id is not None:
+            result += f' in game {self.game_id}'
+        if self.controller is not None:
+            result += f' ({self.controller})'
+
+        return result
+
+
+@dataclass
+class Traffic:
+    messages_sent: int = 0
+    messages_received: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+
+# Totals for every websocket in the process.
+traffic = Traffic()
+
+# The command the event loop is handling, and the last one it finished.
+_running: Optional[RunningCommand] = None
+_last: Optional[RunningCommand] = None
+
+
+@contextmanager
+def running(command: RunningCommand) -> Iterator[RunningCommand]:
+    """ Marks the command being handled, so errors and stalls during it are blamed on it. """
+
+    global _running, _last
+
+    previous = _running
+    _running = command
+
+    try:
+        yield command
+    finally:
+        _last = command
+        _running = previous
+
+
+def current() -> Optional[RunningCommand]:
+    return _running
+
+
+def last() -> Optional[RunningCommand]:
+    return _last
+
+
+class Histogram:
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts: List[int] = [0] * len(buckets)
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[next(index for index, bound in enumerate(self.buckets) if value <= bound)] += 1
+        self.total += value
+
+
+class CommandStats:
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+
+
+class CommandMetrics:
+    """ Per-command counts, error counts, latency and message size histograms.
+
+    Commands are also broken down by controller when `by_controller` is set, which multiplies the number of series. """
+
+    def __init__(self, by_controller: bool = False):
+        self.by_controller = by_controller
+        self.commands: Dict[Tuple[str, Optional[str]], CommandStats] = {}
+
+    def record(self, command: RunningCommand) -> None:
+        key = (command.command, command.controller if self.by_controller else None)
+
+        stats = self.commands.get(key, None)
+        if stats is None:
+            stats = self.commands[key] = CommandStats()
+
+        stats.count += 1
+        stats.errors += command.errors > 0
+        stats.latency.add(time.perf_counter() - command.received_at)
+        stats.size.add(command.size)
+
+
+class TaskStats:
+
+    def __init__(self):
+        self.started = 0
+        self.failed = 0
+        self.cancelled = 0
+        # Tasks that were not started because their game already had too many.
+        self.rejected = 0
+        self.runtime = Histogram(TASK_BUCKETS)
+
+
+class TaskMetrics:
+    """ Counts and runtimes of the tasks games run with `Game.run_async`, by controller. """
+
+    def __init__(self):
+        self.controllers: Dict[str, TaskStats] = {}
+
+    def get(self, controller: str) -> TaskStats:
+        stats = self.controllers.get(controller, None)
+        if stats is None:
+            stats = self.controllers[controller] = TaskStats()
+
+        return stats
+
+
+class InboxStats:
+
+    def __init__(self):
+        self.processed = 0
+        # Work that was still queued when its game was closed.
+        self.dropped = 0
+        # How long work waited in the queue, and how long it ran for.
+        self.wait_time = Histogram(LATENCY_BUCKETS)
+        self.run_time = Histogram(LATENCY_BUCKETS)
+
+
+class InboxMetrics:
+    """ Counts and timings of the work done by games' inboxes, by controller. """
+
+    def __init__(self):
+        self.controllers: Dict[str, InboxStats] = {}
+
+    def get(self, controller: str) -> InboxStats:
+        stats = self.controllers.get(controller, None)
+        if stats is None:
+            stats = self.controllers[controller] = InboxStats()
+
+        return stats
+
+
+# Totals for every game in the process.
+game_tasks = TaskMetrics()
+game_inboxes = InboxMetrics()
@@ -3,34 +3,66 @@ from __future__ import annotations
 import asyncio
 import inspect
 import json
+import random
+import signal
+import time
+from http import HTTPStatus
 from urllib.parse import parse_qs
 
 import websockets
 
 from uuid import uuid4
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
+from hashlib import sha256
 from itertools import islice
-from typing import TYPE_CHECKING, Dict, Callable, Set, Iterable, Union, Tuple, List
+from typing import TYPE_CHECKING, Dict, Callable, Set, Iterable, Iterator, Union, Tuple, List, Optional
 
 from .decorator import Decorator
 from .info_elements import InfoElement
 from .inventory_item import InventoryItem
 from .json_serializable import JsonSerializable
+from .metrics import CommandMetrics, RunningCommand, current, running, traffic
 from .pack_util import get_pack
 from .ply import Ply
 from .vector2 import Vector2
 
 if TYPE_CHECKING:
-    from .game import Game
-    from .pack import Pack
+    from .game import Game, ChatMessage
+    from .pack import PackCatalog
+    from .prometheus import Exposition
 
+HttpResponse = Tuple[HTTPStatus, List[Tuple[str, str]], bytes]
 
-def parse_path(path: str) -> Tuple[str]:
+# How long an inactive player is remembered (in seconds) so they can reconnect with the same identity.
+INACTIVE_CONNECTION_TTL = 60 * 60
+
+# Fraction of commands written to the log. Logging every message slows the server down under load.
+LOG_SAMPLE_RATE = 0.0
+
+
+@dataclass
+class ServerSettings:
+    """ Options passed to the websocket server. The defaults are the ones websockets uses. """
+
+    # Per-message compression, either 'deflate' or None.
+    compression: Optional[str] = 'deflate'
+    # Largest message accepted from a client, in bytes. None means no limit.
+    max_size: Optional[int] = 2 ** 20
+    # Number of received messages buffered for each connection before reading pauses.
+    max_queue: Optional[int] = 32
+    # Seconds between keepalive pings, and how long to wait for the pong. None turns keepalive off.
+    ping_interval: Optional[float] = 20
+    ping_timeout: Optional[float] = 20
+    # Size of each connection's write buffer, in bytes, before sending waits for it to drain.
+    write_limit: int = 2 ** 16
+
+
+def parse_path(path: str) -> Tuple[str, Optional[str]]:
     # Remove the leading slash.
     path = path[1:]
 
     query = parse_qs(path)
-    return query['display_name'][0],
+    return query['display_name'][0], query.get('pack_hash', [None])[0]
 
 
 class Connection(JsonSerializable):
@@ -41,17 +73,39 @@ class Connection(JsonSerializable):
         self.display_name = 'Player'
         self.active = True
 
+        # The hash of the pack catalog the client already has cached, if any.
+        self.pack_hash: Optional[str] = None
+
+        # Messages handed to the socket that it has not finished sending.
+        self.pending_sends = 0
+
     def __str__(self):
         return f'Connection({self.id}, {self.display_name})'
 
     def __hash__(self):
-        return hash(self.socket)
+        # The socket is replaced when a player reconnects, so it cannot be used here.
+        return hash(self.id)
+
+    def _send(self, message: str) -> None:
+        # Messages are JSON, which is ASCII, so their length is their size in bytes.
+        traffic.messages_sent += 1
+        traffic.bytes_sent += len(message)
+
+        self.pending_sends += 1
+        asyncio.create_task(self.socket.send(message)).add_done_callback(self._sent)
+
+    def _sent(self, task: asyncio.Task) -> None:
+        self.pending_sends -= 1
+
+    def write_buffer_size(self) -> int:
+        transport = getattr(self.socket, 'transport', None)
+        return 0 if transport is None else transport.get_write_buffer_size()
 
     def _run(self, command: str, parameters: dict) -> None:
-        asyncio.create_task(self.socket.send(json.dumps({
+        self._send(json.dumps({
             'command': command,
             'parameters': parameters,
-        })))
+        }))
 
     def set_player(self) -> None:
         self._run('set_player', {
@@ -63,24 +117,79 @@ class Connection(JsonSerializable):
             'game_id': game.id,
         })
 
-    def update_pack_data(self, packs: Dict[str, Pack]) -> None:
-        self._run('update_pack_data', {
-            'packs': {name: pack.to_json() for name, pack in packs.items()},
-        })
+    def update_pack_data(self, pack_catalog: PackCatalog) -> None:
+        if self.pack_hash == pack_catalog.hash:
+            # The client's cached copy is up to date, so only confirm it.
+            self._run('update_pack_data', {
+                'pack_hash': pack_catalog.hash,
+            })
+            return
 
-    def update_players(self, players: Iterable[Connection]) -> None:
+        self._send(pack_catalog.message)
+        self.pack_hash = pack_catalog.hash
+
+    def update_players(self, players: Iterable[Connection], version: int) -> None:
         self._run('update_players', {
+            'version': version,
             'players': {connection.id: connection.to_json() for connection in players},
         })
 
+    def player_joined(self, player: Connection, version: int) -> None:
+        self._run('player_joined', {
+            'version': version,
+            'player_id': player.id,
+            'player': player.to_json(),
+        })
+
+    def player_changed(self, player: Connection, version: int) -> None:
+        self._run('player_changed', {
+            'version': version,
+            'player_id': player.id,
+            'player': player.to_json(),
+        })
+
+    def player_left(self, player: Connection, version: int) -> None:
+        self._run('player_left', {
+            'version': version,
+            'player_id': player.id,
+        })
+
     def update_game_metadata(self, games: Dict[str, Game]) -> None:
         self._run('update_game_metadata', {
             'game_metadata': {game_id: game.get_metadata() for game_id, game in games.items()},
         })
 
+    def game_added(self, game: Game) -> None:
+        self._run('game_added', {
+            'game_id': game.id,
+            'game_metadata': game.get_metadata(),
+        })
+
+    def game_changed(self, game: Game) -> None:
+        self._run('game_changed', {
+            'game_id': game.id,
+            'game_metadata': game.get_metadata(),
+        })
+
+    def games_changed(self, games: Iterable[Game]) -> None:
+        self._run('games_changed', {
+            'game_metadata': {game.id: game.get_metadata() for game in games},
+        })
+
+    def game_removed(self, game: Game) -> None:
+        self._run('game_removed', {
+            'game_id': game.id,
+        })
+
     def update_game_data(self, game: Game) -> None:
         self._run('update_game_data', game.get_full_data(self))
 
+    def game_history(self, game: Game, start: int, size: int) -> None:
+        self._run('game_history', game.get_history_page(start, size))
+
+    def archived_game(self, data: dict) -> None:
+        self._run('archived_game', data)
+
     def update_decorators(self, game: Game, decorator_layers: Dict[int, Dict[Vector2, Decorator]]) -> None:
         self._run('update_decorators', {
             'game_id': game.id,
@@ -119,32 +228,52 @@ class Connection(JsonSerializable):
             **game.winners.to_json(),
         })
 
-    def receive_game_chat_message(self, game: Game, sender: Connection, text: str) -> None:
+    def receive_game_chat_message(self, game: Game, message: ChatMessage) -> None:
         self._run('receive_game_chat_message', {
             'game_id': game.id,
-            'sender_id': sender.id,
-            'text': text,
+            **message.to_json(),
         })
 
-    def receive_server_chat_message(self, text: str, sender: Connection, game: Game = None) -> None:
+    def receive_server_chat_message(self, message: ChatMessage, game: Game = None) -> None:
         self._run('receive_server_chat_message', {
-            'text': text,
-            'sender_id': sender.id,
+            **message.to_json(),
             'game_id': game.id if game else 'server',
         })
 
+    def chat_history(self, game_id: str, messages: List[ChatMessage]) -> None:
+        self._run('chat_history', {
+            'game_id': game_id,
+            'chat_messages': [message.to_json() for message in messages],
+        })
+
     def show_error(self, message: str) -> None:
+        command = current()
+        if command is not None:
+            command.errors += 1
+
         self._run('show_error', {
             'message': message,
         })
 
-    def offer_plies(self, from_pos: Vector2, to_pos: Vector2, plies: Iterable[Ply]) -> None:
+    def offer_plies(self, from_pos: Vector2, to_pos: Vector2, plies: Dict[str, Ply]) -> None:
         self._run('offer_plies', {
             'from_row': from_pos.row,
             'from_col': from_pos.col,
             'to_row': to_pos.row,
             'to_col': to_pos.col,
-            'plies': [ply.to_json() for ply in plies],
+            'plies': [{'id': ply_id, **ply.to_json()} for ply_id, ply in plies.items()],
+        })
+
+    def legal_destinations(self, game: Game, from_pos: Vector2, destinations: Dict[Vector2, List[Ply]]) -> None:
+        self._run('legal_destinations', {
+            'game_id': game.id,
+            'from_row': from_pos.row,
+            'from_col': from_pos.col,
+            'destinations': [{
+                'row': to_pos.row,
+                'col': to_pos.col,
+                'ply_names': [ply.name for ply in plies],
+            } for to_pos, plies in destinations.items()],
         })
 
     def to_json(self) -> Union[dict, list]:
@@ -154,25 +283,108 @@ class Connection(JsonSerializable):
         }
 
 
+class ConnectionRegistry:
+
+    def __init__(self):
+        self.by_id: Dict[str, Connection] = {}
+        self.by_display_name: Dict[str, Connection] = {}
+        self.active: Set[Connection] = set()
+
+        # Maps each inactive connection to the time it disconnected, oldest first.
+        self.inactive_since: Dict[Connection, float] = {}
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self) -> Iterator[Connection]:
+        return iter(self.by_id.values())
+
+    def __contains__(self, item):
+        return isinstance(item, Connection) and self.by_id.get(item.id) is item
+
+    def add(self, connection: Connection) -> None:
+        self.by_id[connection.id] = connection
+        self.by_display_name[connection.display_name] = connection
+        self.set_active(connection, connection.active)
+
+    def remove(self, connection: Connection) -> None:
+        del self.by_id[connection.id]
+        del self.by_display_name[connection.display_name]
+        self.active.discard(connection)
+        self.inactive_since.pop(connection, None)
+
+    def get(self, connection_id: str) -> Optional[Connection]:
+        return self.by_id.get(connection_id, None)
+
+    def get_by_display_name(self, display_name: str) -> Optional[Connection]:
+        return self.by_display_name.get(display_name, None)
+
+    def set_active(self, connection: Connection, active: bool) -> None:
+        connection.active = active
+
+        if active:
+            self.active.add(connection)
+            self.inactive_since.pop(connection, None)
+        else:
+            self.active.discard(connection)
+            self.inactive_since[connection] = time.monotonic()
+
+    def expired(self, ttl: float) -> List[Connection]:
+        expiry = time.monotonic() - ttl
+        result = []
+
+        for connection, inactive_since in self.inactive_since.items():
+            if inactive_since > expiry:
+                break
+
+            result.append(connection)
+
+        return result
+
+
 @dataclass
 class Command:
     function: Callable
     parameters: Dict[str, type]
 
 
+@dataclass
+class Resource:
+    body: bytes
+    content_type: str
+    etag: str
+
+
 class Network:
 
-    def __init__(self, on_connect: Callable[[Connection], None], on_disconnect: Callable[[Connection], None]):
+    def __init__(
+        self,
+        on_connect: Callable[[Connection], None],
+        on_disconnect: Callable[[Connection], None],
+        can_expire: Callable[[Connection], bool] = lambda connection: True,
+        on_expire: Callable[[Connection], None] = lambda connection: None,
+        inactive_ttl: float = INACTIVE_CONNECTION_TTL,
+        log_sample_rate: float = LOG_SAMPLE_RATE,
+    ):
         self.on_connect = on_connect
         self.on_disconnect = on_disconnect
+        # Whether an inactive connection may be forgotten. Owners of games are kept so they can still delete them.
+        self.can_expire = can_expire
+        # Called after an inactive connection has been forgotten.
+        self.on_expire = on_expire
+        self.inactive_ttl = inactive_ttl
+        self.log_sample_rate = log_sample_rate
+        self.metrics = CommandMetrics()
 
         self.commands: Dict[str, Command] = {}
+        self.resources: Dict[str, Resource] = {}
 
-        self.connections: Set[Connection] = set()
+        self.connections = ConnectionRegistry()
+        self.players_version = 0
 
     @property
     def active_connections(self) -> Iterable[Connection]:
-        return filter(lambda connection: connection.active, self.connections)
+        return self.connections.active
 
     def register_command(self, command: str, callback: Callable) -> None:
         signature = inspect.signature(callback)
@@ -182,22 +394,194 @@ class Network:
 
         self.commands[command] = Command(callback, parameters)
 
-    def all_update_players(self) -> None:
+    def register_resource(self, path: str, body: str, content_type: str) -> None:
+        data = body.encode()
+        self.resources[path] = Resource(data, content_type, f'"{sha256(data).hexdigest()}"')
+
+    def update_players(self, connection: Connection) -> None:
+        connection.update_players(self.connections, self.players_version)
+
+    def all_player_joined(self, player: Connection) -> None:
+        self.players_version += 1
+
+        for connection in self.active_connections:
+            if connection is not player:
+                connection.player_joined(player, self.players_version)
+
+    def all_player_changed(self, player: Connection) -> None:
+        self.players_version += 1
+
+        for connection in self.active_connections:
+            if connection is not player:
+                connection.player_changed(player, self.players_version)
+
+    def all_player_left(self, player: Connection) -> None:
+        self.players_version += 1
+
         for connection in self.active_connections:
-            connection.update_players(self.connections)
+            connection.player_left(player, self.players_version)
 
-    def all_update_game_metadata(self, games: Dict[str, Game]) -> None:
+    def remove_expired_connections(self) -> None:
+        for connection in self.connections.expired(self.inactive_ttl):
+            if not self.can_expire(connection):
+                continue
+
+            self.connections.remove(connection)
+            self.all_player_left(connection)
+            self.on_expire(connection)
+
+    async def expire_connections(self) -> None:
+        """ Forgets players that have been disconnected for too long, even when nobody connects to notice. """
+
+        while True:
+            await asyncio.sleep(self.inactive_ttl / 2)
+            self.remove_expired_connections()
+
+    def all_game_added(self, game: Game) -> None:
+        for connection in self.active_connections:
+            connection.game_added(game)
+
+    def all_game_changed(self, game: Game) -> None:
+        for connection in self.active_connections:
+            connection.game_changed(game)
+
+    def all_games_changed(self, games: Iterable[Game]) -> None:
         for connection in self.active_connections:
-            connection.update_game_metadata(games)
+            connection.games_changed(games)
 
-    def serve(self, port: int):
+    def all_game_removed(self, game: Game) -> None:
+        for connection in self.active_connections:
+            connection.game_removed(game)
+
+    def write_metrics(self, metrics: Exposition) -> None:
+        metrics.add('chessmaker_connections', 'gauge', 'Players known to the server.', [
+            ({'state': 'active'}, len(self.connections.active)),
+            ({'state': 'inactive'}, len(self.connections) - len(self.connections.active)),
+        ])
+
+        metrics.add('chessmaker_messages_total', 'counter', 'Websocket messages sent and received.', [
+            ({'direction': 'sent'}, traffic.messages_sent),
+            ({'direction': 'received'}, traffic.messages_received),
+        ])
+        metrics.add('chessmaker_message_bytes_total', 'counter', 'Bytes of websocket messages sent and received.', [
+            ({'direction': 'sent'}, traffic.bytes_sent),
+            ({'direction': 'received'}, traffic.bytes_received),
+        ])
+
+        pending = [connection.pending_sends for connection in self.connections.active]
+        buffered = [connection.write_buffer_size() for connection in self.connections.active]
+        metrics.gauge('chessmaker_outbound_messages', 'Messages waiting to be sent.', sum(pending))
+        metrics.gauge(
+            'chessmaker_outbound_messages_max',
+            'Most messages waiting to be sent to one player.',
+            max(pending, default=0),
+        )
+        metrics.gauge('chessmaker_outbound_buffer_bytes', 'Bytes in the sockets\' write buffers.', sum(buffered))
+
+        def labels(command: str, controller: Optional[str]) -> Dict[str, str]:
+            return {'command': command} if controller is None else {'command': command, 'controller': controller}
+
+        commands = [
+            (labels(command, controller), stats) for (command, controller), stats in self.metrics.commands.items()
+        ]
+        metrics.add('chessmaker_commands_total', 'counter', 'Commands handled.', [
+            (command_labels, stats.count) for command_labels, stats in commands
+        ])
+        metrics.add('chessmaker_command_errors_total', 'counter', 'Commands that failed or sent an error.', [
+            (command_labels, stats.errors) for command_labels, stats in commands
+        ])
+        metrics.histogram('chessmaker_command_latency_seconds', 'Time from receiving a command until it was handled.', [
+            (command_labels, stats.latency) for command_labels, stats in commands
+        ])
+        metrics.histogram('chessmaker_command_size_bytes', 'Size of the messages commands came in.', [
+            (command_labels, stats.size) for command_labels, stats in commands
+        ])
+
+    def serve(self, port: int, settings: Optional[ServerSettings] = None):
         print(f'Serving on port {port}...')
 
         event_loop = asyncio.get_event_loop()
-        event_loop.run_until_complete(websockets.serve(self.server, '0.0.0.0', port))
+        # Stop serving on Ctrl+C or `docker stop`, so the server can save its games before it exits.
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            event_loop.add_signal_handler(signal_number, event_loop.stop)
+
+        event_loop.create_task(self.expire_connections())
+        event_loop.run_until_complete(websockets.serve(
+            self.server,
+            '0.0.0.0',
+            port,
+            process_request=self.process_request,
+            **asdict(settings or ServerSettings()),
+        ))
         event_loop.run_forever()
 
-    def try_command(self, connection: Connection, data: dict):
+    async def process_request(self, path: str, request_headers: websockets.http.Headers) -> Optional[HttpResponse]:
+        if path not in self.resources:
+            # Continue with the websocket handshake.
+            return None
+
+        resource = self.resources[path]
+        headers = [
+            ('Content-Type', resource.content_type),
+            ('Cache-Control', 'public, max-age=31536000, immutable'),
+            ('ETag', resource.etag),
+            ('Access-Control-Allow-Origin', '*'),
+        ]
+
+        if request_headers.get('If-None-Match') == resource.etag:
+            return HTTPStatus.NOT_MODIFIED, headers, b''
+
+        return HTTPStatus.OK, headers, resource.body
+
+    def try_command(self, connection: Connection, data: dict, size: int = 0):
+        if not isinstance(data, dict):
+            # Any other JSON value cannot name a command, so it is answered like a message without one.
+            data = {}
+
+        name = data.get('command', None)
+        parameters = data.get('parameters', None)
+        game_id = parameters.get('game_id', None) if isinstance(parameters, dict) else None
+
+        command = RunningCommand(
+            name if isinstance(name, str) and name in self.commands else 'unknown',
+            game_id if isinstance(game_id, str) else None,
+            connection_id=connection.id,
+            size=size,
+            sampled=self.log_sample_rate > 0 and random.random() < self.log_sample_rate,
+        )
+
+        self.run_command(command, lambda: self._call_command(connection, data))
+
+    def run_command(self, command: RunningCommand, function: Callable[[], None]) -> None:
+        """ Calls `function` to handle `command`, and records how it went unless the command was deferred. """
+
+        try:
+            with running(command):
+                function()
+        except Exception:
+            command.errors += 1
+            raise
+        finally:
+            if not command.deferred:
+                self.metrics.record(command)
+
+                if command.sampled:
+                    self.log_command(command)
+
+    # noinspection PyMethodMayBeStatic
+    def log_command(self, command: RunningCommand) -> None:
+        print(json.dumps({
+            'event': 'command',
+            'command': command.command,
+            'game_id': command.game_id,
+            'controller': command.controller,
+            'connection_id': command.connection_id,
+            'size': command.size,
+            'errors': command.errors,
+            'latency_ms': round((time.perf_counter() - command.received_at) * 1000, 3),
+        }))
+
+    def _call_command(self, connection: Connection, data: dict):
         if 'command' not in data:
             connection.show_error('Command Not Specified')
             return
@@ -208,7 +592,7 @@ class Network:
 
         parameters = self.commands[data['command']].parameters
 
-        if parameters and 'parameters' not in data:
+        if parameters and not isinstance(data.get('parameters', None), dict):
             connection.show_error(f'This command requires the following parameters: {", ".join(parameters.keys())}.')
             return
 
@@ -227,36 +611,43 @@ class Network:
         self.commands[data['command']].function(connection, **payload)
 
     async def server(self, websocket: websockets.WebSocketServerProtocol, path: str):
-        display_name, = parse_path(path)
+        display_name, pack_hash = parse_path(path)
+
+        self.remove_expired_connections()
 
         while True:
-            similar_player = next(filter(
-                lambda other_player: other_player.display_name == display_name,
-                self.connections,
-            ), None)
+            similar_player = self.connections.get_by_display_name(display_name)
 
             if similar_player is None:
                 # This is a new user.
                 connection = Connection(websocket)
                 connection.display_name = display_name
                 self.connections.add(connection)
+                self.all_player_joined(connection)
                 break
 
             if not similar_player.active:
                 # The user has logged in before. Reuse their old player.
                 similar_player.socket = websocket
-                similar_player.active = True
                 connection = similar_player
+                self.connections.set_active(connection, True)
+                self.all_player_changed(connection)
                 break
 
             # Ensure there are no duplicate display names.
             display_name += ' (2)'
 
+        connection.pack_hash = pack_hash
+        self.update_players(connection)
+
         self.on_connect(connection)
 
         try:
             async for raw_data in websocket:
-                print(f'Received {raw_data}.')
+                # Text frames are decoded to strings, which can hold characters longer than a byte.
+                size = len(raw_data.encode()) if isinstance(raw_data, str) else len(raw_data)
+                traffic.messages_received += 1
+                traffic.bytes_received += size
 
                 try:
                     data = json.loads(raw_data)
@@ -264,10 +655,11 @@ class Network:
                     connection.show_error('Invalid JSON')
                     continue
 
-                self.try_command(connection, data)
+                self.try_command(connection, data, size)
         except websockets.ConnectionClosedError:
             pass
         finally:
             print(f'{connection.display_name} disconnected.')
-            connection.active = False
+            self.connections.set_active(connection, False)
             self.on_disconnect(connection)
+            self.all_player_changed(connection)
@@ -0,0 +1,399 @@
+""" A portable text notation for games, loosely modelled on PGN.
+
+Each game is a block of tags followed by one ply per line:
+
+    [Id "5e1c..."]
+    [Name "Test Game"]
+    [Owner "alice"]
+    [Pack "standard"]
+    [Controller "Chess"]
+    [Options "{}"]
+    [Winners "BLACK"]
+    [Reason "Checkmate"]
+
+    WHITE "Single Advance" r6c5-r5c5
+    BLACK "Double Advance" r1c4-r3c4
+    WHITE "Create" +standard/Pawn/WHITE/NORTH@r4c4
+    BLACK "Capture" xr4c4 r3c3-r4c4
+
+Every ply is written out as its actions, so games can be read back without the controller that played them. A ply
+without a color is written with "-" in place of the color. Lines starting with ";" are comments. """
+
+import json
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+from uuid import uuid4
+
+import argh
+
+from .archive import read_archive
+from .color import Color
+from .direction import Direction
+from .game import Game
+from .game_subscribers import GameSubscribers
+from .journal import Journal, JOURNAL_SHARDS
+from .network import Connection, ConnectionRegistry
+from .pack import Pack, get_controller, load_packs
+from .ply import Ply
+from .recovery import make_owner, recover_snapshots
+from .user_error import user_error
+
+TAGS = {
+    'Id': 'game_id',
+    'Name': 'name',
+    'Owner': 'owner_display_name',
+    'Pack': 'controller_pack_id',
+    'Controller': 'controller_id',
+    'Options': 'options',
+    'Winners': 'winners',
+    'Reason': 'reason',
+}
+
+# Number of imported games written to the journal at a time.
+IMPORT_BATCH_SIZE = 1000
+
+TAG_PATTERN = re.compile(r'\[(\w+) (".*")\]')
+POSITION_PATTERN = re.compile(r'r(\d+)c(\d+)')
+
+
+class NotationError(ValueError):
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f'Line {line}: {message}')
+
+
+def format_position(row: int, col: int) -> str:
+    return f'r{row}c{col}'
+
+
+def parse_position(text: str) -> Tuple[int, int]:
+    match = POSITION_PATTERN.fullmatch(text)
+    if match is None:
+        raise ValueError(f'"{text}" is not a board position.')
+
+    return int(match[1]), int(match[2])
+
+
+def format_action(action: dict) -> str:
+    to_pos = format_position(action['to_pos_row'], action['to_pos_col'])
+
+    if action['type'] == 'move':
+        return format_position(action['from_pos_row'], action['from_pos_col']) + '-' + to_pos
+
+    if action['type'] == 'destroy':
+        return 'x' + to_pos
+
+    piece = action['piece']
+    return '+' + '/'.join([
+        piece['pack_id'],
+        piece['piece_type_id'],
+        Color(piece['color']).name,
+        Direction(piece['direction']).name,
+    ]) + '@' + to_pos
+
+
+def parse_action(text: str) -> dict:
+    if text.startswith('x'):
+        row, col = parse_position(text[1:])
+        return {'type': 'destroy', 'to_pos_row': row, 'to_pos_col': col}
+
+    if text.startswith('+'):
+        piece, _, position = text[1:].rpartition('@')
+        pack_id, piece_type_id, color, direction = piece.split('/')
+        row, col = parse_position(position)
+
+        return {
+            'type': 'create',
+            'to_pos_row': row,
+            'to_pos_col': col,
+            'piece': {
+                'pack_id': pack_id,
+                'piece_type_id': piece_type_id,
+                'color': Color[color].value,
+                'direction': Direction[direction].value,
+            },
+        }
+
+    from_pos, _, to_pos = text.partition('-')
+    from_row, from_col = parse_position(from_pos)
+    to_row, to_col = parse_position(to_pos)
+
+    return {
+        'type': 'move',
+        'from_pos_row': from_row,
+        'from_pos_col': from_col,
+        'to_pos_row': to_row,
+        'to_pos_col': to_col,
+    }
+
+
+def format_ply(state: dict) -> str:
+    color = '-' if state['color'] is None else Color(state['color']).name
+
+    if state['ply'] is None:
+        return color
+
+    actions = [format_action(action) for action in state['ply']['actions']]
+    return ' '.join([color, json.dumps(state['ply']['name'])] + actions)
+
+
+def parse_ply(text: str) -> dict:
+    color, _, rest = text.partition(' ')
+    rest = rest.strip()
+
+    if not rest:
+        ply = None
+    else:
+        name, end = json.JSONDecoder().raw_decode(rest)
+        ply = {'name': name, 'actions': [parse_action(action) for action in rest[end:].split()]}
+
+    return {'color': None if color == '-' else Color[color].value, 'ply': ply}
+
+
+def format_game(game: dict) -> Iterator[str]:
+    """ Yields the lines of a game, given in the form returned by `Game.to_snapshot`. """
+
+    tags = {
+        'Id': game['game_id'],
+        'Name': game['name'],
+        'Owner': game['owner_display_name'],
+        'Pack': game['controller_pack_id'],
+        'Controller': game['controller_id'],
+        'Options': json.dumps(game['options']),
+    }
+
+    if game['winners'] is not None:
+        tags['Winners'] = ' '.join(Color(color).name for color in game['winners']['colors'])
+        tags['Reason'] = game['winners']['reason']
+
+    for tag, value in tags.items():
+        yield f'[{tag} {json.dumps(value)}]'
+
+    yield ''
+
+    for state in game['plies']:
+        yield format_ply(state)
+
+    yield ''
+
+
+def write_games(file: TextIO, games: Iterable[dict]) -> int:
+    count = 0
+
+    for game in games:
+        file.writelines(line + '\n' for line in format_game(game))
+        count += 1
+
+    return count
+
+
+def _new_game() -> dict:
+    return {
+        'game_id': None,
+        'name': 'Imported Game',
+        'owner_display_name': 'Player',
+        'options': {},
+        'plies': [],
+        'winners': None,
+    }
+
+
+def _finish_game(game: dict, line: int) -> dict:
+    for tag in ['Pack', 'Controller']:
+        if TAGS[tag] not in game:
+            raise NotationError(line, f'Game is missing the {tag} tag.')
+
+    reason = game.pop('reason', None)
+    if game['winners'] is not None:
+        game['winners'] = {'colors': game['winners'], 'reason': reason}
+
+    return game
+
+
+def read_games(lines: Iterable[str]) -> Iterator[dict]:
+    """ Parses games one at a time from `lines`, so collections of any size can be read from a file.
+
+    Games are yielded in the form returned by `Game.to_snapshot`, without the controller state. """
+
+    game: Optional[dict] = None
+    tags: Set[str] = set()
+    line_number = 0
+
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+
+        if not line or line.startswith(';'):
+            continue
+
+        try:
+            if line.startswith('['):
+                match = TAG_PATTERN.fullmatch(line)
+                if match is None or match[1] not in TAGS:
+                    raise ValueError(f'"{line}" is not a valid tag.')
+
+                # Tags after plies, or a repeated tag, start the next game.
+                if game is not None and (game['plies'] or match[1] in tags):
+                    yield _finish_game(game, line_number)
+                    game = None
+
+                if game is None:
+                    game = _new_game()
+                    tags.clear()
+
+                tags.add(match[1])
+                key = TAGS[match[1]]
+
+                value = json.loads(match[2])
+                if key == 'options':
+                    value = json.loads(value)
+                elif key == 'winners':
+                    value = [Color[color].value for color in value.split()]
+
+                game[key] = value
+
+            elif game is None:
+                raise ValueError('Plies must come after the tags of a game.')
+
+            else:
+                game['plies'].append(parse_ply(line))
+
+        except NotationError:
+            raise
+        except (ValueError, KeyError) as error:
+            raise NotationError(line_number, str(error)) from error
+
+    if game is not None:
+        yield _finish_game(game, line_number)
+
+
+def journal_owners(journal: Journal) -> ConnectionRegistry:
+    """ Returns stand-ins for the owners of the games already in `journal`, so imported games of the same players are
+    given to them rather than to new connections with the same display names. """
+
+    owners = ConnectionRegistry()
+    snapshots, records = journal.read()
+
+    for game in [
+        *snapshots.values(),
+        *(game_records[0] for game_records in records.values() if game_records[0]['type'] == 'create'),
+    ]:
+        if owners.get_by_display_name(game['owner_display_name']) is None:
+            owners.add(make_owner(game))
+
+    return owners
+
+
+def import_game(
+    game: dict,
+    packs: Dict[str, Pack],
+    journal: Optional[Journal] = None,
+    owners: Optional[ConnectionRegistry] = None,
+) -> Game:
+    """ Creates a game and plays every ply of `game` on it in bulk.
+
+    The plies are not checked against the controller, but the controller still runs after each of them, so winners are
+    decided by the controller rather than taken from the notation. The owner is looked up in `owners` by display name,
+    and added to it if they are not there yet, so every game of a player has the same owner. """
+
+    controller_type = get_controller(packs, game['controller_pack_id'], game['controller_id'])
+    if controller_type is None:
+        raise ValueError(f'Controller {game["controller_pack_id"]}/{game["controller_id"]} does not exist.')
+
+    if owners is None:
+        owners = ConnectionRegistry()
+
+    owner = owners.get_by_display_name(game['owner_display_name'])
+    if owner is None:
+        owner = Connection(None)
+        owner.display_name = game['owner_display_name']
+        owner.active = False
+        owners.add(owner)
+
+    result = Game(
+        game['name'],
+        owner,
+        controller_type,
+        game['options'],
+        None,
+        GameSubscribers(),
+        journal=journal,
+        game_id=game['game_id'] or str(uuid4()),
+    )
+
+    result.apply_plies(
+        (
+            None if state['color'] is None else Color(state['color']),
+            None if state['ply'] is None else Ply.from_json(state['ply'], packs),
+        ) for state in game['plies']
+    )
+
+    return result
+
+
+def from_archive(data: dict) -> dict:
+    return {
+        'game_id': data['game_id'],
+        'name': data['display_name'],
+        'owner_display_name': data['creator_display_name'],
+        'controller_pack_id': data['controller_pack_id'],
+        'controller_id': data['controller_id'],
+        'options': data['options'],
+        'plies': data['states'],
+        'winners': data['winners'],
+    }
+
+
+@argh.arg('output', help='file to write the games to')
+@argh.arg('--journal', help='journal directory to export the current games from')
+@argh.arg('--archive', help='archive database to export the finished games from')
+def export(output: str, journal: str = None, archive: str = None, shards: int = JOURNAL_SHARDS) -> None:
+    """ Writes games from a journal and/or an archive in the portable notation. """
+
+    if journal is None and archive is None:
+        user_error('Either --journal or --archive is required.')
+
+    sources: List[Iterable[dict]] = []
+
+    if journal is not None:
+        sources.append(recover_snapshots(Journal(journal, shards)))
+
+    if archive is not None:
+        sources.append(from_archive(data) for data in read_archive(archive))
+
+    with open(output, 'w') as file:
+        count = sum(write_games(file, games) for games in sources)
+
+    print(f'Exported {count} games.')
+
+
+@argh.named('import')
+@argh.arg('input', help='file to read the games from')
+@argh.arg('journal', help='journal directory of the server to import the games into')
+def import_games(input: str, journal: str, shards: int = JOURNAL_SHARDS) -> None:
+    """ Adds games written in the portable notation to a journal, so the server restores them when it starts. """
+
+    packs = load_packs()
+    target = Journal(journal, shards)
+    count = 0
+
+    try:
+        owners = journal_owners(target)
+
+        with open(input) as file:
+            for game in read_games(file):
+                import_game(game, packs, target, owners).shutdown()
+                count += 1
+
+                # Write as we go to keep memory use flat on large imports.
+                if count % IMPORT_BATCH_SIZE == 0:
+                    target.sync()
+    except ValueError as error:
+        user_error(str(error))
+    finally:
+        target.close()
+
+    print(f'Imported {count} games.')
+
+
+if __name__ == '__main__':
+    argh.dispatch_commands([export, import_games])
@@ -1,22 +1,25 @@
 import inspect
+import json
 import os
 import sys
 
 import yaml
 
 from dataclasses import dataclass
+from hashlib import sha256
 from importlib import import_module
 from types import ModuleType
 from typing import List, Set, Dict, Type, TypeVar, Union, Optional
 
 from .controller import Controller
-from .decorator import Decorator
+from .decorator import Decorator, NO_DRAW_IMAGE
 from .json_serializable import JsonSerializable
 from .piece import Piece
 from .user_error import user_error
 
 T = TypeVar('T')
 REQUIRED_PACK_FILE_FIELDS = ['name', 'description']
+IMAGE_PATH = '/images/{}.svg'
 
 
 @dataclass
@@ -54,6 +57,44 @@ class Pack(JsonSerializable):
         }
 
 
+class PackCatalog:
+    """ Pack data for every loaded pack, serialized once when the server starts.
+
+    Images are replaced by content-addressed urls so clients can cache them, and the catalog as a whole is identified by
+    a hash of its contents that clients can send back to skip downloading it again. """
+
+    def __init__(self, packs: Dict[str, Pack]):
+        self.packs = packs
+        self.images: Dict[str, str] = {}
+
+        self.data = {name: self._address_images(pack.to_json()) for name, pack in packs.items()}
+        self.hash = sha256(json.dumps(self.data, sort_keys=True).encode()).hexdigest()
+
+        # The full update_pack_data command, encoded once and sent as-is to every client without a cached copy.
+        self.message = json.dumps({
+            'command': 'update_pack_data',
+            'parameters': {
+                'pack_hash': self.hash,
+                'packs': self.data,
+            },
+        })
+
+    def _add_image(self, image: str) -> str:
+        path = IMAGE_PATH.format(sha256(image.encode()).hexdigest())
+        self.images[path] = image
+
+        return path
+
+    def _address_images(self, pack_data: dict) -> dict:
+        for types in (pack_data['pieces'], pack_data['decorators']):
+            for type_data in types.values():
+                image = type_data.pop('image')
+                # Clients only need to know that these are not drawn, so there is nothing to download.
+                type_data['image_url'] = None if image == NO_DRAW_IMAGE else self._add_image(image)
+
+        return pack_data
+
+
 def parse_pack_file(path: str) -> PackFile:
     if not os.path.exists(path):
         directory = '/'.join(path.split('/')[:-1])
@@ -108,3 +149,20 @@ def load_packs() -> Dict[str, Pack]:
         )
 
     return result
+
+
+# Packs loaded by each worker process of a pool started with `init_worker_packs`.
+worker_packs: Dict[str, Pack] = {}
+
+
+def init_worker_packs() -> None:
+    """ Process pool initializer that loads the packs once per worker, instead of once per task. """
+
+    worker_packs.update(load_packs())
+
+
+def get_controller(packs: Dict[str, Pack], pack_id: str, controller_id: str) -> Optional[Type[Controller]]:
+    if pack_id not in packs:
+        return None
+
+    return next(filter(lambda controller: controller.name == controller_id, packs[pack_id].controllers), None)
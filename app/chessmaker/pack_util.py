@@ -10,4 +10,6 @@ if TYPE_CHECKING:
 
 
 def get_pack(obj: Union[Piece, Controller, Decorator]) -> str:
-    return obj.__module__.split('.')[1]
+    # Modules are named like chessmaker.packs.<pack>.pieces.<piece>.
+    module_path = obj.__module__.split('.')
+    return module_path[module_path.index('packs') + 1]
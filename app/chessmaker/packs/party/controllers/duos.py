@@ -6,7 +6,7 @@ if TYPE_CHECKING:
 
 from chessmaker import Color, Controller, Direction, Ply, Vector2
 from chessmaker.info_elements import InfoElement, InfoText
-from chessmaker.actions import DestroyAction
+from chessmaker.actions import CreateAction, DestroyAction
 from ....packs.standard import Chess
 from ....packs.standard.helpers import next_color, find_pieces, threatened, print_color, OFFSETS, players_without_pieces
 from ....packs.standard.pieces import Bishop, King, Knight, Pawn, Queen, Rook
@@ -26,6 +26,21 @@ OPPONENTS = {
 }
 
 
+def pawn_promotions(piece: Pawn, board: Dict[Vector2, Piece], from_pos: Vector2, to_pos: Vector2) -> List[Ply]:
+    """ Returns the plies that promote the pawn at `from_pos` onto `to_pos`, capturing any piece there. """
+
+    capture = [DestroyAction(to_pos)] if to_pos in board else []
+
+    return [
+        Ply(f'Promote to {piece_type.name}', [
+            *capture,
+            DestroyAction(from_pos),
+            CreateAction(piece_type(piece.color, piece.direction), to_pos),
+        ])
+        for piece_type in [Queen, Knight, Rook, Bishop]
+    ]
+
+
 class Duos(Chess, Controller):
     name = 'Duos'
     colors = [
@@ -78,13 +93,13 @@ class Duos(Chess, Controller):
             (to_pos.row == 0 and piece.color in [Color.RED, Color.ORANGE])
             or (to_pos.row == 7 and piece.color in [Color.BLUE, Color.PURPLE])
         ):
-            plies = pawn_promotions(piece, from_pos, to_pos)
+            plies = pawn_promotions(piece, board, from_pos, to_pos)
         else:
             plies = piece.get_plies(from_pos, to_pos, self.game.game_data)
 
         for ply in plies:
-            # Make sure they are not capturing their teammate's piece.
-            captures = filter(lambda action: isinstance(action, DestroyAction), ply.actions)
+            # Make sure they are not capturing their teammate's piece. A promotion also removes the pawn itself.
+            captures = filter(lambda action: isinstance(action, DestroyAction) and action.pos != from_pos, ply.actions)
             if any(board[capture.pos].color not in OPPONENTS[color] for capture in captures):
                 continue
 
@@ -97,14 +112,34 @@ class Duos(Chess, Controller):
 
             yield ply
 
+    def get_destination_candidates(self, color: Color, from_pos: Vector2) -> Iterable[Vector2]:
+        # A pawn promotes on any square of its last row, whether or not it could move there, so unlike chess its
+        # destinations cannot be narrowed down by where it can reach.
+        if isinstance(self.game.board[from_pos], Pawn):
+            return Controller.get_destination_candidates(self, color, from_pos)
+
+        return super().get_destination_candidates(color, from_pos)
+
+    # Looking for a legal move tries every ply of every piece, which is too slow to do on the event loop.
+    evaluate_in_executor = True
+
     def after_ply(self) -> None:
+        # Unlike chess, the info panel does not change after each ply.
+        pass
+
+    def evaluate_ply(self) -> Optional[Color]:
+        """ Returns the king's color if it has no legal move. """
+
         color = next_color(self.game, list(players_without_pieces(self.game)))
         if color not in [Color.ORANGE, Color.PURPLE]:
-            return
+            return None
+
+        return None if self._has_legal_move(color) else color
 
-        king_position, king = next(find_pieces(self.game.board, King, color))
+    def after_evaluation(self, color: Optional[Color]) -> None:
+        if color is not None:
+            king_position, king = next(find_pieces(self.game.board, King, color))
 
-        if not self._has_legal_move(color):
             if threatened(self.game, king_position, OPPONENTS[color]):
                 self.game.winner(OPPONENTS[color], 'Checkmate')
             else:
@@ -1,7 +1,8 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
-    from typing import Dict, Iterable
+    from typing import Dict, Iterable, List
+    from chessmaker.pack import Pack
     from chessmaker.typings import Piece
 
 import asyncio
@@ -59,26 +60,53 @@ class Jousting(Controller):
         else:
             self.game.send_error(color, 'The game has not started yet.')
 
+    def get_legal_destinations(self, color: Color, from_pos: Vector2) -> Dict[Vector2, List[Ply]]:
+        # Avoid sending the errors from get_plies once for every position on the board.
+        if not self.game_started or color != self.game.board[from_pos].color:
+            return {}
+
+        return super().get_legal_destinations(color, from_pos)
+
     def after_ply(self) -> None:
         if len(self.game.board) == 1:
             self.game.winner([list(self.game.board.values())[0].color], 'Last Knight Standing')
 
+    def get_state(self) -> dict:
+        return {
+            'game_started': self.game_started,
+        }
+
+    def set_state(self, state: dict, packs: Dict[str, Pack]) -> None:
+        self.game_started = state['game_started']
+
+        if self.game_started:
+            # Remove the start button.
+            self.game.update_public_info([])
+
     def _start_game(self, color: Color):
-        async def countdown():
+        def clear_board():
             self.game.apply_ply(None, Ply('Clear Board', [
                 DestroyAction(pos)
                 for pos in self.game.board.keys()
                 if self.game.board[pos].color not in self.game.players
             ]))
 
+        def start():
+            # Remove the countdown.
+            self.game.update_public_info([])
+
+            self.game_started = True
+            self.game.legal_destinations.clear()
+            self.game.controller_state_changed()
+
+        async def countdown():
+            await self.game.inbox.call(clear_board)
+
             # Tick the countdown the set number of times.
             for timer in range(self.options['Game Start Timer'].value, 0, -1):
                 self.game.update_public_info([InfoText(f'Game starting in {timer}')])
                 await asyncio.sleep(1)
 
-            # Remove the countdown.
-            self.game.update_public_info([])
-
-            self.game_started = True
+            await self.game.inbox.call(start)
 
         self.game.run_async(countdown)
@@ -3,9 +3,10 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from typing import Dict, Generator, Iterable
     from chessmaker import Ply
+    from chessmaker.pack import Pack
     from chessmaker.typings import Piece
 
-from chessmaker import Color, Controller, Direction, Vector2
+from chessmaker import Color, Controller, Direction, NoMovesError, Vector2
 from chessmaker.info_elements import InfoText, InfoElement
 
 from ..pieces import Bishop, King, Knight, Pawn, Queen, Rook
@@ -66,18 +67,43 @@ class Chess(Controller):
         plies = chain.process(plies)
         return plies
 
+    def get_destination_candidates(self, color: Color, from_pos: Vector2) -> Iterable[Vector2]:
+        # The rest of the checks in get_plies are slow, so only run them where the piece's own moves can go, and where
+        # a pawn might double advance.
+        piece = self.game.board[from_pos]
+
+        for to_pos in super().get_destination_candidates(color, from_pos):
+            if (
+                (isinstance(piece, Pawn) and to_pos.col == from_pos.col and abs(to_pos.row - from_pos.row) == 2)
+                or self._can_reach(piece, from_pos, to_pos)
+            ):
+                yield to_pos
+
+    # Looking for a legal move tries every ply of every piece, which is too slow to do on the event loop.
+    evaluate_in_executor = True
+
     def after_ply(self) -> None:
+        self._update_info()
+
+    def evaluate_ply(self) -> bool:
         # You cannot put yourself in checkmate, so we only need to check for the opposite color.
+        return self._has_legal_move(next_color(self.game))
+
+    def after_evaluation(self, has_legal_move: bool) -> None:
+        if has_legal_move:
+            return
+
         color = next_color(self.game)
         king_position, king = next(find_pieces(self.game.board, King, color))
 
-        if not self._has_legal_move(color):
-            opposite_color = [opposite(color)]
-            if threatened(self.game, king_position, opposite_color):
-                self.game.winner(opposite_color, 'Checkmate')
-            else:
-                self.game.winner([], 'Stalemate')
+        opposite_color = [opposite(color)]
+        if threatened(self.game, king_position, opposite_color):
+            self.game.winner(opposite_color, 'Checkmate')
+        else:
+            self.game.winner([], 'Stalemate')
 
+    def set_state(self, state: dict, packs: Dict[str, Pack]) -> None:
+        # The board was restored without running after_ply, so the info panel is out of date.
         self._update_info()
 
     def _update_info(self) -> None:
@@ -93,6 +119,12 @@ class Chess(Controller):
 
         self.game.update_public_info(list(generate()))
 
+    def _can_reach(self, piece: Piece, from_pos: Vector2, to_pos: Vector2) -> bool:
+        try:
+            return next(iter(piece.get_plies(from_pos, to_pos, self.game.game_data)), None) is not None
+        except NoMovesError:
+            return False
+
     def _is_legal(self, from_pos: Vector2, to_pos: Vector2) -> bool:
         if to_pos.row >= self.board_size.row or to_pos.row < 0 or to_pos.col >= self.board_size.col or to_pos.col < 0:
             return False
@@ -3,9 +3,9 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from typing import List, Dict, Optional, Iterable
-    from chessmaker.typings import Piece
+    from chessmaker.pack import Pack
 
-from chessmaker import Color, Controller, Direction, InventoryItem, Ply, Vector2
+from chessmaker import Color, Controller, Direction, InventoryItem, Piece, Ply, Vector2
 from chessmaker.actions import CreateAction, DestroyAction
 from ....packs.standard.controllers import Chess
 from ....packs.standard.helpers import next_color
@@ -61,6 +61,25 @@ class CrazyHouse(Chess, Controller):
 
         self._update_inventory(state.ply_color)
 
+    def get_state(self) -> dict:
+        return {
+            'inventories': {color.value: [{
+                'piece': inventory_item.piece.to_json(),
+                'label': inventory_item.label,
+            } for inventory_item in inventory_items] for color, inventory_items in self.inventories.items()},
+        }
+
+    def set_state(self, state: dict, packs: Dict[str, Pack]) -> None:
+        super().set_state(state, packs)
+
+        for color, inventory_items in state['inventories'].items():
+            self.inventories[Color(int(color))] = [
+                InventoryItem(Piece.from_json(inventory_item['piece'], packs), inventory_item['label'])
+                for inventory_item in inventory_items
+            ]
+
+            self._update_inventory(Color(int(color)))
+
     def _update_inventory(self, color: Color) -> None:
         self.game.update_inventory(color, self.inventories[color])
 
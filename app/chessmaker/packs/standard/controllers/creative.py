@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
+    from chessmaker.pack import Pack
     from chessmaker.typings import Piece
     from typing import Dict, Iterable, List
 
@@ -47,6 +48,21 @@ class Creative(Controller):
     def get_inventory_plies(self, color: Color, piece: Piece, pos: Vector2) -> Iterable[Ply]:
         return Ply('Create', [CreateAction(piece, pos)]),
 
+    def get_state(self) -> dict:
+        return {
+            'directions': {
+                color.value: [item.piece.direction.value for item in items] for color, items in self.inventories.items()
+            },
+        }
+
+    def set_state(self, state: dict, packs: Dict[str, Pack]) -> None:
+        for color, directions in state['directions'].items():
+            items = self.inventories[Color(int(color))]
+            for item, direction in zip(items, directions):
+                item.piece.direction = Direction(direction)
+
+            self.game.update_inventory(Color(int(color)), items)
+
     def _rotate_pieces(self, color: Color) -> None:
         for item in self.inventories[color]:
             item.piece.direction = rotate_direction(item.piece.direction)
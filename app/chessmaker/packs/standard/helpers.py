@@ -152,10 +152,13 @@ def n_state_by_color(game_data: GameData, color: Color, n: int, reverse: bool =
 
     Useful for looking at previous moves. For example, Pawns use this to check if en passant is available. """
 
+    if n < 1:
+        raise ValueError('States are counted from 1.')
+
     return next(islice(filter(
         lambda state: state.ply_color == color,
         reversed(game_data.history) if reverse else game_data.history,
-    ), n, None), None)
+    ), n - 1, None), None)
 
 
 def capture_or_move(board: Dict[Vector2, Piece], color: Color, from_pos: Vector2, to_pos: Vector2) -> Generator[Ply]:
@@ -55,6 +55,10 @@ class AllowPawnPromotion(PlyProcessor):
     def process(self, plies: Iterable[Ply]) -> Iterable[Ply]:
         piece = self.game.board[self.from_pos]
         if isinstance(piece, Pawn) and self.to_pos.row in [0, 7]:
+            # Only promote if the pawn can actually reach the last row from its position.
+            if not list(plies):
+                return ()
+
             return (
                 Ply('Promote to Queen', [
                     DestroyAction(self.from_pos),
@@ -1,9 +1,11 @@
 import unittest
 
-from board import Vector2
-from packs.standard.controllers.chess import Chess
-from ply import MoveAction, DestroyAction
-from testing import make_test_game
+from chessmaker import Color, Ply, NoMovesError, Vector2
+from chessmaker.actions import MoveAction, DestroyAction
+from chessmaker.testing import make_test_game
+from .controllers.chess import Chess
+from .helpers import n_state_by_color
+from .ply_processors import AllowPawnDoubleAdvance, AllowPawnPromotion
 
 
 class TestPawn(unittest.TestCase):
@@ -13,137 +15,161 @@ class TestPawn(unittest.TestCase):
         self.game = make_test_game(Chess)
 
     def _ply_types(self, from_pos: Vector2, to_pos: Vector2):
-        return self.game.board.tiles[from_pos].get_plies(from_pos, to_pos, self.game)
+        # Only the piece's own moves are checked here, not whose turn it is or whether the move leaves a king in check.
+        piece = self.game.board[from_pos]
+        plies = piece.get_plies(from_pos, to_pos, self.game.game_data)
+
+        try:
+            return [ply.actions for ply in AllowPawnDoubleAdvance(self.game, piece.color, from_pos, to_pos).process(plies)]
+        except NoMovesError:
+            return []
+
+    def _move(self, from_pos: Vector2, to_pos: Vector2):
+        piece = self.game.board[from_pos]
+        self.game.apply_ply(piece.color, Ply('Move', [MoveAction(from_pos, to_pos)]))
 
     def test_single_advance(self):
         self.assertEqual(
             self._ply_types(Vector2(6, 0), Vector2(5, 0)),
-            [[MoveAction((6, 0), (5, 0))]],
+            [[MoveAction(Vector2(6, 0), Vector2(5, 0))]],
             'white pawn cannot single advance to empty space',
         )
 
         self.assertEqual(
             self._ply_types(Vector2(1, 0), Vector2(2, 0)),
-            [[MoveAction((1, 0), (2, 0))]],
+            [[MoveAction(Vector2(1, 0), Vector2(2, 0))]],
             'black pawn cannot single advance to empty space',
         )
 
     def test_double_advance(self):
         self.assertEqual(
             self._ply_types(Vector2(6, 0), Vector2(4, 0)),
-            [[MoveAction((6, 0), (4, 0))]],
+            [[MoveAction(Vector2(6, 0), Vector2(4, 0))]],
             'white pawn cannot double advance to empty space on its first move',
         )
 
-        self.game.board.tiles[6, 0].moves += 1
+        self._move(Vector2(6, 0), Vector2(5, 0))
         self.assertEqual(
-            self._ply_types(Vector2(6, 0), Vector2(4, 0)),
+            self._ply_types(Vector2(5, 0), Vector2(3, 0)),
             [],
             'white pawn can double advance to empty space on its second move',
         )
 
         self.assertEqual(
             self._ply_types(Vector2(1, 0), Vector2(3, 0)),
-            [[MoveAction((1, 0), (3, 0))]],
+            [[MoveAction(Vector2(1, 0), Vector2(3, 0))]],
             'black pawn cannot double advance to empty space on its first move',
         )
 
-        self.game.board.tiles[1, 0].moves += 1
+        self._move(Vector2(1, 0), Vector2(2, 0))
         self.assertEqual(
-            self._ply_types(Vector2(1, 0), Vector2(3, 0)),
+            self._ply_types(Vector2(2, 0), Vector2(4, 0)),
             [],
             'black pawn can double advance to empty space on its second move',
         )
 
     def test_capture(self):
         # Move the white pawn at (6, 1) to (2, 1).
-        self.game.apply_ply([MoveAction((6, 1), (2, 1))])
+        self._move(Vector2(6, 1), Vector2(2, 1))
 
         self.assertEqual(
             self._ply_types(Vector2(2, 1), Vector2(1, 0)),
-            [[DestroyAction((1, 0)), MoveAction((2, 1), (1, 0))]],
+            [[DestroyAction(Vector2(1, 0)), MoveAction(Vector2(2, 1), Vector2(1, 0))]],
             'white pawn cannot capture left diagonally',
         )
 
         self.assertEqual(
             self._ply_types(Vector2(2, 1), Vector2(1, 2)),
-            [[DestroyAction((1, 2)), MoveAction((2, 1), (1, 2))]],
+            [[DestroyAction(Vector2(1, 2)), MoveAction(Vector2(2, 1), Vector2(1, 2))]],
             'white pawn cannot capture right diagonally',
         )
 
         # Move the black pawn at (1, 1) to (5, 1).
-        self.game.apply_ply([MoveAction((1, 1), (5, 1))])
+        self._move(Vector2(1, 1), Vector2(5, 1))
 
         self.assertEqual(
             self._ply_types(Vector2(5, 1), Vector2(6, 0)),
-            [[DestroyAction((6, 0)), MoveAction((5, 1), (6, 0))]],
+            [[DestroyAction(Vector2(6, 0)), MoveAction(Vector2(5, 1), Vector2(6, 0))]],
             'black pawn cannot capture right diagonally',
         )
 
         self.assertEqual(
             self._ply_types(Vector2(5, 1), Vector2(6, 2)),
-            [[DestroyAction((6, 2)), MoveAction((5, 1), (6, 2))]],
+            [[DestroyAction(Vector2(6, 2)), MoveAction(Vector2(5, 1), Vector2(6, 2))]],
             'black pawn cannot capture left diagonally',
         )
 
     def test_white_en_passant(self):
         # Move the white pawn at (6, 1) to (3, 1).
-        self.game.apply_ply([MoveAction((6, 1), (3, 1))])
+        self._move(Vector2(6, 1), Vector2(3, 1))
 
         # Move the black pawn at (1, 0) to (3, 0).
-        self.game.apply_ply([MoveAction((1, 0), (3, 0))])
+        self._move(Vector2(1, 0), Vector2(3, 0))
 
         self.assertEqual(
             self._ply_types(Vector2(3, 1), Vector2(2, 0)),
-            [[DestroyAction((3, 0)), MoveAction((3, 1), (2, 0))]],
+            [[DestroyAction(Vector2(3, 0)), MoveAction(Vector2(3, 1), Vector2(2, 0))]],
             'white pawn cannot en passant left',
         )
 
         # Move the white pawn at (6, 6) to (3, 6).
-        self.game.apply_ply([MoveAction((6, 6), (3, 6))])
+        self._move(Vector2(6, 6), Vector2(3, 6))
 
         # Move the black pawn at (1, 7) to (3, 7).
-        self.game.apply_ply([MoveAction((1, 7), (3, 7))])
+        self._move(Vector2(1, 7), Vector2(3, 7))
 
         self.assertEqual(
             self._ply_types(Vector2(3, 6), Vector2(2, 7)),
-            [[DestroyAction((3, 7)), MoveAction((3, 6), (2, 7))]],
+            [[DestroyAction(Vector2(3, 7)), MoveAction(Vector2(3, 6), Vector2(2, 7))]],
             'white pawn cannot en passant right',
         )
 
     def test_black_en_passant(self):
         # Move the white pawn at (6, 3) to (5, 3). This move is only here to switch the current turn to black.
-        self.game.apply_ply([MoveAction((6, 3), (5, 3))])
+        self._move(Vector2(6, 3), Vector2(5, 3))
 
         # Move the black pawn at (1, 1) to (4, 1).
-        self.game.apply_ply([MoveAction((1, 1), (4, 1))])
+        self._move(Vector2(1, 1), Vector2(4, 1))
 
         # Move the white pawn at (6, 0) to (4, 0).
-        self.game.apply_ply([MoveAction((6, 0), (4, 0))])
+        self._move(Vector2(6, 0), Vector2(4, 0))
 
         self.assertEqual(
             self._ply_types(Vector2(4, 1), Vector2(5, 0)),
-            [[DestroyAction((4, 0)), MoveAction((4, 1), (5, 0))]],
+            [[DestroyAction(Vector2(4, 0)), MoveAction(Vector2(4, 1), Vector2(5, 0))]],
             'black pawn cannot en passant right',
         )
 
         # Move the black pawn at (1, 6) to (4, 6).
-        self.game.apply_ply([MoveAction((1, 6), (4, 6))])
+        self._move(Vector2(1, 6), Vector2(4, 6))
 
         # Move the white pawn at (6, 7) to (4, 7).
-        self.game.apply_ply([MoveAction((6, 7), (4, 7))])
-
-        print(f'\n\n{self.game.board}\n\n')
+        self._move(Vector2(6, 7), Vector2(4, 7))
 
         self.assertEqual(
             self._ply_types(Vector2(4, 6), Vector2(5, 7)),
-            [[DestroyAction((4, 7)), MoveAction((4, 6), (5, 7))]],
+            [[DestroyAction(Vector2(4, 7)), MoveAction(Vector2(4, 6), Vector2(5, 7))]],
             'black pawn cannot en passant left',
         )
 
+    def test_en_passant_expires(self):
+        # Move the white pawn at (6, 1) to (3, 1).
+        self._move(Vector2(6, 1), Vector2(3, 1))
+
+        # Move the black pawn at (1, 0) to (3, 0), then make a move on each side so it is no longer the last one.
+        self._move(Vector2(1, 0), Vector2(3, 0))
+        self._move(Vector2(6, 7), Vector2(5, 7))
+        self._move(Vector2(1, 7), Vector2(2, 7))
+
+        self.assertEqual(
+            self._ply_types(Vector2(3, 1), Vector2(2, 0)),
+            [],
+            'white pawn can en passant after black has moved again',
+        )
+
     def test_illegal_moves(self):
         # Move the white pawn at (6, 0) to (4, 0).
-        self.game.apply_ply([MoveAction((6, 0), (4, 0))])
+        self._move(Vector2(6, 0), Vector2(4, 0))
 
         self.assertEqual(
             self._ply_types(Vector2(4, 0), Vector2(5, 0)),
@@ -152,7 +178,7 @@ class TestPawn(unittest.TestCase):
         )
 
         # Move the black pawn at (1, 0) to (3, 0).
-        self.game.apply_ply([MoveAction((1, 0), (3, 0))])
+        self._move(Vector2(1, 0), Vector2(3, 0))
 
         self.assertEqual(
             self._ply_types(Vector2(3, 0), Vector2(2, 0)),
@@ -163,3 +189,41 @@ class TestPawn(unittest.TestCase):
         # TODO: Test backwards capturing.
         # TODO: Test own color capturing.
         # TODO: Test jumping over piece.
+
+    def test_promotion(self):
+        def promotions(from_pos: Vector2, to_pos: Vector2):
+            plies = self.game.board[from_pos].get_plies(from_pos, to_pos, self.game.game_data)
+            return [ply.name for ply in AllowPawnPromotion(self.game, from_pos, to_pos).process(plies)]
+
+        self.assertEqual(promotions(Vector2(6, 0), Vector2(0, 0)), [], 'white pawn can promote from its first row')
+
+        # Replace the black pawn at (1, 0) with the white pawn from (6, 0).
+        self._move(Vector2(6, 0), Vector2(1, 0))
+
+        self.assertEqual(promotions(Vector2(1, 0), Vector2(0, 0)), [], 'white pawn can promote onto a piece ahead of it')
+        self.assertEqual(
+            promotions(Vector2(1, 0), Vector2(0, 1)),
+            ['Promote to Queen', 'Promote to Knight', 'Promote to Rook', 'Promote to Bishop'],
+            'white pawn cannot promote by capturing',
+        )
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_n_state_by_color(self):
+        game = make_test_game(Chess)
+        for from_pos, to_pos in [
+            (Vector2(6, 0), Vector2(5, 0)),
+            (Vector2(1, 0), Vector2(2, 0)),
+            (Vector2(6, 1), Vector2(5, 1)),
+        ]:
+            game.apply_ply(game.board[from_pos].color, Ply('Move', [MoveAction(from_pos, to_pos)]))
+
+        history = game.game_data.history
+        self.assertIs(n_state_by_color(game.game_data, Color.WHITE, 1, reverse=True), history[3])
+        self.assertIs(n_state_by_color(game.game_data, Color.WHITE, 2, reverse=True), history[1])
+        self.assertIs(n_state_by_color(game.game_data, Color.WHITE, 1), history[1])
+        self.assertIsNone(n_state_by_color(game.game_data, Color.BLACK, 2, reverse=True))
+
+        with self.assertRaises(ValueError):
+            n_state_by_color(game.game_data, Color.WHITE, 0)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Union, Iterable
+from typing import TYPE_CHECKING, Dict, Union, Iterable
 
+from .color import Color
 from .json_serializable import JsonSerializable
 from .pack_util import get_pack
 from .vector2 import Vector2
@@ -9,8 +10,8 @@ from .direction import Direction
 
 if TYPE_CHECKING:
     from .ply import Ply
-    from .color import Color
     from .game import GameData
+    from .pack import Pack
 
 
 class Piece(JsonSerializable):
@@ -35,6 +36,11 @@ class Piece(JsonSerializable):
             'direction': self.direction.value,
         }
 
+    @staticmethod
+    def from_json(data: dict, packs: Dict[str, Pack]) -> Piece:
+        piece_type = next(filter(lambda piece: piece.name == data['piece_type_id'], packs[data['pack_id']].pieces))
+        return piece_type(Color(data['color']), Direction(data['direction']))
+
     def copy(self):
         return self.__class__(self.color, self.direction)
 
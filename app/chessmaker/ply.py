@@ -1,9 +1,14 @@
+from __future__ import annotations
+
 from dataclasses import dataclass
-from typing import List, Union
+from typing import TYPE_CHECKING, Dict, List, Union
 
-from .actions import Action
+from .actions import Action, action_from_json
 from .json_serializable import JsonSerializable
 
+if TYPE_CHECKING:
+    from .pack import Pack
+
 
 class NoMovesError(Exception):
     pass
@@ -19,3 +24,7 @@ class Ply(JsonSerializable):
             'name': self.name,
             'actions': [action.to_json() for action in self.actions],
         }
+
+    @staticmethod
+    def from_json(data: dict, packs: Dict[str, Pack]) -> Ply:
+        return Ply(data['name'], [action_from_json(action, packs) for action in data['actions']])
@@ -0,0 +1,132 @@
+""" A small HTTP endpoint that serves the server's metrics in the Prometheus text format.
+
+It runs on its own port on the server's event loop, and only gathers the metrics when it is scraped. """
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import traceback
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .metrics import Histogram
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PATH = '/metrics'
+
+# How long a scraper gets to send its request, in seconds.
+METRICS_REQUEST_TIMEOUT = 5
+
+Labels = Dict[str, str]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Exposition:
+    """ Builds one scrape's worth of metrics. """
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def add(self, name: str, kind: str, description: str, samples: Iterable[Tuple[Labels, float]]) -> None:
+        self.lines.append(f'# HELP {name} {description}')
+        self.lines.append(f'# TYPE {name} {kind}')
+
+        for labels, value in samples:
+            self.lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    def gauge(self, name: str, description: str, value: float) -> None:
+        self.add(name, 'gauge', description, [({}, value)])
+
+    def counter(self, name: str, description: str, value: float) -> None:
+        self.add(name, 'counter', description, [({}, value)])
+
+    def histogram(self, name: str, description: str, histograms: Iterable[Tuple[Labels, Histogram]]) -> None:
+        self.lines.append(f'# HELP {name} {description}')
+        self.lines.append(f'# TYPE {name} histogram')
+
+        for labels, histogram in histograms:
+            count = 0
+
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                count += bucket_count
+                bucket_labels = {**labels, 'le': _format_value(bound)}
+                self.lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {count}')
+
+            self.lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram.total)}')
+            self.lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    def render(self) -> bytes:
+        return ('\n'.join(self.lines) + '\n').encode()
+
+
+class MetricsServer:
+
+    def __init__(self, port: int, host: str = METRICS_HOST):
+        self.port = port
+        self.host = host
+        self.collect: Callable[[Exposition], None] = lambda metrics: None
+
+    async def run(self, collect: Callable[[Exposition], None]) -> None:
+        self.collect = collect
+
+        await asyncio.start_server(self.handle, self.host, self.port)
+        print(f'Serving metrics on port {self.port}...')
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), METRICS_REQUEST_TIMEOUT)
+
+            if request[:1] != ['GET']:
+                status, body = '405 Method Not Allowed', b''
+            elif len(request) < 2 or request[1].split('?')[0] != METRICS_PATH:
+                status, body = '404 Not Found', b''
+            else:
+                metrics = Exposition()
+
+                # noinspection PyBroadException
+                try:
+                    self.collect(metrics)
+                except Exception:
+                    print(traceback.format_exc(), file=sys.stderr)
+                    status, body = '500 Internal Server Error', b''
+                else:
+                    status, body = '200 OK', metrics.render()
+
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> List[str]:
+        request = (await reader.readline()).decode('latin-1').split()
+
+        # The headers are not needed.
+        while (await reader.readline()).strip():
+            pass
+
+        return request
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from .color import Color
+from .game import Game, GamePosition, CHAT_HISTORY_SIZE
+from .game_subscribers import GameSubscribers
+from .network import Connection
+from .pack import get_controller, init_worker_packs, worker_packs
+from .ply import Ply
+
+if TYPE_CHECKING:
+    from .journal import Journal
+    from .network import Network
+    from .pack import Pack
+
+def make_owner(snapshot: dict) -> Connection:
+    """ Creates a disconnected stand-in for a game's owner, which the owner takes over when they reconnect. """
+
+    owner = Connection(None)
+    owner.id = snapshot['owner_id']
+    owner.display_name = snapshot['owner_display_name']
+    owner.active = False
+
+    return owner
+
+
+def restore_game(
+    snapshot: dict,
+    packs: Dict[str, Pack],
+    owner: Connection,
+    network: Optional[Network],
+    subscribers: GameSubscribers,
+    chat_history_size: int = CHAT_HISTORY_SIZE,
+) -> Game:
+    game = Game(
+        snapshot['name'],
+        owner,
+        get_controller(packs, snapshot['controller_pack_id'], snapshot['controller_id']),
+        snapshot['options'],
+        network,
+        subscribers,
+        chat_history_size=chat_history_size,
+        game_id=snapshot['game_id'],
+    )
+    game.restore(snapshot, packs)
+
+    return game
+
+
+def evaluate_position(position: GamePosition) -> Any:
+    """ Runs `Controller.evaluate_ply` on a game's position, in a process of the server's evaluation pool. """
+
+    return position.evaluate(worker_packs)
+
+
+def replay_game(snapshot: Optional[dict], records: List[dict]) -> Optional[dict]:
+    """ Applies a game's journal records on top of its snapshot and returns the resulting snapshot.
+
+    Unlike restoring a snapshot, this runs the controller after every ply, so it is done in worker processes. Returns
+    None if the game was deleted, or if its creation was never recorded. """
+
+    if snapshot is None:
+        if not records or records[0]['type'] != 'create':
+            return None
+
+        snapshot = {
+            **{key: value for key, value in records[0].items() if key != 'type'},
+            'plies': [],
+            'controller_state': None,
+            'winners': None,
+        }
+        records = records[1:]
+
+    game = restore_game(snapshot, worker_packs, make_owner(snapshot), None, GameSubscribers())
+
+    for record in records:
+        if record['type'] == 'ply':
+            color = None if record['color'] is None else Color(record['color'])
+            ply = None if record['ply'] is None else Ply.from_json(record['ply'], worker_packs)
+            game.apply_ply(color, ply)
+
+        elif record['type'] == 'undo':
+            game.undo_ply()
+
+        elif record['type'] == 'state':
+            game.controller.set_state(record['state'], worker_packs)
+
+        elif record['type'] == 'delete':
+            return None
+
+    return game.to_snapshot()
+
+
+def recover_snapshots(journal: Journal, workers: Optional[int] = None) -> List[dict]:
+    """ Reads the journal and returns an up to date snapshot of every game that has not been deleted.
+
+    Games with new records are replayed in parallel, one process per core unless `workers` is given. """
+
+    start = time.perf_counter()
+    snapshots, records = journal.read()
+
+    result = [snapshot for game_id, snapshot in snapshots.items() if game_id not in records]
+    replays: List[Tuple[Optional[dict], List[dict]]] = [
+        (snapshots.get(game_id, None), game_records) for game_id, game_records in records.items()
+    ]
+
+    if replays:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_packs) as executor:
+            replayed = executor.map(replay_game, *zip(*replays), chunksize=max(1, len(replays) // 64))
+            result.extend(snapshot for snapshot in replayed if snapshot is not None)
+
+    elapsed = time.perf_counter() - start
+    print(f'Recovered {len(result)} games ({len(replays)} replayed) in {elapsed:.2f}s '
+          f'({len(result) / max(elapsed, 1e-6):.0f} games/s)')
+
+    return result
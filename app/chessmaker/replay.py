@@ -0,0 +1,139 @@
+""" Replays recorded games through their controllers without a server, to check that every ply is still legal and
+that each game still ends the same way. """
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Set
+
+import argh
+
+from .archive import read_archive
+from .color import Color
+from .game import Game
+from .game_subscribers import GameSubscribers
+from .network import Connection
+from .notation import from_archive, read_games
+from .pack import get_controller, init_worker_packs, worker_packs
+from .ply import Ply
+from .user_error import user_error
+
+# Games queued for each worker at a time, so large collections are never read into memory at once.
+GAMES_PER_WORKER = 16
+
+@dataclass
+class ReplayResult:
+    game_id: str
+    plies: int
+    divergence: Optional[str] = None
+
+
+def replay_game(record: dict) -> ReplayResult:
+    """ Plays a game given in the form returned by `Game.to_snapshot` and reports the first difference, if any. """
+
+    game_id = record['game_id'] or '?'
+    controller_type = get_controller(worker_packs, record['controller_pack_id'], record['controller_id'])
+
+    if controller_type is None:
+        controller = f'{record["controller_pack_id"]}/{record["controller_id"]}'
+        return ReplayResult(game_id, 0, f'Controller {controller} does not exist.')
+
+    index = 0
+
+    # noinspection PyBroadException
+    try:
+        game = Game(record['name'], Connection(None), controller_type, record['options'], None, GameSubscribers())
+
+        for index, state in enumerate(record['plies']):
+            color = None if state['color'] is None else Color(state['color'])
+            ply = None if state['ply'] is None else Ply.from_json(state['ply'], worker_packs)
+
+            # Plies without a color are made by the controller itself, so there is nothing to check them against.
+            if color is not None and ply is not None and not game.is_legal(color, ply):
+                return ReplayResult(game_id, index, f'Ply {index + 1} ({color.name} {ply.name}) is not legal.')
+
+            game.apply_ply(color, ply, False)
+
+    except Exception as error:
+        return ReplayResult(game_id, index, f'Ply {index + 1} raised {error!r}.')
+
+    winners = None if game.winners is None else game.winners.to_json()
+    expected = record['winners']
+
+    if winners is not None:
+        winners['colors'].sort()
+    if expected is not None:
+        expected = {**expected, 'colors': sorted(expected['colors'])}
+
+    if winners != expected:
+        return ReplayResult(game_id, len(record['plies']), f'Ended with {winners} instead of {expected}.')
+
+    return ReplayResult(game_id, len(record['plies']))
+
+
+def replay_games(games: Iterable[dict], workers: Optional[int] = None) -> Iterator[ReplayResult]:
+    """ Replays games across a pool of processes, yielding results as they finish. """
+
+    workers = workers or os.cpu_count() or 1
+    limit = GAMES_PER_WORKER * workers
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_packs) as executor:
+        running: Set[Future] = set()
+
+        for game in games:
+            if len(running) >= limit:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+
+            running.add(executor.submit(replay_game, game))
+
+        for future in running:
+            yield future.result()
+
+
+@argh.arg('paths', nargs='*', help='files of games in the portable notation')
+@argh.arg('--archive', help='archive database to replay the finished games from')
+@argh.arg('--workers', help='number of processes to replay with, one per core by default')
+def main(paths: List[str], archive: str = None, workers: int = None) -> None:
+    """ Replays recorded games and lists every game whose plies or result differ. """
+
+    if not paths and archive is None:
+        user_error('Either a file of games or --archive is required.')
+
+    def read_paths() -> Iterator[dict]:
+        for path in paths:
+            with open(path) as file:
+                yield from read_games(file)
+
+    sources = [read_paths()]
+    if archive is not None:
+        sources.append(from_archive(data) for data in read_archive(archive))
+
+    start = time.perf_counter()
+    games = plies = 0
+    divergent: List[ReplayResult] = []
+
+    try:
+        for result in replay_games(chain(*sources), workers):
+            games += 1
+            plies += result.plies
+
+            if result.divergence is not None:
+                divergent.append(result)
+                print(f'{result.game_id}: {result.divergence}')
+    except ValueError as error:
+        user_error(str(error))
+
+    elapsed = time.perf_counter() - start
+    print(f'Replayed {games} games and {plies} plies in {elapsed:.2f}s '
+          f'({games / max(elapsed, 1e-6):.0f} games/s, {plies / max(elapsed, 1e-6):.0f} plies/s).')
+    print(f'{len(divergent)} games diverged.')
+
+    if divergent:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    argh.dispatch_command(main)
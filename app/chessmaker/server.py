@@ -1,65 +1,619 @@
-from typing import Dict
-
+import asyncio
+import functools
+import sqlite3
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
+
+from .archive import Archive
 from .color import Color
-from .game import Game, ChatMessage
-from .game_subscribers import GameSubscribers
-from .network import Connection, Network
-from .pack import Pack
+from .game import Game, ChatHistory, CHAT_HISTORY_SIZE
+from .game_subscribers import GameSubscribers, OwnedGames, PlayerGames
+from .hibernation import Hibernation, HibernatedGame, restore_chat
+from .journal import Journal
+from .network import Connection, Network, ServerSettings
+from .pack import Pack, PackCatalog, init_worker_packs
+from .pack_util import get_pack
+from .prometheus import Exposition, MetricsServer
+from .recovery import make_owner, recover_snapshots, restore_game
 from .vector2 import Vector2
+from .metrics import RunningCommand, current, game_inboxes, game_tasks
+from .watchdog import Watchdog
+
+SERVER_CHAT_HISTORY_SIZE = 1000
+
+# Processes that controllers' slow evaluations, such as looking for checkmate, run in.
+EVALUATION_WORKERS = 4
+
+# Games snapshotted at a time when compacting the journal, between which the event loop can do other work.
+COMPACTION_CHUNK_SIZE = 100
+
+# How long (in seconds) a test game can go without players or spectators before it is removed. 0 keeps them forever.
+TEST_GAME_IDLE_TIMEOUT = 5 * 60
+
+
+class EvaluationPool(Executor):
+    """ The process pool that controllers' slow evaluations run in, which is only started once a game needs it. """
+
+    def __init__(self, workers: int = EVALUATION_WORKERS):
+        self.workers = workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=init_worker_packs)
+
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait)
 
 
 class Server:
 
-    def __init__(self, packs: Dict[str, Pack]):
+    def __init__(
+        self,
+        packs: Dict[str, Pack],
+        journal: Optional[Journal] = None,
+        archive: Optional[Archive] = None,
+        watchdog: Optional[Watchdog] = None,
+        metrics_server: Optional[MetricsServer] = None,
+        hibernation: Optional[Hibernation] = None,
+    ):
         self.packs = packs
+        self.journal = journal
+        self.archive = archive
+        self.watchdog = watchdog
+        self.metrics_server = metrics_server
+        self.hibernation = hibernation
+        self.pack_catalog = PackCatalog(packs)
 
         self.games: Dict[str, Game] = {}
+        # Idle games that were moved to disk, which are listed in the lobby alongside `games`.
+        self.hibernated: Dict[str, HibernatedGame] = {}
         self.subscribers = GameSubscribers()
-        self.network = Network(self.on_connect, self.on_disconnect)
+        self.player_games = PlayerGames()
+        # The games in `games` and `hibernated` by owner, so connections that own one are quick to find.
+        self.owned_games = OwnedGames()
+        self.chat_messages = ChatHistory(SERVER_CHAT_HISTORY_SIZE)
+        # How many chat messages each game keeps.
+        self.chat_history_size = CHAT_HISTORY_SIZE
+
+        # Finished games that are waiting to be evicted, with the time they finished.
+        self.finished_games: Dict[Game, float] = {}
+
+        # When each game was first seen unused, for removing test games and hibernating the others.
+        self.idle_games: Dict[Game, float] = {}
+
+        # The test game created for each player, by their connection's id.
+        self.test_games: Dict[str, Game] = {}
+        self.test_game_idle_timeout = TEST_GAME_IDLE_TIMEOUT
+        self.test_games_reclaimed = 0
+        self.compaction_chunk_size = COMPACTION_CHUNK_SIZE
+
+        # None evaluates plies on the event loop.
+        self.evaluation_executor: Optional[EvaluationPool] = EvaluationPool()
+
+        self.network = self._make_network()
         self._register_commands()
+        self._register_resources()
+
+    def _make_network(self) -> Network:
+        return Network(self.on_connect, self.on_disconnect, self.can_expire)
+
+    def can_expire(self, connection: Connection) -> bool:
+        """ Keeps the connections that own games, including hibernated ones. """
+
+        return not self.owned_games.owns_any(connection)
 
     def _register_commands(self) -> None:
         self.network.register_command('create_game', self.on_create_game)
         self.network.register_command('delete_game', self.on_delete_game)
-        self.network.register_command('show_game', self.on_show_game)
-        self.network.register_command('join_game', self.on_join_game)
-        self.network.register_command('leave_game', self.on_leave_game)
-        self.network.register_command('plies', self.on_plies)
-        self.network.register_command('inventory_plies', self.on_inventory_plies)
-        self.network.register_command('submit_ply', self.on_submit_ply)
-        self.network.register_command('click_button', self.on_click_button)
-        self.network.register_command('send_chat_message', self.on_send_chat_message)
-
-    def start(self, port: int) -> None:
-        self.network.serve(port)
+        self.register_game_command('show_game', self.on_show_game)
+        self.register_game_command('game_history', self.on_game_history)
+        self.network.register_command('get_archived_game', self.on_get_archived_game)
+        self.register_game_command('join_game', self.on_join_game)
+        self.register_game_command('leave_game', self.on_leave_game)
+        self.register_game_command('plies', self.on_plies)
+        self.register_game_command('legal_destinations', self.on_legal_destinations)
+        self.register_game_command('inventory_plies', self.on_inventory_plies)
+        self.register_game_command('submit_ply', self.on_submit_ply)
+        self.register_game_command('click_button', self.on_click_button)
+        self.register_game_command('send_chat_message', self.on_send_chat_message)
+        self.network.register_command('chat_history', self.on_chat_history)
+        self.network.register_command('players', self.on_players)
+
+    def register_game_command(self, command: str, handler: Callable[..., None]) -> None:
+        """ Registers the handler of a command for a game, so the command is handled in order on the game's inbox. """
+
+        def dispatch(running: RunningCommand, connection: Connection, game_id: str, parameters: dict) -> None:
+            game = self.games.get(game_id, None)
+
+            if game is None:
+                # Let the handler report the missing game, or handle commands for the server chat.
+                handler(connection, game_id=game_id, **parameters)
+                return
+
+            running.controller = game.controller.name
+            running.deferred = True
+
+            async def handle():
+                # Commands are checked against the board, so they wait until the last ply has been evaluated.
+                await game.wait_for_evaluation()
+
+                running.deferred = False
+                self.network.run_command(running, lambda: handler(connection, game_id=game_id, **parameters))
+
+            game.inbox.post(handle)
+
+        @functools.wraps(handler)
+        def post(connection: Connection, game_id: str, **parameters) -> None:
+            running = current() or RunningCommand(command, game_id, connection_id=connection.id)
+
+            hibernated = self.hibernated.get(game_id, None)
+
+            if hibernated is None:
+                dispatch(running, connection, game_id, parameters)
+                return
+
+            # The game is read back from disk first. Commands that arrive meanwhile wait for it in the order they came.
+            # If it is deleted in the meantime, the handler is left to report that the game is gone.
+            running.deferred = True
+
+            async def wake():
+                await self.wake_game(hibernated)
+
+                running.deferred = False
+                self.network.run_command(running, lambda: dispatch(running, connection, game_id, parameters))
+
+            asyncio.ensure_future(wake())
+
+        self.network.register_command(command, post)
+
+    def _register_resources(self) -> None:
+        for path, image in self.pack_catalog.images.items():
+            self.network.register_resource(path, image, 'image/svg+xml')
+
+    def start(self, port: int, settings: Optional[ServerSettings] = None) -> None:
+        self.start_tasks()
+
+        try:
+            self.network.serve(port, settings)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """ Writes out everything the journal, archive and hibernated games still hold in memory, once the server has
+        stopped serving, and stops the watchdog's thread. """
+
+        if self.watchdog is not None:
+            self.watchdog.close()
+
+        if self.journal is not None:
+            try:
+                self.journal.close()
+            except OSError as error:
+                print(f'Could not write to the journal: {error}')
+
+        if self.archive is not None:
+            try:
+                self.archive.close()
+            except sqlite3.Error as error:
+                print(f'Could not write to the archive: {error}')
+
+        if self.hibernation is not None:
+            self.hibernation.close()
+
+        if self.evaluation_executor is not None:
+            self.evaluation_executor.shutdown(wait=False)
+
+    def start_tasks(self) -> None:
+        """ Restores saved games and starts the background tasks that keep the journal and archive up to date. """
+
+        if self.watchdog is not None:
+            asyncio.get_event_loop().create_task(self.watchdog.run())
+
+        if self.metrics_server is not None:
+            asyncio.get_event_loop().create_task(self.metrics_server.run(self.write_metrics))
+
+        if self.journal is not None:
+            self.recover()
+            asyncio.get_event_loop().create_task(self.journal.run())
+            asyncio.get_event_loop().create_task(self.compact_journal())
+
+        if self.idle_timeouts():
+            asyncio.get_event_loop().create_task(self.sweep_idle_games())
+
+        if self.archive is not None:
+            asyncio.get_event_loop().create_task(self.archive.run())
+            asyncio.get_event_loop().create_task(self.evict_finished_games())
+
+    def write_metrics(self, metrics: Exposition) -> None:
+        """ Adds the server's current state to a scrape of the metrics endpoint. """
+
+        self.network.write_metrics(metrics)
+        self.write_game_metrics(metrics)
+
+        if self.watchdog is not None:
+            metrics.counter('chessmaker_loop_stalls_total', 'Times the event loop was blocked.', self.watchdog.stalls)
+            metrics.add('chessmaker_loop_command_stalls_total', 'counter', 'Event loop stalls by command.', [
+                ({'command': command}, count) for command, count in self.watchdog.stalls_by_command.items()
+            ])
+            metrics.gauge('chessmaker_loop_max_lag_seconds', 'Longest event loop stall.', self.watchdog.max_lag)
+            metrics.histogram('chessmaker_loop_stall_seconds', 'How long the event loop was blocked for.', [
+                ({}, self.watchdog.histogram),
+            ])
+
+        if self.archive is not None:
+            metrics.gauge('chessmaker_archive_pending_games', 'Games to be archived.', len(self.archive.pending))
+
+        if self.hibernation is not None:
+            metrics.gauge('chessmaker_hibernated_games', 'Idle games kept on disk.', len(self.hibernated))
+            metrics.counter('chessmaker_hibernations_total', 'Games moved to disk.', self.hibernation.hibernated)
+            metrics.counter('chessmaker_wakes_total', 'Hibernated games read back.', self.hibernation.woken)
+
+    def write_game_metrics(self, metrics: Exposition) -> None:
+        games: Dict[Tuple[str, str, str], int] = {}
+        subscribers = []
+        history = []
+        inbox = []
+        tasks = []
+
+        for game in self.games.values():
+            key = (get_pack(game.controller), game.controller.name, 'playing' if game.winners is None else 'finished')
+            games[key] = games.get(key, 0) + 1
+
+            subscribers.append(len(self.subscribers.get_connections(game)))
+            history.append(len(game.game_data.history) - 1)
+            inbox.append(len(game.inbox))
+            tasks.append(len(game.tasks))
+
+        metrics.add('chessmaker_games', 'gauge', 'Games in memory.', [
+            ({'pack': pack, 'controller': controller, 'state': state}, count)
+            for (pack, controller, state), count in games.items()
+        ])
+
+        # Totals and maximums are reported instead of one series per game, which keeps scrapes cheap.
+        for name, description, values in [
+            ('game_subscribers', 'players watching games', subscribers),
+            ('game_history_plies', 'plies in games\' histories', history),
+            ('game_inbox_commands', 'commands waiting in games\' inboxes', inbox),
+            ('game_tasks', 'tasks running in games', tasks),
+        ]:
+            metrics.gauge(f'chessmaker_{name}', f'Total {description}.', sum(values))
+            metrics.gauge(f'chessmaker_{name}_max', f'Most {description} in one game.', max(values, default=0))
+
+        for name, description in [
+            ('started', 'Tasks started by games.'),
+            ('failed', 'Tasks started by games that raised an error.'),
+            ('cancelled', 'Tasks started by games that were cancelled, usually because the game ended.'),
+            ('rejected', 'Tasks not started because their game had too many running.'),
+        ]:
+            metrics.add(f'chessmaker_game_tasks_{name}_total', 'counter', description, [
+                ({'controller': controller}, getattr(stats, name))
+                for controller, stats in game_tasks.controllers.items()
+            ])
+
+        metrics.histogram('chessmaker_game_task_seconds', 'How long tasks started by games ran for.', [
+            ({'controller': controller}, stats.runtime) for controller, stats in game_tasks.controllers.items()
+        ])
+
+        metrics.add('chessmaker_game_inbox_processed_total', 'counter', 'Work done by games\' inboxes.', [
+            ({'controller': controller}, stats.processed) for controller, stats in game_inboxes.controllers.items()
+        ])
+        metrics.add('chessmaker_game_inbox_dropped_total', 'counter', 'Work dropped when games closed.', [
+            ({'controller': controller}, stats.dropped) for controller, stats in game_inboxes.controllers.items()
+        ])
+
+        for name, description, attribute in [
+            ('wait', 'How long work waited in games\' inboxes.', 'wait_time'),
+            ('run', 'How long work in games\' inboxes ran for.', 'run_time'),
+        ]:
+            metrics.histogram(f'chessmaker_game_inbox_{name}_seconds', description, [
+                ({'controller': controller}, getattr(stats, attribute))
+                for controller, stats in game_inboxes.controllers.items()
+            ])
+
+        metrics.gauge('chessmaker_test_games', 'Test games created for players.', len(self.test_games))
+        metrics.counter(
+            'chessmaker_test_games_reclaimed_total', 'Test games removed for being unused.', self.test_games_reclaimed
+        )
+
+    def recover(self) -> None:
+        """ Restores every game saved in the journal. Owners are added as disconnected players until they return. """
+
+        for snapshot in recover_snapshots(self.journal):
+            game = self.restore_snapshot(snapshot)
+
+            if game.winners is not None:
+                # The server stopped before this game was evicted, so make sure it is archived.
+                self.on_game_finished(game)
+
+    def restore_snapshot(self, snapshot: dict) -> Game:
+        owner = self.network.connections.get(snapshot['owner_id'])
+        if owner is None:
+            owner = make_owner(snapshot)
+            self.network.connections.add(owner)
+
+        game = restore_game(snapshot, self.packs, owner, self.network, self.subscribers, self.chat_history_size)
+        game.journal = self.journal
+        game.on_finish = self.on_game_finished
+        game.evaluation_executor = self.evaluation_executor
+        self.add_game(game)
+
+        return game
+
+    async def compact_journal(self) -> None:
+        """ Regularly snapshots every game so the journal does not grow without bound. """
+
+        while True:
+            try:
+                snapshots = await self.snapshot_games()
+
+                # Hibernated games have not changed since they were recorded, so the journal keeps what it has of them.
+                await self.journal.compact(snapshots, set(self.hibernated))
+            except (OSError, ValueError) as error:
+                print(f'Could not compact the journal: {error}')
+
+            await asyncio.sleep(self.journal.snapshot_interval)
+
+    async def snapshot_games(self) -> List[dict]:
+        """ Snapshots every game in memory for a compaction of the journal, a chunk at a time so the event loop is not
+        held up by a large server. """
+
+        self.journal.prepare_compaction()
+
+        snapshots = []
+        games = list(self.games.values())
+
+        for start in range(0, len(games), self.compaction_chunk_size):
+            snapshots.extend(
+                self.journal.take_snapshot(game)
+                for game in games[start:start + self.compaction_chunk_size]
+                # Games removed or hibernated in the meantime are left out.
+                if self.games.get(game.id, None) is game
+            )
+            await asyncio.sleep(0)
+
+        # Games that were created or woken in the meantime.
+        snapshots.extend(
+            self.journal.take_snapshot(game) for game in self.games.values() if game.id not in self.journal.snapshotted
+        )
+
+        return snapshots
+
+    def on_game_finished(self, game: Game) -> None:
+        if self.archive is not None:
+            self.archive.add(game)
+            self.finished_games[game] = time.monotonic()
+
+    async def evict_finished_games(self) -> None:
+        """ Drops finished games from memory once they are archived and players have had time to see the result. """
+
+        while True:
+            await asyncio.sleep(self.archive.flush_interval)
+            self.evict_archived_games()
+
+    def evict_archived_games(self) -> None:
+        expiry = time.monotonic() - self.archive.evict_delay
+        for game, finished_at in list(self.finished_games.items()):
+            if finished_at > expiry:
+                break
+
+            if not self.archive.is_stored(game.id):
+                continue
+
+            del self.finished_games[game]
+            if game.id in self.games:
+                self.remove_game(game)
+
+    def idle_timeouts(self) -> List[float]:
+        timeouts = [self.test_game_idle_timeout]
+        if self.hibernation is not None:
+            timeouts.append(self.hibernation.idle_timeout)
+
+        return [timeout for timeout in timeouts if timeout > 0]
+
+    def is_idle(self, game: Game) -> bool:
+        return (
+            len(game.players) == 0
+            and not self.subscribers.get_connections(game)
+            and len(game.inbox) == 0
+            and game.evaluation is None
+            and not game.tasks
+        )
+
+    async def sweep_idle_games(self) -> None:
+        """ Removes test games and hibernates other games once nobody has played or watched them for a while. """
+
+        while True:
+            await asyncio.sleep(min(self.idle_timeouts()) / 2)
+            self.sweep_idle_games_once()
+
+    def sweep_idle_games_once(self) -> None:
+        if not self.idle_timeouts():
+            return
+
+        now = time.monotonic()
+        reclaimed = 0
+        hibernated = 0
+
+        for game in list(self.games.values()):
+            if not self.is_idle(game):
+                self.idle_games.pop(game, None)
+                continue
+
+            idle_time = now - self.idle_games.setdefault(game, now)
+
+            if self.test_games.get(game.owner.id, None) is game:
+                if 0 < self.test_game_idle_timeout <= idle_time:
+                    self.remove_game(game)
+                    reclaimed += 1
+
+            # Finished games are left for `evict_finished_games`.
+            elif self.hibernation is not None and game not in self.finished_games:
+                if 0 < self.hibernation.idle_timeout <= idle_time:
+                    self.hibernate_game(game)
+                    hibernated += 1
+
+        if reclaimed:
+            self.test_games_reclaimed += reclaimed
+            print(f'Reclaimed {reclaimed} idle test games, {len(self.test_games)} left.')
+
+        if hibernated:
+            print(f'Hibernated {hibernated} idle games, {len(self.games)} left in memory.')
+
+    def hibernate_game(self, game: Game) -> None:
+        """ Replaces an idle game with its lobby entry and writes the rest of it to disk. """
+
+        hibernated = HibernatedGame(game.id, game.get_metadata(), game.owner, self.hibernation.to_record(game))
+
+        del self.games[game.id]
+        self.idle_games.pop(game, None)
+        self.hibernated[game.id] = hibernated
+        game.shutdown()
+        game.inbox.close()
+
+        self.hibernation.hibernated += 1
+
+        async def save():
+            try:
+                await self.hibernation.save(hibernated)
+            except OSError as error:
+                # The game stays in memory in its serialized form.
+                print(f'Could not hibernate game {game.id}: {error}')
+
+        asyncio.ensure_future(save())
+
+    async def wake_game(self, hibernated: HibernatedGame) -> Optional[Game]:
+        """ Brings a hibernated game back into memory. Returns None if it could not be read, or was deleted. """
+
+        if hibernated.waking is None:
+            if self.hibernated.get(hibernated.id, None) is not hibernated:
+                # The game was deleted before it could be woken.
+                return None
+
+            hibernated.waking = asyncio.ensure_future(self._wake_game(hibernated))
+
+        return await asyncio.shield(hibernated.waking)
+
+    async def _wake_game(self, hibernated: HibernatedGame) -> Optional[Game]:
+        try:
+            record = await self.hibernation.load(hibernated)
+        except (OSError, ValueError) as error:
+            print(f'Could not wake game {hibernated.id}: {error}')
+            hibernated.waking = None
+            return None
+
+        if self.hibernated.get(hibernated.id, None) is not hibernated:
+            # The game was deleted while it was being read.
+            return None
+
+        del self.hibernated[hibernated.id]
+        # Restoring the snapshot adds it back.
+        self.owned_games.remove(hibernated.owner, hibernated.id)
+        self.hibernation.discard(hibernated)
+        self.hibernation.woken += 1
+
+        game = self.restore_snapshot(record['snapshot'])
+        restore_chat(game.chat_messages, record['chat_messages'], self._get_chat_sender)
+
+        return game
+
+    def _get_chat_sender(self, connection_id: str) -> Connection:
+        connection = self.network.connections.get(connection_id)
+
+        if connection is None:
+            # The sender has been forgotten, but their messages only need their id.
+            connection = Connection(None)
+            connection.id = connection_id
+
+        return connection
+
+    def add_game(self, game: Game) -> None:
+        self.games[game.id] = game
+        self.owned_games.add(game.owner, game.id)
+
+    def remove_game(self, game: Game) -> None:
+        del self.games[game.id]
+        self.owned_games.remove(game.owner, game.id)
+        self.idle_games.pop(game, None)
+        if self.test_games.get(game.owner.id, None) is game:
+            del self.test_games[game.owner.id]
+
+        self.subscribers.remove_game(game)
+        self.player_games.remove_game(game)
+        game.shutdown()
+        game.inbox.close()
+
+        if self.journal is not None:
+            self.journal.game_deleted(game)
+
+        self.network.all_game_removed(game)
+
+    def remove_hibernated_game(self, game: HibernatedGame) -> None:
+        del self.hibernated[game.id]
+        self.owned_games.remove(game.owner, game.id)
+        self.hibernation.discard(game)
+
+        if self.journal is not None:
+            self.journal.game_deleted(game)
+
+        self.network.all_game_removed(game)
+
+    # noinspection PyMethodMayBeStatic
+    def new_game_id(self) -> str:
+        return str(uuid4())
 
     def on_connect(self, connection: Connection) -> None:
-        self.network.all_update_players()
+        self.welcome(connection)
+        self.create_test_game(connection)
+
+    def welcome(self, connection: Connection) -> None:
         connection.set_player()
-        connection.update_pack_data(self.packs)
+        connection.update_pack_data(self.pack_catalog)
+        connection.chat_history('server', self.chat_messages.page())
 
-        from .packs.standard.controllers.chess import Chess
-        game = Game('Test Game', connection, Chess, {}, self.network, self.subscribers)
-        self.games[game.id] = game
+        connection.update_game_metadata({**self.games, **self.hibernated})
 
-        connection.update_game_metadata(self.games)
+    def create_test_game(self, connection: Connection) -> None:
+        """ Gives the player a game to try things out in. Players who reconnect get their previous one back. """
 
-    def on_disconnect(self, connection: Connection) -> None:
-        change_made = False
-        for game in self.games.values():
-            if connection in game.subscribers:
-                game.subscribers.remove_connection(connection)
-                change_made = True
+        if connection.id in self.test_games:
+            return
+
+        from .packs.standard.controllers.chess import Chess
+        game = Game(
+            'Test Game',
+            connection,
+            Chess,
+            {},
+            self.network,
+            self.subscribers,
+            chat_history_size=self.chat_history_size,
+            journal=self.journal,
+            game_id=self.new_game_id(),
+            on_finish=self.on_game_finished,
+            evaluation_executor=self.evaluation_executor,
+        )
+        self.add_game(game)
+        self.test_games[connection.id] = game
+
+        self.network.all_game_added(game)
 
-            if connection in game.players:
-                game.players.remove_connection(connection)
-                game.send_update_to_subscribers()
-                change_made = True
+    def on_disconnect(self, connection: Connection) -> None:
+        if connection in self.subscribers:
+            self.subscribers.remove_connection(connection)
 
-        if change_made:
-            self.network.all_update_game_metadata(self.games)
+        games = self.player_games.remove_connection(connection)
+        for game in games:
+            game.remove_player(connection)
+            game.send_update_to_subscribers()
 
-        self.network.all_update_players()
+        if games:
+            self.network.all_games_changed(games)
 
     def on_create_game(
         self,
@@ -86,25 +640,40 @@ class Server:
             connection.show_error('Options not supplied successfully.')
             return
 
-        game = Game(name, connection, controller_class, options, self.network, self.subscribers)
-        self.games[game.id] = game
-
-        self.network.all_update_game_metadata(self.games)
+        game = Game(
+            name,
+            connection,
+            controller_class,
+            options,
+            self.network,
+            self.subscribers,
+            chat_history_size=self.chat_history_size,
+            journal=self.journal,
+            game_id=self.new_game_id(),
+            on_finish=self.on_game_finished,
+            evaluation_executor=self.evaluation_executor,
+        )
+        self.add_game(game)
+
+        self.network.all_game_added(game)
         connection.focus_game(game)
 
     def on_delete_game(self, connection: Connection, game_id: str) -> None:
-        if game_id not in self.games:
+        game: Union[Game, HibernatedGame, None] = self.games.get(game_id, None) or self.hibernated.get(game_id, None)
+
+        if game is None:
             connection.show_error('Game does not exist.')
             return
 
-        if self.games[game_id].owner.display_name != connection.display_name:
+        if game.owner.display_name != connection.display_name:
             connection.show_error('Only the owner of this game can delete it.')
             return
 
-        self.subscribers.remove_game(self.games[game_id])
-        self.games[game_id].shutdown()
-        del self.games[game_id]
-        self.network.all_update_game_metadata(self.games)
+        if isinstance(game, HibernatedGame):
+            # Hibernated games are deleted without waking them.
+            self.remove_hibernated_game(game)
+        else:
+            self.remove_game(game)
 
     def on_show_game(self, connection: Connection, game_id: str) -> None:
         if game_id not in self.games:
@@ -115,6 +684,29 @@ class Server:
         self.subscribers.set(game, connection)
         connection.update_game_data(game)
 
+    def on_game_history(self, connection: Connection, game_id: str, start: int, size: int) -> None:
+        if game_id not in self.games:
+            connection.show_error('Game does not exist.')
+            return
+
+        connection.game_history(self.games[game_id], start, size)
+
+    def on_get_archived_game(self, connection: Connection, game_id: str) -> None:
+        if self.archive is None:
+            connection.show_error('Game does not exist.')
+            return
+
+        async def send_archived_game():
+            data = await self.archive.get(game_id)
+
+            if data is None:
+                connection.show_error('Game does not exist.')
+                return
+
+            connection.archived_game(data)
+
+        asyncio.create_task(send_archived_game())
+
     def on_join_game(self, connection: Connection, game_id: str, color: int) -> None:
         if game_id not in self.games:
             connection.show_error('Game id does not exist.')
@@ -137,8 +729,9 @@ class Server:
             return
 
         game.add_player(connection, color_object)
+        self.player_games.add(connection, game)
 
-        self.network.all_update_game_metadata(self.games)
+        self.network.all_game_changed(game)
         game.send_update_to_subscribers()
 
     def on_leave_game(self, connection: Connection, game_id: str) -> None:
@@ -152,10 +745,10 @@ class Server:
             connection.show_error('Player is not in this game.')
             return
 
-        if connection in game.players:
-            game.players.remove_connection(connection)
+        game.remove_player(connection)
+        self.player_games.remove(connection, game)
 
-        self.network.all_update_game_metadata(self.games)
+        self.network.all_game_changed(game)
         game.send_update_to_subscribers()
 
     def on_plies(
@@ -181,7 +774,27 @@ class Server:
         to_pos = Vector2(to_row, to_col)
 
         plies = game.get_plies(connection, from_pos, to_pos)
-        game.apply_or_offer_choices(from_pos, to_pos, plies, connection)
+        game.apply_or_offer_choices(
+            from_pos,
+            to_pos,
+            plies,
+            connection,
+            lambda: game.get_plies(connection, from_pos, to_pos),
+        )
+
+    def on_legal_destinations(self, connection: Connection, game_id: str, from_row: int, from_col: int) -> None:
+        if game_id not in self.games:
+            connection.show_error('Game id does not exist.')
+            return
+
+        game = self.games[game_id]
+
+        if connection not in game.players:
+            connection.show_error('Player is not in this game.')
+            return
+
+        from_pos = Vector2(from_row, from_col)
+        connection.legal_destinations(game, from_pos, game.get_legal_destinations(connection, from_pos))
 
     def on_inventory_plies(
         self,
@@ -211,34 +824,27 @@ class Server:
         color = Color(inventory_item.piece.color)
         inventory_plies = list(game.controller.get_inventory_plies(color, inventory_item.piece, to_pos))
 
-        game.apply_or_offer_choices(Vector2(-1, -1), to_pos, inventory_plies, connection)
+        game.apply_or_offer_choices(
+            Vector2(-1, -1),
+            to_pos,
+            inventory_plies,
+            connection,
+            lambda: list(game.controller.get_inventory_plies(color, inventory_item.piece, to_pos)),
+        )
 
-    def on_submit_ply(
-        self,
-        connection: Connection,
-        game_id: str,
-        from_row: int,
-        from_col: int,
-        to_row: int,
-        to_col: int,
-        ply: dict,
-    ) -> None:
+    def on_submit_ply(self, connection: Connection, game_id: str, ply_id: str) -> None:
         if game_id not in self.games:
             connection.show_error('Game id does not exist.')
             return
 
         game = self.games[game_id]
-        color = game.players.get_color(connection)
-        plies = game.get_plies(connection, Vector2(from_row, from_col), Vector2(to_row, to_col))
-        dict_plies = [ply_data.to_json() for ply_data in plies]
+        ply = game.take_offered_ply(connection, ply_id)
 
-        if ply not in dict_plies:
+        if ply is None:
             connection.show_error('Ply not available.')
             return
 
-        ply_index = dict_plies.index(ply)
-
-        game.apply_ply(color, plies[ply_index])
+        game.apply_ply(game.players.get_color(connection), ply)
 
     def on_click_button(
         self,
@@ -255,14 +861,34 @@ class Server:
 
     def on_send_chat_message(self, connection: Connection, text: str, game_id: str) -> None:
         if game_id == 'server':
-            for other_connection in self.network.connections:
-                other_connection.receive_server_chat_message(text, connection)
+            message = self.chat_messages.add(connection, text)
+            for other_connection in self.network.active_connections:
+                other_connection.receive_server_chat_message(message)
         else:
             if game_id not in self.games:
                 connection.show_error('Game id does not exist.')
                 return
 
             game = self.games[game_id]
-            game.chat_messages.append(ChatMessage(connection, text))
-            for other_connection in self.subscribers.get_connections(game):
-                other_connection.receive_game_chat_message(game, connection, text)
+            game.add_chat_message(connection, text)
+
+    def on_chat_history(self, connection: Connection, game_id: str, before: int) -> None:
+        if game_id == 'server':
+            chat_messages = self.chat_messages
+        else:
+            if game_id not in self.games:
+                connection.show_error('Game id does not exist.')
+                return
+
+            chat_messages = self.games[game_id].chat_messages
+
+        if before < 0:
+            connection.show_error('"before" must not be negative.')
+            return
+
+        # Indices past the newest message return the most recent page.
+        connection.chat_history(game_id, chat_messages.page(before))
+
+    def on_players(self, connection: Connection) -> None:
+        # Clients request the full list of players when they miss a roster update.
+        self.network.update_players(connection)
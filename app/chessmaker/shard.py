@@ -0,0 +1,526 @@
+""" Sharded mode, where games are spread over several worker processes.
+
+The front end process keeps the websockets, the list of players, the server chat and the lobby. Every worker runs a
+normal `Server` for the games whose id hashes to it. Commands for a game are forwarded to the worker that owns it, and
+everything the worker sends to a connection is passed back through the front end.
+
+Processes talk over localhost TCP, with one JSON array per line:
+
+    front end -> worker: ['connect', connection_id, display_name, create_test_game]
+                         ['disconnect', connection_id]
+                         ['command', connection_id, display_name, command, size]
+    worker -> front end: ['hello', index]
+                         ['owners', [[connection_id, display_name], ...]]
+                         ['ready']
+                         ['send', connection_id, message]
+                         ['game_added' | 'game_changed', game_id, metadata]
+                         ['games_changed', {game_id: metadata}]
+                         ['game_removed', game_id]
+                         ['test_game_removed', connection_id]
+
+If a worker's link is lost, its games are dropped from the lobby and commands for them are refused until it has been
+started again and has recovered them from its journal. """
+
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import signal
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from .game import Game
+from .journal import shard_of
+from .network import Connection, Network, ServerSettings
+from .server import Server
+
+if TYPE_CHECKING:
+    from .archive import Archive
+    from .hibernation import Hibernation
+    from .journal import Journal
+    from .pack import Pack
+    from .prometheus import Exposition, MetricsServer
+    from .watchdog import Watchdog
+
+SHARD_HOST = '127.0.0.1'
+
+# Messages can hold whole boards, so allow much longer lines than asyncio does by default.
+SHARD_MESSAGE_LIMIT = 64 * 1024 * 1024
+
+# Commands the front end answers itself, unless they are for a game.
+FRONT_COMMANDS = {'send_chat_message', 'chat_history', 'players'}
+
+# How long to wait before starting a worker again after its link was lost, so one that keeps crashing is not spun.
+WORKER_RESTART_DELAY = 1
+
+
+class ShardLink:
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def send(self, *message) -> None:
+        self.writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+    async def receive(self) -> Optional[list]:
+        """ Returns the next message, or None once the other process has gone away. """
+
+        try:
+            line = await self.reader.readline()
+        except ConnectionError:
+            return None
+
+        return json.loads(line) if line else None
+
+
+class WorkerSocket:
+    """ Stands in for a connection's websocket in a worker, sending everything through the front end. """
+
+    def __init__(self, link: ShardLink, connection_id: str):
+        self.link = link
+        self.connection_id = connection_id
+
+    async def send(self, message: str) -> None:
+        self.link.send('send', self.connection_id, message)
+
+
+class RemoteGame:
+    """ The front end's copy of a game's lobby entry, which stands in for the game when updating connections. """
+
+    def __init__(self, game_id: str, metadata: dict):
+        self.id = game_id
+        self.metadata = metadata
+
+    def get_metadata(self) -> dict:
+        return self.metadata
+
+
+class WorkerNetwork(Network):
+    """ Network of a worker, which reports changes to the lobby to the front end instead of every connection. """
+
+    def __init__(self, link: ShardLink, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.link = link
+
+    def all_game_added(self, game: Game) -> None:
+        self.link.send('game_added', game.id, game.get_metadata())
+
+    def all_game_changed(self, game: Game) -> None:
+        self.link.send('game_changed', game.id, game.get_metadata())
+
+    def all_games_changed(self, games: Iterable[Game]) -> None:
+        self.link.send('games_changed', {game.id: game.get_metadata() for game in games})
+
+    def all_game_removed(self, game: Game) -> None:
+        self.link.send('game_removed', game.id)
+
+
+class WorkerServer(Server):
+
+    def __init__(
+        self,
+        packs: Dict[str, Pack],
+        link: ShardLink,
+        index: int,
+        workers: int,
+        journal: Optional[Journal] = None,
+        archive: Optional[Archive] = None,
+        watchdog: Optional[Watchdog] = None,
+        metrics_server: Optional[MetricsServer] = None,
+        hibernation: Optional[Hibernation] = None,
+    ):
+        self.link = link
+        self.index = index
+        self.workers = workers
+
+        super().__init__(packs, journal, archive, watchdog, metrics_server, hibernation)
+
+    def _make_network(self) -> Network:
+        return WorkerNetwork(self.link, self.on_connect, self.on_disconnect)
+
+    def _register_resources(self) -> None:
+        # The front end serves the images.
+        pass
+
+    def new_game_id(self) -> str:
+        # Only create games that belong to this worker, so their commands are routed back here.
+        while True:
+            game_id = super().new_game_id()
+            if shard_of(game_id, self.workers) == self.index:
+                return game_id
+
+    def get_connection(self, connection_id: str, display_name: str) -> Connection:
+        connection = self.network.connections.get(connection_id)
+
+        if connection is None:
+            connection = Connection(None)
+            connection.id = connection_id
+            connection.display_name = display_name
+            self.network.connections.add(connection)
+
+        # Owners of restored games start without a socket.
+        connection.socket = WorkerSocket(self.link, connection_id)
+        return connection
+
+    def remove_game(self, game: Game) -> None:
+        is_test_game = self.test_games.get(game.owner.id, None) is game
+        super().remove_game(game)
+
+        if is_test_game:
+            # Let the front end forget where it was, so the player gets a new one from the next worker in turn.
+            self.link.send('test_game_removed', game.owner.id)
+
+    def handle(self, message: list) -> None:
+        if message[0] == 'connect':
+            _, connection_id, display_name, create_test_game = message
+            connection = self.get_connection(connection_id, display_name)
+            self.network.connections.set_active(connection, True)
+
+            if create_test_game:
+                self.create_test_game(connection)
+
+        elif message[0] == 'disconnect':
+            connection = self.network.connections.get(message[1])
+
+            if connection is not None:
+                self.network.connections.set_active(connection, False)
+                self.on_disconnect(connection)
+
+        elif message[0] == 'command':
+            _, connection_id, display_name, data, size = message
+            self.network.try_command(self.get_connection(connection_id, display_name), data, size)
+
+    async def run(self) -> None:
+        self.start_tasks()
+
+        # Let the front end know about restored games and their owners before it accepts any players.
+        self.link.send('owners', [[connection.id, connection.display_name] for connection in self.network.connections])
+        self.network.all_games_changed(self.games.values())
+        self.link.send('ready')
+
+        while True:
+            message = await self.link.receive()
+            if message is None:
+                break
+
+            self.handle(message)
+
+
+def run_worker(index: int, workers: int, port: int) -> None:
+    """ Entry point of a worker process. """
+
+    from .main import (
+        configure_chat_history,
+        configure_evaluation,
+        configure_metrics,
+        configure_test_games,
+        install_event_loop,
+        make_archive,
+        make_hibernation,
+        make_journal,
+        make_metrics_server,
+        make_watchdog,
+    )
+    from .pack import load_packs
+
+    # Ctrl+C reaches every process. Workers keep running until the front end has stopped them, so no game is lost.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    install_event_loop()
+    packs = load_packs()
+
+    async def main():
+        reader, writer = await asyncio.open_connection(SHARD_HOST, port, limit=SHARD_MESSAGE_LIMIT)
+        link = ShardLink(reader, writer)
+        link.send('hello', index)
+
+        name = f'worker-{index}'
+        server = WorkerServer(
+            packs,
+            link,
+            index,
+            workers,
+            make_journal(name),
+            make_archive(name),
+            make_watchdog(),
+            # Workers serve their own metrics on the ports after the front end's.
+            make_metrics_server(index + 1),
+            make_hibernation(name),
+        )
+        configure_metrics(server)
+        configure_test_games(server)
+        configure_chat_history(server)
+        configure_evaluation(server)
+
+        # The front end stops the worker by closing its link, after which it saves its games.
+        asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, writer.close)
+
+        try:
+            await server.run()
+        finally:
+            server.close()
+
+    asyncio.run(main())
+
+
+class FrontNetwork(Network):
+    """ Network of the front end, which hands commands for games to the worker that owns them. """
+
+    def __init__(self, front: FrontServer, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.front = front
+
+    def try_command(self, connection: Connection, data: dict, size: int = 0):
+        if not self.front.forward(connection, data, size):
+            super().try_command(connection, data, size)
+
+
+class FrontServer(Server):
+    """ Server of the front end. The games here are `RemoteGame` entries kept up to date by the workers. """
+
+    def __init__(
+        self,
+        packs: Dict[str, Pack],
+        workers: int,
+        watchdog: Optional[Watchdog] = None,
+        metrics_server: Optional[MetricsServer] = None,
+    ):
+        self.workers = workers
+        # The link to each worker, or None while it is starting or after it was lost.
+        self.links: List[Optional[ShardLink]] = [None] * workers
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.port: Optional[int] = None
+        self.closing = False
+        self.worker_restart_delay = WORKER_RESTART_DELAY
+        self.next_worker = 0
+        # Which worker each player's test game is on, so reconnecting players are sent back to it.
+        self.test_game_workers: Dict[str, int] = {}
+
+        self.ready_workers = 0
+        self.ready = asyncio.Event()
+
+        super().__init__(packs, watchdog=watchdog, metrics_server=metrics_server)
+
+        # The workers evaluate their own games.
+        self.evaluation_executor = None
+
+    def _make_network(self) -> Network:
+        return FrontNetwork(self, self.on_connect, self.on_disconnect, self.can_expire, self.on_expire)
+
+    def can_expire(self, connection: Connection) -> bool:
+        # The front end only has the lobby entries of games, which name their owner as the creator.
+        return not any(game.get_metadata()['creator'] == connection.id for game in self.games.values())
+
+    def on_expire(self, connection: Connection) -> None:
+        self.test_game_workers.pop(connection.id, None)
+
+    def _register_commands(self) -> None:
+        self.network.register_command('send_chat_message', self.on_send_chat_message)
+        self.network.register_command('chat_history', self.on_chat_history)
+        self.network.register_command('players', self.on_players)
+
+    def write_game_metrics(self, metrics: Exposition) -> None:
+        # The workers report their own games.
+        pass
+
+    def idle_timeouts(self) -> List[float]:
+        # The workers sweep their own games. The front end only has their lobby entries.
+        return []
+
+    def start(self, port: int, settings: Optional[ServerSettings] = None) -> None:
+        asyncio.get_event_loop().run_until_complete(self.start_workers())
+        self.start_tasks()
+
+        try:
+            self.network.serve(port, settings)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """ Stops the workers by closing their links, which has each of them save its games and exit, then closes what
+        the front end has itself. """
+
+        self.closing = True
+
+        links = [link for link in self.links if link is not None]
+        for link in links:
+            link.writer.close()
+
+        asyncio.get_event_loop().run_until_complete(asyncio.gather(
+            *(link.writer.wait_closed() for link in links),
+            return_exceptions=True,
+        ))
+
+        for process in self.processes:
+            if process is not None:
+                process.join()
+
+        super().close()
+
+    async def start_workers(self) -> None:
+        """ Starts the worker processes and waits until they have restored their games. """
+
+        server = await asyncio.start_server(self.on_worker, SHARD_HOST, 0, limit=SHARD_MESSAGE_LIMIT)
+        self.port = server.sockets[0].getsockname()[1]
+
+        for index in range(self.workers):
+            self.start_worker(index)
+
+        await self.ready.wait()
+        print(f'Started {self.workers} workers.')
+
+    def start_worker(self, index: int) -> None:
+        process = multiprocessing.Process(target=run_worker, args=(index, self.workers, self.port))
+        process.start()
+        self.processes[index] = process
+
+    async def restart_worker(self, index: int) -> None:
+        process = self.processes[index]
+        if process is not None:
+            await asyncio.get_event_loop().run_in_executor(None, process.join)
+
+        await asyncio.sleep(self.worker_restart_delay)
+
+        if not self.closing:
+            print(f'Restarting worker {index}.')
+            self.start_worker(index)
+
+    def _pick_worker(self) -> Optional[int]:
+        """ Returns the next worker that is running, in turn, or None if none of them are. """
+
+        for _ in range(self.workers):
+            index = self.next_worker
+            self.next_worker = (self.next_worker + 1) % self.workers
+
+            if self.links[index] is not None:
+                return index
+
+        return None
+
+    def forward(self, connection: Connection, data: dict, size: int = 0) -> bool:
+        """ Sends a command on to the worker that owns its game. Returns False if the front end should handle it. """
+
+        if not isinstance(data, dict):
+            return False
+
+        parameters = data.get('parameters', None)
+        game_id = parameters.get('game_id', None) if isinstance(parameters, dict) else None
+
+        if data.get('command', None) in FRONT_COMMANDS and game_id in (None, 'server'):
+            return False
+
+        # Commands without a game, such as creating one, are spread over the workers.
+        index = shard_of(game_id, self.workers) if isinstance(game_id, str) else self._pick_worker()
+
+        if index is None or self.links[index] is None:
+            connection.show_error('This game is not available right now. Please try again shortly.')
+        else:
+            self.links[index].send('command', connection.id, connection.display_name, data, size)
+
+        return True
+
+    def on_connect(self, connection: Connection) -> None:
+        self.welcome(connection)
+
+        test_game_worker = self.test_game_workers.get(connection.id, None)
+        if test_game_worker is None or self.links[test_game_worker] is None:
+            test_game_worker = self._pick_worker()
+
+            if test_game_worker is not None:
+                self.test_game_workers[connection.id] = test_game_worker
+
+        for index, link in enumerate(self.links):
+            if link is not None:
+                link.send('connect', connection.id, connection.display_name, index == test_game_worker)
+
+    def on_disconnect(self, connection: Connection) -> None:
+        for link in self.links:
+            if link is not None:
+                link.send('disconnect', connection.id)
+
+    async def on_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        link = ShardLink(reader, writer)
+        hello = await link.receive()
+        if hello is None:
+            return
+
+        index = hello[1]
+        self.links[index] = link
+
+        if self.ready.is_set():
+            # The worker was restarted, so tell it who is connected. Their test games are not created again.
+            for connection in list(self.network.connections):
+                if connection.active:
+                    link.send('connect', connection.id, connection.display_name, False)
+
+        while True:
+            message = await link.receive()
+            if message is None:
+                break
+
+            self.handle(message)
+
+        self.links[index] = None
+        if self.closing:
+            return
+
+        print(f'Lost the link to worker {index}.')
+        self.worker_lost(index)
+        await self.restart_worker(index)
+
+    def worker_lost(self, index: int) -> None:
+        """ Drops the games of a worker that has gone away from the lobby, until it is back and sends them again. """
+
+        for game in [game for game_id, game in self.games.items() if shard_of(game_id, self.workers) == index]:
+            del self.games[game.id]
+            self.network.all_game_removed(game)
+
+    def handle(self, message: list) -> None:
+        if message[0] == 'send':
+            connection = self.network.connections.get(message[1])
+
+            if connection is not None and connection.active:
+                connection._send(message[2])
+
+        elif message[0] == 'game_added':
+            game = RemoteGame(message[1], message[2])
+            self.games[game.id] = game
+            self.network.all_game_added(game)
+
+        elif message[0] == 'game_changed':
+            game = RemoteGame(message[1], message[2])
+            self.games[game.id] = game
+            self.network.all_game_changed(game)
+
+        elif message[0] == 'games_changed':
+            games = [RemoteGame(game_id, metadata) for game_id, metadata in message[1].items()]
+            self.games.update((game.id, game) for game in games)
+
+            if games:
+                self.network.all_games_changed(games)
+
+        elif message[0] == 'game_removed':
+            game = self.games.pop(message[1], None)
+
+            if game is not None:
+                self.network.all_game_removed(game)
+
+        elif message[0] == 'test_game_removed':
+            self.test_game_workers.pop(message[1], None)
+
+        elif message[0] == 'owners':
+            for connection_id, display_name in message[1]:
+                if self.network.connections.get(connection_id) is None:
+                    # Keep the owner's identity, so they get their games back when they reconnect.
+                    owner = Connection(None)
+                    owner.id = connection_id
+                    owner.display_name = display_name
+                    owner.active = False
+                    self.network.connections.add(owner)
+
+        elif message[0] == 'ready':
+            self.ready_workers += 1
+
+            if self.ready_workers == self.workers:
+                self.ready.set()
@@ -0,0 +1,52 @@
+""" Helpers for the unit tests, which run games and servers without any real websockets. """
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Type
+
+from .controller import Controller
+from .game import Game
+from .game_subscribers import GameSubscribers
+from .network import Connection, Network
+
+
+class TestConnection(Connection):
+    """ A connection that keeps everything sent to it instead of writing it to a socket. """
+
+    __test__ = False
+
+    def __init__(self, display_name: str = 'Player'):
+        super().__init__(None)
+        self.display_name = display_name
+        self.messages: List[dict] = []
+
+    def _send(self, message: str) -> None:
+        self.messages.append(json.loads(message))
+
+    def sent(self, command: str) -> List[dict]:
+        """ Returns the parameters of every `command` sent to this connection, oldest first. """
+
+        return [message['parameters'] for message in self.messages if message['command'] == command]
+
+    def errors(self) -> List[str]:
+        return [parameters['message'] for parameters in self.sent('show_error')]
+
+
+def make_test_game(
+    controller_type: Type[Controller],
+    options: Optional[Dict[str, Any]] = None,
+    owner: Optional[Connection] = None,
+    **kwargs,
+) -> Game:
+    """ Creates a game that is not part of any server. """
+
+    return Game(
+        'Test Game',
+        TestConnection('Owner') if owner is None else owner,
+        controller_type,
+        {} if options is None else options,
+        Network(lambda connection: None, lambda connection: None),
+        GameSubscribers(),
+        **kwargs,
+    )
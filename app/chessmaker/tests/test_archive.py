@@ -0,0 +1,53 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from ..archive import Archive
+from ..color import Color
+from ..pack import load_packs
+from ..packs.standard import Chess
+from ..server import Server
+from ..testing import make_test_game
+
+
+class TestArchiveEviction(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = Archive(os.path.join(self.directory, 'archive.db'), evict_delay=0)
+        self.server = Server(load_packs(), archive=self.archive)
+
+        self.game = make_test_game(Chess, on_finish=self.server.on_game_finished)
+        self.server.add_game(self.game)
+
+    def tearDown(self):
+        self.archive.close()
+        self.server.evaluation_executor.shutdown()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    async def test_not_evicted_until_committed(self):
+        self.game.winner([Color.WHITE], 'Test')
+
+        self.server.evict_archived_games()
+        self.assertIn(self.game.id, self.server.games, 'game was evicted before it was written')
+
+        # Hold up the archive's thread so the flush is still inserting the game while eviction runs.
+        release = threading.Event()
+        self.archive.executor.submit(release.wait)
+        flush = asyncio.create_task(self.archive.flush())
+        await asyncio.sleep(0)
+
+        self.assertEqual(self.archive.pending, {}, 'flush did not take the pending games')
+        self.server.evict_archived_games()
+        self.assertIn(self.game.id, self.server.games, 'game was evicted while its insert had not committed')
+        self.assertIn(self.game.id, self.archive.writing)
+
+        release.set()
+        await flush
+
+        self.server.evict_archived_games()
+        self.assertNotIn(self.game.id, self.server.games, 'stored game was not evicted')
+        self.assertEqual((await self.archive.get(self.game.id))['game_id'], self.game.id)
@@ -0,0 +1,51 @@
+import unittest
+
+from ..game import ChatHistory
+from ..pack import load_packs
+from ..server import Server
+from ..testing import TestConnection
+
+
+class TestChatHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.sender = TestConnection('Sender')
+        self.chat_messages = ChatHistory(5)
+
+        for index in range(8):
+            self.chat_messages.add(self.sender, str(index))
+
+    def _page(self, *args, **kwargs):
+        return [message.text for message in self.chat_messages.page(*args, **kwargs)]
+
+    def test_keeps_most_recent(self):
+        self.assertEqual(self._page(), ['3', '4', '5', '6', '7'])
+        self.assertEqual(self.chat_messages.next_index, 8)
+
+    def test_page_before(self):
+        self.assertEqual(self._page(6, 2), ['4', '5'])
+        self.assertEqual(self._page(4, 2), ['3'])
+        self.assertEqual(self._page(2, 2), [], 'messages that were dropped are returned')
+        self.assertEqual(self._page(100, 2), ['6', '7'])
+
+
+class TestChatHistoryCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server(load_packs())
+        self.connection = TestConnection()
+
+        for index in range(3):
+            self.server.chat_messages.add(self.connection, str(index))
+
+    def test_page(self):
+        self.server.on_chat_history(self.connection, 'server', 2)
+
+        history = self.connection.sent('chat_history')
+        self.assertEqual([message['text'] for message in history[0]['chat_messages']], ['0', '1'])
+
+    def test_negative_before(self):
+        self.server.on_chat_history(self.connection, 'server', -1)
+
+        self.assertEqual(self.connection.sent('chat_history'), [])
+        self.assertEqual(self.connection.errors(), ['"before" must not be negative.'])
@@ -0,0 +1,118 @@
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from ..actions import MoveAction
+from ..color import Color
+from ..game import GamePosition
+from ..pack import init_worker_packs, load_packs
+from ..packs.standard import Chess
+from ..ply import Ply
+from ..server import EvaluationPool
+from ..testing import TestConnection, make_test_game
+from ..vector2 import Vector2
+
+
+class TestDeferredPlies(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(1, initializer=init_worker_packs)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def setUp(self):
+        self.game = make_test_game(Chess, evaluation_executor=self.executor)
+        self.white = TestConnection('White')
+        self.black = TestConnection('Black')
+        self.game.add_player(self.white, Color.WHITE)
+        self.game.add_player(self.black, Color.BLACK)
+
+    def _ply(self, color: Color, from_row: int, from_col: int, to_row: int, to_col: int) -> Ply:
+        """ Returns the ply the controller offers for the move, as the server would when the player makes it. """
+
+        return next(iter(self.game.controller.get_plies(color, Vector2(from_row, from_col), Vector2(to_row, to_col))))
+
+    def _plies(self):
+        return [state.ply for state in self.game.game_data.history[1:]]
+
+    async def test_deferred_plies_are_checked(self):
+        e4 = self._ply(Color.WHITE, 6, 4, 4, 4)
+        self.game.apply_ply(Color.WHITE, e4)
+        self.assertIsNotNone(self.game.evaluation, 'evaluation did not run in the executor')
+
+        # Both are legal when they arrive, but after e5 it is no longer black's turn.
+        e5, d5 = self._ply(Color.BLACK, 1, 4, 3, 4), self._ply(Color.BLACK, 1, 3, 3, 3)
+        self.game.apply_ply(Color.BLACK, e5)
+        self.game.apply_ply(Color.BLACK, d5)
+        self.assertEqual(self._plies(), [e4], 'ply was applied while the game was being evaluated')
+
+        await self.game.wait_for_evaluation()
+
+        self.assertEqual(self._plies(), [e4, e5], 'deferred plies were not checked before being applied')
+        self.assertEqual(self.black.errors(), ['That move is no longer possible.'])
+
+    async def test_checkmate_found_in_executor(self):
+        for color, move in [
+            (Color.WHITE, (6, 5, 5, 5)),
+            (Color.BLACK, (1, 4, 3, 4)),
+            (Color.WHITE, (6, 6, 4, 6)),
+            (Color.BLACK, (0, 3, 4, 7)),
+        ]:
+            await self.game.wait_for_evaluation()
+            self.game.apply_ply(color, self._ply(color, *move))
+
+        # White has no legal move left, but this arrives before the evaluation finds that out, so it is deferred.
+        self.game.apply_ply(Color.WHITE, Ply('Move', [MoveAction(Vector2(6, 0), Vector2(5, 0))]))
+        await self.game.wait_for_evaluation()
+
+        self.assertIsNotNone(self.game.winners, 'checkmate was not found')
+        self.assertEqual(self.game.winners.colors, [Color.BLACK])
+        self.assertEqual(self.game.winners.reason, 'Checkmate')
+        self.assertEqual(len(self._plies()), 4, 'ply after checkmate was applied')
+
+    async def test_position_keeps_last_ply_of_each_color(self):
+        position = GamePosition(self.game)
+        self.assertEqual(len(position.game_data.history), 1, 'new game\'s position did not keep its starting state')
+
+        for color, move in [
+            (Color.WHITE, (6, 4, 4, 4)),
+            (Color.BLACK, (1, 0, 2, 0)),
+            (Color.WHITE, (4, 4, 3, 4)),
+            (Color.BLACK, (1, 3, 3, 3)),
+        ]:
+            await self.game.wait_for_evaluation()
+            self.game.apply_ply(color, self._ply(color, *move))
+
+        position = GamePosition(self.game)
+        self.assertEqual(
+            [state.ply for state in position.game_data.history],
+            self._plies()[-2:],
+            'position did not keep only the last ply of each color',
+        )
+        self.assertEqual(position.board, self.game.board)
+
+        self.assertTrue(position.evaluate(load_packs()), 'position was not evaluated like the game')
+
+        # White can take d5 en passant, which is read from black's last ply.
+        plies = position.controller.get_plies(Color.WHITE, Vector2(3, 4), Vector2(2, 3))
+        self.assertEqual([ply.name for ply in plies], ['En Passant'])
+
+
+class TestEvaluationPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_started_on_first_evaluation(self):
+        pool = EvaluationPool(1)
+        game = make_test_game(Chess, evaluation_executor=pool)
+        self.assertIsNone(pool.executor, 'pool was started before any ply was evaluated')
+
+        try:
+            e4 = next(iter(game.controller.get_plies(Color.WHITE, Vector2(6, 4), Vector2(4, 4))))
+            game.apply_ply(Color.WHITE, e4)
+            self.assertIsNotNone(pool.executor, 'ply was not evaluated in the pool')
+
+            await game.wait_for_evaluation()
+            self.assertIsNone(game.winners)
+        finally:
+            pool.shutdown()
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+
+from ..game import MAX_GAME_TASKS
+from ..metrics import game_tasks
+from ..packs.standard import Chess
+from ..testing import make_test_game
+
+
+class TestRunAsync(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.game = make_test_game(Chess)
+        self.stats = game_tasks.get(Chess.name)
+        self.before = (self.stats.started, self.stats.failed, self.stats.cancelled, self.stats.rejected)
+
+    def _counts(self):
+        return tuple(now - before for now, before in zip(
+            (self.stats.started, self.stats.failed, self.stats.cancelled, self.stats.rejected),
+            self.before,
+        ))
+
+    async def test_cap(self):
+        release = asyncio.Event()
+        tasks = [self.game.run_async(release.wait) for _ in range(MAX_GAME_TASKS)]
+
+        self.assertTrue(all(task is not None for task in tasks))
+        self.assertIsNone(self.game.run_async(release.wait), 'more than MAX_GAME_TASKS tasks were started')
+
+        release.set()
+        await asyncio.gather(*tasks)
+        # Let the tasks' done callbacks run.
+        await asyncio.sleep(0)
+
+        self.assertEqual(self.game.tasks, set(), 'finished tasks were kept')
+        self.assertIsNotNone(self.game.run_async(release.wait), 'no task could be started after others finished')
+        self.assertEqual(self._counts(), (MAX_GAME_TASKS + 1, 0, 0, 1))
+
+    async def test_failure_is_contained(self):
+        async def fail():
+            raise ValueError('Test')
+
+        await self.game.run_async(fail)
+        await asyncio.sleep(0)
+
+        self.assertEqual(self.game.tasks, set())
+        self.assertEqual(self._counts(), (1, 1, 0, 0))
+
+    async def test_shutdown_cancels_tasks(self):
+        task = self.game.run_async(asyncio.Event().wait)
+        await asyncio.sleep(0)
+
+        self.game.shutdown()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        self.assertTrue(task.cancelled())
+        self.assertEqual(self.game.tasks, set(), 'cancelled task was kept')
+        self.assertIsNone(self.game.run_async(asyncio.Event().wait), 'task was started after the game ended')
+        self.assertEqual(self._counts(), (1, 0, 1, 0))
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..color import Color
+from ..hibernation import Hibernation
+from ..journal import Journal
+from ..pack import load_packs
+from ..recovery import recover_snapshots
+from ..server import Server
+from ..testing import TestConnection
+from ..vector2 import Vector2
+
+
+class TestHibernation(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = Journal(os.path.join(self.directory, 'journal'), flush_interval=0)
+        self.hibernation = Hibernation(os.path.join(self.directory, 'hibernation'))
+        self.server = Server(load_packs(), journal=self.journal, hibernation=self.hibernation)
+
+        self.owner = TestConnection('Owner')
+        self.server.network.connections.add(self.owner)
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _create_game(self) -> str:
+        known = set(self.server.games)
+        self.server.on_create_game(self.owner, 'Hibernating Game', 'standard', 'Chess', {})
+        return next(game_id for game_id in self.server.games if game_id not in known)
+
+    def _command(self, command: str, **parameters) -> None:
+        self.server.network.try_command(self.owner, {'command': command, 'parameters': parameters})
+
+    async def _hibernate(self, game_id: str, saved: bool = True) -> None:
+        self.server.hibernate_game(self.server.games[game_id])
+
+        while saved and self.server.hibernated[game_id].record is not None:
+            await asyncio.sleep(0.01)
+
+    async def _settle(self) -> None:
+        """ Waits for wakes and inboxes started by commands to finish. """
+
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+
+    async def test_command_wakes_game(self):
+        game_id = self._create_game()
+        await self._hibernate(game_id)
+
+        self._command('show_game', game_id=game_id)
+        await self._settle()
+
+        self.assertIn(game_id, self.server.games, 'game was not woken')
+        self.assertNotIn(game_id, self.server.hibernated)
+        self.assertEqual([data['id'] for data in self.owner.sent('update_game_data')], [game_id])
+
+    async def test_deleted_before_wake(self):
+        game_id = self._create_game()
+        await self._hibernate(game_id)
+
+        # The wake is only started once the command's task runs, after the game is gone.
+        self._command('show_game', game_id=game_id)
+        self._command('delete_game', game_id=game_id)
+        await self._settle()
+
+        self.assertNotIn(game_id, self.server.games, 'deleted game was woken')
+        self.assertEqual(self.owner.errors(), ['Game does not exist.'])
+
+    async def test_deleted_while_waking(self):
+        game_id = self._create_game()
+        await self._hibernate(game_id)
+
+        self._command('show_game', game_id=game_id)
+
+        # Let the wake get as far as asking for the file to be read.
+        for _ in range(3):
+            await asyncio.sleep(0)
+        self.assertIsNotNone(self.server.hibernated[game_id].waking, 'game is not being read')
+
+        self._command('delete_game', game_id=game_id)
+        await self._settle()
+
+        self.assertNotIn(game_id, self.server.games, 'deleted game was woken')
+        self.assertEqual(self.owner.errors(), ['Game does not exist.'])
+
+    async def test_owner_kept_while_game_exists(self):
+        game_id = self._create_game()
+        self.assertFalse(self.server.can_expire(self.owner), 'owner of a game could expire')
+
+        await self._hibernate(game_id)
+        self.assertFalse(self.server.can_expire(self.owner), 'owner of a hibernated game could expire')
+
+        self._command('show_game', game_id=game_id)
+        await self._settle()
+        self.assertIn(game_id, self.server.games, 'game was not woken')
+        self.assertFalse(self.server.can_expire(self.owner), 'owner of a woken game could expire')
+
+        self._command('delete_game', game_id=game_id)
+        self.assertTrue(self.server.can_expire(self.owner), 'owner was kept after their game was deleted')
+
+    async def test_compaction_keeps_hibernated_games(self):
+        game_id = self._create_game()
+        awake_id = self._create_game()
+
+        game = self.server.games[game_id]
+        game.apply_ply(Color.WHITE, next(iter(game.controller.get_plies(Color.WHITE, Vector2(6, 4), Vector2(4, 4)))))
+        await game.wait_for_evaluation()
+        await self.journal.flush()
+        await self.journal.compact([game.to_snapshot()])
+
+        # This ply is still pending when the game is hibernated and the journal compacted.
+        game.apply_ply(Color.BLACK, next(iter(game.controller.get_plies(Color.BLACK, Vector2(1, 4), Vector2(3, 4)))))
+        await game.wait_for_evaluation()
+        expected = game.to_snapshot()
+        await self._hibernate(game_id, saved=False)
+
+        await self.journal.compact([self.server.games[awake_id].to_snapshot()], set(self.server.hibernated))
+
+        snapshots = {snapshot['game_id']: snapshot for snapshot in recover_snapshots(self.journal, workers=1)}
+        self.assertEqual(set(snapshots), {game_id, awake_id}, 'hibernated game was dropped by compaction')
+        self.assertEqual(snapshots[game_id], expected)
+
+    def test_startup_keeps_other_files(self):
+        directory = os.path.join(self.directory, 'shared')
+        os.makedirs(os.path.join(directory, 'worker-0'))
+
+        for name in ['game.json', 'game.json.tmp', 'notes.txt']:
+            open(os.path.join(directory, name), 'w').close()
+
+        Hibernation(directory).close()
+
+        self.assertEqual(sorted(os.listdir(directory)), ['notes.txt', 'worker-0'])
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from ..inbox import Inbox
+from ..pack import load_packs
+from ..packs.standard import Chess
+from ..prometheus import Exposition
+from ..server import Server
+from ..testing import make_test_game
+
+
+class TestInbox(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.inbox = Inbox()
+        self.done = []
+
+    def tearDown(self):
+        self.inbox.close()
+
+    async def test_items_run_in_order(self):
+        async def slow():
+            await asyncio.sleep(0.01)
+            self.done.append('slow')
+
+        self.inbox.post(slow)
+        self.inbox.post(lambda: self.done.append('fast'))
+        result = await self.inbox.call(lambda: self.done.append('call') or len(self.done))
+
+        self.assertEqual(self.done, ['slow', 'fast', 'call'], 'an item ran before the awaitable ahead of it finished')
+        self.assertEqual(result, 3)
+        self.assertEqual(self.inbox.stats.processed, 3)
+
+    async def test_errors_do_not_stop_the_inbox(self):
+        def fail():
+            raise ValueError('Test')
+
+        # Not assertRaises, which clears the frames of the traceback, and so would finish the inbox's own task.
+        try:
+            await self.inbox.call(fail)
+        except ValueError:
+            pass
+        else:
+            self.fail('error was not passed to the caller')
+
+        self.assertEqual(await self.inbox.call(lambda: 'after'), 'after', 'inbox stopped after an error')
+
+    async def test_inboxes_take_turns(self):
+        other = Inbox()
+
+        for index in range(3):
+            self.inbox.post(lambda index=index: self.done.append(('first', index)))
+            other.post(lambda index=index: self.done.append(('second', index)))
+
+        await asyncio.gather(self.inbox.call(lambda: None), other.call(lambda: None))
+        other.close()
+
+        self.assertEqual(self.done, [
+            ('first', 0), ('second', 0),
+            ('first', 1), ('second', 1),
+            ('first', 2), ('second', 2),
+        ], 'a busy inbox did not let the other one have a turn')
+
+    async def test_close_cancels_waiting_calls(self):
+        self.inbox.post(lambda: asyncio.sleep(0.01))
+        waiting = asyncio.ensure_future(self.inbox.call(lambda: 'never'))
+        await asyncio.sleep(0)
+
+        self.inbox.close()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+
+    async def test_close_counts_dropped_work(self):
+        self.inbox.post(lambda: asyncio.sleep(0.01))
+        self.inbox.post(lambda: None)
+        await asyncio.sleep(0)
+
+        self.inbox.close()
+        self.assertEqual(self.inbox.stats.dropped, 1, 'work left in the queue was not counted')
+
+    async def test_game_inboxes_are_exported(self):
+        game = make_test_game(Chess)
+        self.addCleanup(game.inbox.close)
+        await game.inbox.call(lambda: None)
+
+        metrics = Exposition()
+        Server(load_packs()).write_game_metrics(metrics)
+
+        for name in [
+            'chessmaker_game_inbox_processed_total',
+            'chessmaker_game_inbox_dropped_total',
+            'chessmaker_game_inbox_wait_seconds_sum',
+            'chessmaker_game_inbox_run_seconds_sum',
+        ]:
+            self.assertTrue(
+                any(line.startswith(f'{name}{{controller="Chess"}}') for line in metrics.lines),
+                f'{name} was not exported for the game\'s controller',
+            )
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..actions import MoveAction
+from ..color import Color
+from ..journal import Journal, shard_of
+from ..packs.party import Jousting
+from ..packs.standard import Chess
+from ..ply import Ply
+from ..game import board_to_json
+from ..game_subscribers import GameSubscribers
+from ..pack import load_packs
+from ..recovery import make_owner, recover_snapshots, restore_game
+from ..server import Server
+from ..testing import make_test_game
+from ..vector2 import Vector2
+
+
+def move(from_pos: Vector2, to_pos: Vector2) -> Ply:
+    return Ply('Move', [MoveAction(from_pos, to_pos)])
+
+
+class TestJournal(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = Journal(self.directory, shards=2, flush_interval=0)
+
+    def tearDown(self):
+        self.journal.executor.shutdown()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _records(self):
+        snapshots, records = self.journal.read()
+        return records
+
+    async def test_recovery_round_trip(self):
+        game = make_test_game(Chess, journal=self.journal)
+        game.apply_ply(Color.WHITE, move(Vector2(6, 4), Vector2(4, 4)))
+        game.apply_ply(Color.BLACK, move(Vector2(1, 4), Vector2(3, 4)))
+        deleted = make_test_game(Chess, journal=self.journal)
+        self.journal.game_deleted(deleted)
+        await self.journal.flush()
+
+        self.assertEqual(self.journal.pending, {})
+        self.assertEqual([record['type'] for record in self._records()[game.id]], ['create', 'ply', 'ply'])
+
+        snapshots = recover_snapshots(self.journal, workers=1)
+        self.assertEqual([snapshot['game_id'] for snapshot in snapshots], [game.id], 'deleted game was recovered')
+        self.assertEqual(snapshots[0], game.to_snapshot())
+
+    async def test_state_changes_are_replayed(self):
+        game = make_test_game(Jousting, {'Game Start Timer': 0}, journal=self.journal)
+        for color in [Color.WHITE, Color.BLACK]:
+            game.add_player(make_owner({'owner_id': color.name, 'owner_display_name': color.name}), color)
+
+        # Starting the game changes the controller's state without a ply.
+        game.controller._start_game(Color.WHITE)
+        await asyncio.gather(*game.tasks)
+        self.assertTrue(game.controller.game_started)
+        await self.journal.flush()
+
+        self.assertEqual([record['type'] for record in self._records()[game.id]], ['create', 'ply', 'state'])
+
+        snapshot, = recover_snapshots(self.journal, workers=1)
+        self.assertEqual(snapshot['controller_state'], {'game_started': True}, 'started game was replayed as waiting')
+
+    async def test_compaction(self):
+        game = make_test_game(Chess, journal=self.journal)
+        game.apply_ply(Color.WHITE, move(Vector2(6, 4), Vector2(4, 4)))
+        await self.journal.flush()
+
+        await self.journal.compact([game.to_snapshot()])
+        self.assertEqual(self._records(), {}, 'journal was not emptied by compaction')
+
+        game.apply_ply(Color.BLACK, move(Vector2(1, 4), Vector2(3, 4)))
+        await self.journal.flush()
+
+        snapshots = recover_snapshots(self.journal, workers=1)
+        self.assertEqual(snapshots, [game.to_snapshot()])
+
+    async def test_compaction_keeps_changes_between_chunks(self):
+        server = Server(load_packs(), journal=self.journal)
+        server.compaction_chunk_size = 1
+        first, second = make_test_game(Chess, journal=self.journal), make_test_game(Chess, journal=self.journal)
+        server.games = {first.id: first, second.id: second}
+
+        snapshotting = asyncio.ensure_future(server.snapshot_games())
+        await asyncio.sleep(0)
+
+        # One game changes after its snapshot was taken, the other before.
+        first.apply_ply(Color.WHITE, move(Vector2(6, 4), Vector2(4, 4)))
+        second.apply_ply(Color.WHITE, move(Vector2(6, 3), Vector2(4, 3)))
+
+        snapshots = await snapshotting
+        self.assertEqual(snapshots[0]['plies'], [], 'first chunk was not taken before the changes')
+
+        await self.journal.compact(snapshots)
+        await self.journal.flush()
+
+        self.assertEqual(
+            sorted(recover_snapshots(self.journal, workers=1), key=lambda snapshot: snapshot['game_id']),
+            sorted([first.to_snapshot(), second.to_snapshot()], key=lambda snapshot: snapshot['game_id']),
+            'change made between chunks was lost',
+        )
+
+    async def test_failed_flush_is_retried(self):
+        game = make_test_game(Chess, journal=self.journal)
+        shard_path = self.journal.shard_path(shard_of(game.id, self.journal.shards))
+
+        # A directory in place of the shard's file makes writing it fail.
+        os.mkdir(shard_path)
+        with self.assertRaises(OSError):
+            await self.journal.flush()
+
+        game.apply_ply(Color.WHITE, move(Vector2(6, 4), Vector2(4, 4)))
+        self.assertEqual(len(self.journal.pending[shard_of(game.id, self.journal.shards)]), 2)
+
+        os.rmdir(shard_path)
+        await self.journal.flush()
+
+        self.assertEqual(
+            [record['type'] for record in self._records()[game.id]],
+            ['create', 'ply'],
+            'records were lost, repeated or reordered after a failed flush',
+        )
+
+    async def test_failed_flush_is_dropped_after_compaction(self):
+        game = make_test_game(Chess, journal=self.journal)
+        shard_path = self.journal.shard_path(shard_of(game.id, self.journal.shards))
+        os.mkdir(shard_path)
+
+        # The compaction is queued behind the failing write, and already holds the game.
+        flush = self.journal.flush()
+        compact = self.journal.compact([game.to_snapshot()])
+
+        with self.assertRaises(OSError):
+            await flush
+
+        os.rmdir(shard_path)
+        await compact
+
+        self.assertEqual(self.journal.pending, {}, 'records in the snapshot were kept to be written again')
+        self.assertEqual(recover_snapshots(self.journal, workers=1), [game.to_snapshot()])
+
+    async def test_close_writes_pending(self):
+        game = make_test_game(Chess, journal=self.journal)
+        self.journal.close()
+
+        self.assertEqual([record['type'] for record in self._records()[game.id]], ['create'])
+
+
+class TestSnapshots(unittest.TestCase):
+
+    def test_restore_uses_stored_board(self):
+        game = make_test_game(Chess)
+        game.apply_ply(Color.WHITE, move(Vector2(6, 4), Vector2(4, 4)))
+        game.apply_ply(Color.BLACK, move(Vector2(1, 4), Vector2(3, 4)))
+        game.apply_ply(Color.WHITE, move(Vector2(7, 6), Vector2(5, 5)))
+
+        snapshot = game.to_snapshot()
+        restored = restore_game(snapshot, load_packs(), make_owner(snapshot), None, GameSubscribers())
+        history = restored.game_data.history
+
+        self.assertTrue(all(state.board is None for state in history[1:-1]), 'plies before the snapshot were applied')
+        self.assertEqual(board_to_json(restored.board), board_to_json(game.board))
+        self.assertEqual(
+            [piece.moves for piece in restored.board.values()],
+            [piece.moves for piece in game.board.values()],
+        )
+        self.assertEqual(restored.get_history_page(0), game.get_history_page(0), 'older boards were not rebuilt')
+
+        restored.undo_ply()
+        game.undo_ply()
+        self.assertEqual(board_to_json(restored.board), board_to_json(game.board), 'undo did not rebuild the board')
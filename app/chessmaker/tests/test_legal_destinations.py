@@ -0,0 +1,107 @@
+import unittest
+from typing import Dict, List
+
+from ..actions import MoveAction
+from ..color import Color
+from ..packs.party import Duos
+from ..packs.standard import Chess
+from ..ply import NoMovesError, Ply
+from ..testing import TestConnection, make_test_game
+from ..vector2 import Vector2
+
+
+class TestLegalDestinations(unittest.TestCase):
+
+    def setUp(self):
+        self.game = make_test_game(Chess)
+        self.white = TestConnection('White')
+        self.black = TestConnection('Black')
+        self.game.add_player(self.white, Color.WHITE)
+        self.game.add_player(self.black, Color.BLACK)
+
+    def _move(self, from_pos: Vector2, to_pos: Vector2) -> None:
+        piece = self.game.board[from_pos]
+        self.game.apply_ply(piece.color, Ply('Move', [MoveAction(from_pos, to_pos)]))
+
+    def _scan(self, color: Color, from_pos: Vector2) -> Dict[Vector2, List[Ply]]:
+        """ Checks every square with get_plies, which the destinations should always agree with. """
+
+        result = {}
+
+        for row in range(self.game.controller.board_size.row):
+            for col in range(self.game.controller.board_size.col):
+                to_pos = Vector2(row, col)
+                if to_pos == from_pos:
+                    continue
+
+                try:
+                    plies = list(self.game.controller.get_plies(color, from_pos, to_pos))
+                except NoMovesError:
+                    continue
+
+                if plies:
+                    result[to_pos] = plies
+
+        return result
+
+    def _assert_matches_scan(self, color: Color) -> None:
+        def to_json(destinations: Dict[Vector2, List[Ply]]):
+            # Plies that create a piece, like promotions, create a new one each time, so compare them as sent.
+            return {to_pos: [ply.to_json() for ply in plies] for to_pos, plies in destinations.items()}
+
+        for from_pos, piece in list(self.game.board.items()):
+            self.assertEqual(
+                to_json(self.game.controller.get_legal_destinations(color, from_pos)),
+                to_json(self._scan(color, from_pos)),
+                f'destinations of {piece.name} at {from_pos} differ from checking every square',
+            )
+
+    def test_opening(self):
+        destinations = self.game.get_legal_destinations(self.white, Vector2(7, 1))
+        self.assertEqual(set(destinations), {Vector2(5, 0), Vector2(5, 2)})
+
+        destinations = self.game.get_legal_destinations(self.white, Vector2(6, 4))
+        self.assertEqual(set(destinations), {Vector2(5, 4), Vector2(4, 4)})
+
+        self._assert_matches_scan(Color.WHITE)
+
+    def test_not_own_turn_or_piece(self):
+        self.assertEqual(self.game.get_legal_destinations(self.black, Vector2(1, 4)), {})
+        self.assertEqual(self.game.get_legal_destinations(self.white, Vector2(1, 4)), {})
+
+    def test_check_and_castling(self):
+        # Open the king's side and pin the f7 pawn with the queen, so black has to deal with the threat.
+        self._move(Vector2(6, 4), Vector2(4, 4))
+        self._move(Vector2(1, 4), Vector2(3, 4))
+        self._move(Vector2(7, 5), Vector2(4, 2))
+        self._move(Vector2(0, 1), Vector2(2, 2))
+        self._move(Vector2(7, 6), Vector2(5, 5))
+        self._move(Vector2(1, 3), Vector2(2, 3))
+
+        castle = self.game.controller.get_legal_destinations(Color.WHITE, Vector2(7, 4))
+        self.assertIn(Vector2(7, 6), castle, 'white cannot castle')
+        self.assertEqual([ply.name for ply in castle[Vector2(7, 6)]], ['Castle'])
+        self._assert_matches_scan(Color.WHITE)
+
+        self._move(Vector2(4, 2), Vector2(1, 5))
+        self._assert_matches_scan(Color.BLACK)
+
+    def test_cached_until_board_changes(self):
+        first = self.game.get_legal_destinations(self.white, Vector2(6, 4))
+        self.assertIs(self.game.get_legal_destinations(self.white, Vector2(6, 4)), first)
+
+        self._move(Vector2(6, 4), Vector2(4, 4))
+        self.assertEqual(self.game.get_legal_destinations(self.white, Vector2(4, 4)), {}, 'it is still white\'s turn')
+
+    def test_duos_promotion(self):
+        # Duos promotes a pawn on any square of its last row, including ones the pawn itself cannot reach.
+        self.game = make_test_game(Duos)
+
+        destinations = self.game.controller.get_legal_destinations(Color.ORANGE, Vector2(6, 0))
+        self.assertIn(Vector2(0, 3), destinations, 'orange pawn cannot promote')
+        self.assertEqual(
+            [ply.name for ply in destinations[Vector2(0, 3)]],
+            ['Promote to Queen', 'Promote to Knight', 'Promote to Rook', 'Promote to Bishop'],
+        )
+
+        self._assert_matches_scan(Color.ORANGE)
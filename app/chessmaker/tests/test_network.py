@@ -0,0 +1,35 @@
+import unittest
+
+from ..network import Network
+from ..testing import TestConnection
+
+
+class TestTryCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.network = Network(lambda connection: None, lambda connection: None)
+        self.connection = TestConnection()
+        self.received = []
+
+        def echo(connection, text: str):
+            self.received.append(text)
+
+        self.network.register_command('echo', echo)
+
+    def test_not_an_object(self):
+        for data in [[], [1, 2], 'echo', 5, None]:
+            self.network.try_command(self.connection, data)
+
+        self.assertEqual(self.connection.errors(), ['Command Not Specified'] * 5)
+
+    def test_parameters_not_an_object(self):
+        self.network.try_command(self.connection, {'command': 'echo', 'parameters': ['text']})
+
+        self.assertEqual(self.connection.errors(), ['This command requires the following parameters: text.'])
+        self.assertEqual(self.received, [])
+
+    def test_command(self):
+        self.network.try_command(self.connection, {'command': 'echo', 'parameters': {'text': 'Hello'}})
+
+        self.assertEqual(self.connection.errors(), [])
+        self.assertEqual(self.received, ['Hello'])
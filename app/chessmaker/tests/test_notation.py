@@ -0,0 +1,147 @@
+import shutil
+import tempfile
+import unittest
+
+from ..color import Color
+from ..journal import Journal
+from ..network import ConnectionRegistry
+from ..notation import NotationError, format_game, import_game, journal_owners, read_games
+from ..pack import load_packs
+from ..packs.standard import Chess
+from ..testing import make_test_game
+from ..vector2 import Vector2
+
+GAME = '''
+; A comment before the game.
+[Id "test-game"]
+[Name "Notation Game"]
+[Owner "Alice"]
+[Pack "standard"]
+[Controller "Chess"]
+[Options "{}"]
+[Winners "BLACK"]
+[Reason "Checkmate"]
+
+WHITE "Double Advance" r6c4-r4c4
+BLACK "Capture" xr4c4 r1c4-r4c4
+- "Create" +standard/Pawn/WHITE/NORTH@r5c4
+-
+'''
+
+
+class TestNotation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.packs = load_packs()
+
+    def _read(self, text: str):
+        return list(read_games(text.splitlines()))
+
+    def test_read(self):
+        self.assertEqual(self._read(GAME), [{
+            'game_id': 'test-game',
+            'name': 'Notation Game',
+            'owner_display_name': 'Alice',
+            'controller_pack_id': 'standard',
+            'controller_id': 'Chess',
+            'options': {},
+            'winners': {'colors': [Color.BLACK.value], 'reason': 'Checkmate'},
+            'plies': [
+                {'color': Color.WHITE.value, 'ply': {'name': 'Double Advance', 'actions': [
+                    {'type': 'move', 'from_pos_row': 6, 'from_pos_col': 4, 'to_pos_row': 4, 'to_pos_col': 4},
+                ]}},
+                {'color': Color.BLACK.value, 'ply': {'name': 'Capture', 'actions': [
+                    {'type': 'destroy', 'to_pos_row': 4, 'to_pos_col': 4},
+                    {'type': 'move', 'from_pos_row': 1, 'from_pos_col': 4, 'to_pos_row': 4, 'to_pos_col': 4},
+                ]}},
+                {'color': None, 'ply': {'name': 'Create', 'actions': [{
+                    'type': 'create',
+                    'to_pos_row': 5,
+                    'to_pos_col': 4,
+                    'piece': {
+                        'pack_id': 'standard',
+                        'piece_type_id': 'Pawn',
+                        'color': Color.WHITE.value,
+                        'direction': 0,
+                    },
+                }]}},
+                {'color': None, 'ply': None},
+            ],
+        }])
+
+    def test_tags_start_the_next_game(self):
+        games = self._read(GAME + GAME.replace('test-game', 'other-game'))
+        self.assertEqual([game['game_id'] for game in games], ['test-game', 'other-game'])
+
+        # A repeated tag starts a new game even if the previous one has no plies.
+        games = self._read('[Pack "standard"]\n[Controller "Chess"]\n[Pack "standard"]\n[Controller "Chess"]\n')
+        self.assertEqual(len(games), 2)
+
+    def test_export_import_round_trip(self):
+        game = make_test_game(Chess)
+        for color, from_pos, to_pos in [
+            (Color.WHITE, Vector2(6, 4), Vector2(4, 4)),
+            (Color.BLACK, Vector2(1, 3), Vector2(3, 3)),
+            (Color.WHITE, Vector2(4, 4), Vector2(3, 3)),
+        ]:
+            game.apply_ply(color, next(iter(game.controller.get_plies(color, from_pos, to_pos))))
+
+        snapshot = game.to_snapshot()
+        read, = read_games(format_game(snapshot))
+
+        self.assertEqual(read, {key: value for key, value in snapshot.items() if key not in (
+            'owner_id', 'board', 'controller_state',
+        )}, 'game changed on its way through the notation')
+
+        imported = import_game(read, self.packs)
+        self.assertEqual(imported.to_snapshot()['plies'], snapshot['plies'])
+        self.assertEqual(imported.board.keys(), game.board.keys())
+        self.assertEqual(imported.owner.display_name, game.owner.display_name)
+
+    def test_errors(self):
+        for text, message in [
+            ('WHITE "Move" r6c4-r5c4', 'Line 1: Plies must come after the tags of a game.'),
+            ('[Pack "standard"]\n[Unknown "value"]', 'Line 2: "[Unknown "value"]" is not a valid tag.'),
+            ('[Pack "standard"]\n\nWHITE "Move" r6c4-r5c4', 'Line 3: Game is missing the Controller tag.'),
+            ('[Pack "standard"]\n[Controller "Chess"]\n\nWHITE "Move" r6c4-5c4', 'Line 4: "5c4" is not a board'),
+            ('[Pack "standard"]\n[Controller "Chess"]\n\nGREY "Move" r6c4-r5c4', 'Line 4: \'GREY\''),
+            ('[Pack "standard"]\n[Controller "Chess"]\n[Options "{"]', 'Line 3: '),
+        ]:
+            with self.subTest(text=text):
+                with self.assertRaises(NotationError) as context:
+                    self._read(text)
+
+                self.assertTrue(str(context.exception).startswith(message), str(context.exception))
+
+        game, = self._read('[Pack "standard"]\n[Controller "Unknown"]')
+        with self.assertRaisesRegex(ValueError, 'standard/Unknown does not exist'):
+            import_game(game, self.packs)
+
+    def test_imported_games_share_owners(self):
+        owners = ConnectionRegistry()
+        first, second, other = [
+            import_game(game, self.packs, owners=owners)
+            for game in self._read(GAME + GAME.replace('test-game', 'second') + GAME.replace('Alice', 'Bob'))
+        ]
+
+        self.assertIs(first.owner, second.owner, 'games of one player were given different owners')
+        self.assertIsNot(first.owner, other.owner)
+        self.assertEqual(set(owners.by_display_name), {'Alice', 'Bob'})
+
+    def test_journal_owners(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+
+        journal = Journal(directory, shards=2, flush_interval=0)
+        game, = self._read(GAME)
+        existing = import_game(game, self.packs, journal)
+        journal.close()
+
+        # Games imported later are given to the owner that is already in the journal.
+        journal = Journal(directory, shards=2, flush_interval=0)
+        self.addCleanup(journal.close)
+        game['game_id'] = 'second'
+        imported = import_game(game, self.packs, journal, journal_owners(journal))
+
+        self.assertEqual(imported.owner.id, existing.owner.id, 'imported game did not reuse the journal\'s owner')
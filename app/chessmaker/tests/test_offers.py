@@ -0,0 +1,107 @@
+import unittest
+
+from ..actions import MoveAction
+from ..color import Color
+from ..pack import load_packs
+from ..packs.standard import Chess
+from ..ply import Ply
+from ..server import Server
+from ..testing import TestConnection, make_test_game
+from ..vector2 import Vector2
+
+
+class TestPlyOffers(unittest.TestCase):
+
+    def setUp(self):
+        self.game = make_test_game(Chess)
+        self.white = TestConnection('White')
+        self.game.add_player(self.white, Color.WHITE)
+
+        self.from_pos = Vector2(6, 0)
+        self.to_pos = Vector2(5, 0)
+        self.plies = [
+            Ply('Single Advance', [MoveAction(self.from_pos, self.to_pos)]),
+            Ply('Sidestep', [MoveAction(self.from_pos, Vector2(5, 1))]),
+        ]
+        self.regenerated = list(self.plies)
+
+    def _offer(self) -> dict:
+        self.game.apply_or_offer_choices(self.from_pos, self.to_pos, self.plies, self.white, lambda: self.regenerated)
+        offers = self.white.sent('offer_plies')
+        self.assertEqual(len(offers), 1, 'several plies were not offered')
+
+        return {ply['name']: ply['id'] for ply in offers[0]['plies']}
+
+    def test_single_ply_is_applied(self):
+        self.game.apply_or_offer_choices(self.from_pos, self.to_pos, self.plies[:1], self.white, lambda: [])
+
+        self.assertEqual(self.white.sent('offer_plies'), [], 'a single ply was offered')
+        self.assertEqual(self.game.game_data.history[-1].ply, self.plies[0], 'a single ply was not applied')
+
+    def test_take_offered_ply(self):
+        ply_ids = self._offer()
+
+        self.assertEqual(self.game.take_offered_ply(self.white, ply_ids['Sidestep']), self.plies[1])
+        self.assertIsNone(
+            self.game.take_offered_ply(self.white, ply_ids['Sidestep']),
+            'an offer can be taken more than once',
+        )
+
+    def test_unknown_ply_id(self):
+        self._offer()
+
+        self.assertIsNone(self.game.take_offered_ply(self.white, 'unknown'))
+        self.assertIsNone(self.game.take_offered_ply(TestConnection('Other'), 'unknown'))
+
+    def test_stale_offer_is_regenerated(self):
+        ply_ids = self._offer()
+        self.game.apply_ply(Color.WHITE, Ply('Advance', [MoveAction(Vector2(6, 7), Vector2(5, 7))]))
+
+        # The board changed, so the ply is looked up again among the plies that are still available.
+        self.regenerated = [Ply('Single Advance', [MoveAction(self.from_pos, self.to_pos)])]
+        self.assertEqual(self.game.take_offered_ply(self.white, ply_ids['Single Advance']), self.regenerated[0])
+
+    def test_stale_offer_is_rejected(self):
+        ply_ids = self._offer()
+        self.game.apply_ply(Color.WHITE, Ply('Advance', [MoveAction(Vector2(6, 7), Vector2(5, 7))]))
+
+        self.regenerated = [self.plies[0]]
+        self.assertIsNone(
+            self.game.take_offered_ply(self.white, ply_ids['Sidestep']),
+            'a ply that is no longer available was taken',
+        )
+
+    def test_leaving_drops_offer(self):
+        ply_ids = self._offer()
+        self.game.remove_player(self.white)
+
+        self.assertIsNone(self.game.take_offered_ply(self.white, ply_ids['Single Advance']))
+
+
+class TestSubmitPly(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server(load_packs())
+        self.white = TestConnection('White')
+        self.game = make_test_game(Chess)
+        self.game.add_player(self.white, Color.WHITE)
+        self.server.add_game(self.game)
+
+    def test_submit_offered_ply(self):
+        plies = [
+            Ply('Single Advance', [MoveAction(Vector2(6, 0), Vector2(5, 0))]),
+            Ply('Double Advance', [MoveAction(Vector2(6, 0), Vector2(4, 0))]),
+        ]
+        self.game.apply_or_offer_choices(Vector2(6, 0), Vector2(5, 0), plies, self.white, lambda: plies)
+        ply_id = next(ply['id'] for ply in self.white.sent('offer_plies')[0]['plies'] if ply['name'] == 'Double Advance')
+
+        self.server.on_submit_ply(self.white, self.game.id, ply_id)
+
+        self.assertEqual(self.white.errors(), [])
+        self.assertEqual(self.game.game_data.history[-1].ply, plies[1])
+
+    def test_submit_without_offer(self):
+        self.server.on_submit_ply(self.white, self.game.id, 'unknown')
+
+        self.assertEqual(self.white.errors(), ['Ply not available.'])
+        self.assertEqual(len(self.game.game_data.history), 1, 'a ply was applied without being offered')
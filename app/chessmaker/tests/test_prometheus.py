@@ -0,0 +1,45 @@
+import asyncio
+import unittest
+
+from ..prometheus import Exposition, MetricsServer
+
+
+class TestMetricsServer(unittest.IsolatedAsyncioTestCase):
+
+    async def _get(self, collect, path: str = '/metrics') -> bytes:
+        metrics_server = MetricsServer(0)
+        metrics_server.collect = collect
+
+        server = await asyncio.start_server(metrics_server.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+            response = await reader.read()
+            writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+        return response
+
+    async def test_metrics(self):
+        def collect(metrics: Exposition):
+            metrics.gauge('test_value', 'A test value.', 3)
+
+        response = await self._get(collect)
+
+        self.assertTrue(response.startswith(b'HTTP/1.1 200 OK\r\n'))
+        self.assertIn(b'\ntest_value 3\n', response)
+
+    async def test_collect_error(self):
+        def collect(metrics: Exposition):
+            raise ValueError('Test')
+
+        response = await self._get(collect)
+        self.assertTrue(response.startswith(b'HTTP/1.1 500 Internal Server Error\r\n'), 'error was not reported')
+
+    async def test_not_found(self):
+        response = await self._get(lambda metrics: None, '/other')
+        self.assertTrue(response.startswith(b'HTTP/1.1 404 Not Found\r\n'))
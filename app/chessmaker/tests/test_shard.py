@@ -0,0 +1,152 @@
+import asyncio
+import unittest
+from typing import Dict
+
+from ..journal import shard_of
+from ..pack import load_packs
+from ..shard import SHARD_HOST, SHARD_MESSAGE_LIMIT, FrontServer, ShardLink, WorkerServer
+from ..testing import TestConnection
+
+
+class InProcessFrontServer(FrontServer):
+    """ Runs its workers as tasks in the test's event loop, talking to the front end over real links. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.worker_servers: Dict[int, WorkerServer] = {}
+
+    def start_worker(self, index: int) -> None:
+        async def run():
+            reader, writer = await asyncio.open_connection(SHARD_HOST, self.port, limit=SHARD_MESSAGE_LIMIT)
+            link = ShardLink(reader, writer)
+            link.send('hello', index)
+
+            server = self.worker_servers[index] = WorkerServer(self.packs, link, index, self.workers)
+            server.test_game_idle_timeout = 0
+            await server.run()
+
+        asyncio.get_event_loop().create_task(run())
+
+
+class TestShardLink(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.front = InProcessFrontServer(load_packs(), 2)
+        self.front.worker_restart_delay = 0.2
+        await asyncio.wait_for(self.front.start_workers(), 5)
+
+        self.player = TestConnection('Player')
+        self.front.network.connections.add(self.player)
+        self.front.on_connect(self.player)
+
+    async def asyncTearDown(self):
+        self.front.closing = True
+        for server in self.front.worker_servers.values():
+            server.link.writer.close()
+
+        await self._until(lambda: self.front.links == [None, None], 'links were not closed')
+
+        for server in self.front.worker_servers.values():
+            server.evaluation_executor.shutdown()
+
+    async def _until(self, condition, message: str) -> None:
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+
+        self.fail(message)
+
+    async def _create_game(self) -> str:
+        known = set(self.front.games)
+        self.front.network.try_command(self.player, {'command': 'create_game', 'parameters': {
+            'name': 'Shard Game',
+            'controller_pack_id': 'standard',
+            'controller_id': 'Chess',
+            'options': {},
+        }})
+
+        await self._until(lambda: len(self.front.games) > len(known), 'created game never reached the lobby')
+        return next(game_id for game_id in self.front.games if game_id not in known)
+
+    async def test_commands_reach_owning_worker(self):
+        await self._until(lambda: len(self.front.games) == 1, 'test game was not created on one worker')
+
+        game_id = await self._create_game()
+        worker = self.front.worker_servers[shard_of(game_id, 2)]
+        self.assertIn(game_id, worker.games, 'game is not on the worker its id belongs to')
+
+        self.front.network.try_command(self.player, {'command': 'show_game', 'parameters': {'game_id': game_id}})
+        await self._until(
+            lambda: any(data['id'] == game_id for data in self.player.sent('update_game_data')),
+            'game data was not passed back through the front end',
+        )
+
+    async def test_lost_worker(self):
+        game_id = await self._create_game()
+        index = shard_of(game_id, 2)
+
+        lost = self.front.worker_servers[index]
+        lost.link.writer.close()
+        await self._until(lambda: self.front.links[index] is None, 'front end did not notice the lost link')
+
+        self.assertNotIn(game_id, self.front.games, 'games of a lost worker were left in the lobby')
+        self.assertIn(game_id, [data['game_id'] for data in self.player.sent('game_removed')])
+
+        self.front.network.try_command(self.player, {'command': 'show_game', 'parameters': {'game_id': game_id}})
+        self.assertEqual(
+            self.player.errors(),
+            ['This game is not available right now. Please try again shortly.'],
+            'command for a lost worker was not refused',
+        )
+
+        # New games go to the worker that is still running.
+        other_id = await self._create_game()
+        self.assertNotEqual(shard_of(other_id, 2), index)
+
+        # The worker is started again and told who is connected.
+        await self._until(
+            lambda: self.front.worker_servers[index] is not lost and self.front.links[index] is not None,
+            'lost worker was not restarted',
+        )
+        await self._until(
+            lambda: self.player.id in self.front.worker_servers[index].network.connections.by_id,
+            'restarted worker was not told about connected players',
+        )
+
+    async def test_reclaimed_test_game_is_forgotten(self):
+        await self._until(lambda: len(self.front.games) == 1, 'test game was not created on one worker')
+        index = self.front.test_game_workers[self.player.id]
+        worker = self.front.worker_servers[index]
+
+        worker.remove_game(worker.test_games[self.player.id])
+
+        await self._until(
+            lambda: self.player.id not in self.front.test_game_workers,
+            'front end kept the worker of a test game that was removed',
+        )
+
+    async def test_expired_connection_is_forgotten(self):
+        await self._until(lambda: len(self.front.games) == 1, 'test game was not created on one worker')
+        worker = self.front.worker_servers[self.front.test_game_workers[self.player.id]]
+        worker.remove_game(worker.test_games[self.player.id])
+        await self._until(lambda: self.player.id not in self.front.test_game_workers, 'test game was not forgotten')
+
+        # Entries can outlive the test game, such as when its worker was lost before reporting that it was removed.
+        self.front.test_game_workers[self.player.id] = 0
+        self.front.network.connections.set_active(self.player, False)
+        self.front.network.inactive_ttl = 0
+        self.front.network.remove_expired_connections()
+
+        self.assertNotIn(self.player.id, self.front.network.connections.by_id)
+        self.assertNotIn(self.player.id, self.front.test_game_workers, 'expired player\'s test game worker was kept')
+
+    async def test_front_end_does_not_sweep(self):
+        await self._until(lambda: len(self.front.games) == 1, 'test game was not created on one worker')
+
+        # The front end only has lobby entries, which the sweep cannot tell are idle, and has nothing to evaluate.
+        self.assertIsNone(self.front.evaluation_executor, 'front end has an evaluation pool')
+        self.assertEqual(self.front.idle_timeouts(), [], 'front end would start sweeping its lobby entries')
+        self.front.sweep_idle_games_once()
+
+        self.assertEqual(len(self.front.games), 1, 'sweep removed a lobby entry')
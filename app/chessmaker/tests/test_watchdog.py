@@ -0,0 +1,41 @@
+import asyncio
+import time
+import unittest
+
+from ..metrics import RunningCommand, running
+from ..pack import load_packs
+from ..prometheus import Exposition
+from ..server import Server
+from ..watchdog import Watchdog
+
+
+class TestWatchdog(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.watchdog = Watchdog(threshold=0.05, interval=0.01, log_interval=float('inf'))
+        self.task = asyncio.create_task(self.watchdog.run())
+        await asyncio.sleep(0.02)
+
+    async def asyncTearDown(self):
+        self.task.cancel()
+        self.watchdog.close()
+
+    async def test_stall_is_blamed_on_command(self):
+        with running(RunningCommand('slow_command')):
+            # Blocks the event loop, as a slow handler would.
+            time.sleep(0.2)
+
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(self.watchdog.stalls, 1, 'stall was not recorded')
+        self.assertEqual(self.watchdog.stalls_by_command, {'slow_command': 1}, 'stall was blamed on the wrong command')
+        self.assertEqual(self.watchdog.recent[-1].command.command, 'slow_command')
+        self.assertIsNotNone(self.watchdog.recent[-1].stack, 'loop\'s stack was not sampled during the stall')
+
+        server = Server(load_packs(), watchdog=self.watchdog)
+        metrics = Exposition()
+        server.write_metrics(metrics)
+        self.assertIn('chessmaker_loop_command_stalls_total{command="slow_command"} 1', metrics.lines)
+
+        server.close()
+        self.assertTrue(self.watchdog.stopped.is_set(), 'server did not stop the watchdog\'s thread')
@@ -0,0 +1,127 @@
+""" Watches the event loop for stalls and records which command was running when they happened. """
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+from .metrics import Histogram, RunningCommand, current, last
+
+WATCHDOG_THRESHOLD = 0.1
+WATCHDOG_INTERVAL = 0.02
+WATCHDOG_LOG_INTERVAL = 10
+
+# Upper bounds of the stall histogram buckets, in seconds.
+STALL_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+RECENT_STALLS = 20
+
+
+@dataclass
+class Stall:
+    time: float
+    duration: float
+    command: Optional[RunningCommand]
+    # Stack of the event loop's thread, if it was sampled during the stall.
+    stack: Optional[str]
+
+
+class Watchdog:
+    """ Measures how late the event loop wakes up from a short sleep, and records a stall when it is over `threshold`.
+
+    A separate thread watches the loop's heartbeat, so it can sample the loop's stack while it is stuck. Stalls are
+    logged at most once every `log_interval` seconds. """
+
+    def __init__(
+        self,
+        threshold: float = WATCHDOG_THRESHOLD,
+        interval: float = WATCHDOG_INTERVAL,
+        log_interval: float = WATCHDOG_LOG_INTERVAL,
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.log_interval = log_interval
+
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.histogram = Histogram(STALL_BUCKETS)
+        self.stalls_by_command: Dict[str, int] = {}
+        self.recent: Deque[Stall] = deque(maxlen=RECENT_STALLS)
+
+        self.heartbeat = time.perf_counter()
+        self.loop_thread: Optional[int] = None
+        # The heartbeat the sample was taken for, what was running and the loop's stack.
+        self.sample: Optional[Tuple[float, Optional[RunningCommand], str]] = None
+        self.stopped = threading.Event()
+
+        self.last_log = 0.0
+        self.unlogged = 0
+
+    async def run(self) -> None:
+        self.loop_thread = threading.get_ident()
+        threading.Thread(target=self._monitor, name='watchdog', daemon=True).start()
+
+        while True:
+            self.heartbeat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+
+            lag = time.perf_counter() - self.heartbeat - self.interval
+            self.max_lag = max(self.max_lag, lag)
+
+            if lag >= self.threshold:
+                self._record(lag)
+
+    def _monitor(self) -> None:
+        while not self.stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            stalled = time.perf_counter() - heartbeat - self.interval >= self.threshold
+
+            if stalled and (self.sample is None or self.sample[0] != heartbeat):
+                frame = sys._current_frames().get(self.loop_thread, None)
+                if frame is not None:
+                    self.sample = (heartbeat, current(), ''.join(traceback.format_stack(frame)))
+
+    def _record(self, lag: float) -> None:
+        if self.sample is not None and self.sample[0] == self.heartbeat:
+            _, command, stack = self.sample
+        else:
+            # The stall ended before the monitor saw it, so blame whatever ran last.
+            command, stack = last(), None
+
+        stall = Stall(time.time(), lag, command, stack)
+        self.recent.append(stall)
+
+        self.stalls += 1
+        self.histogram.add(lag)
+
+        name = 'unknown' if command is None else command.command
+        self.stalls_by_command[name] = self.stalls_by_command.get(name, 0) + 1
+
+        self._log(stall)
+
+    def _log(self, stall: Stall) -> None:
+        now = time.monotonic()
+        if now - self.last_log < self.log_interval:
+            self.unlogged += 1
+            return
+
+        message = f'Event loop stalled for {stall.duration * 1000:.0f}ms'
+        message += ' (unknown command)' if stall.command is None else f' running {stall.command}'
+
+        if self.unlogged:
+            message += f', {self.unlogged} more stalls since the last report'
+
+        print(message, file=sys.stderr)
+        if stall.stack is not None:
+            print(stall.stack, file=sys.stderr)
+
+        self.last_log = now
+        self.unlogged = 0
+
+    def close(self) -> None:
+        self.stopped.set()
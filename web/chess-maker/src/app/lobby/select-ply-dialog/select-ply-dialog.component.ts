@@ -17,8 +17,6 @@ export class SelectPlyDialog {
     selectPly(ply: Ply): void {
         this.api.submitPly(
             this.data.game,
-            this.data.from,
-            this.data.to,
             ply,
         );
     }
@@ -8,11 +8,19 @@ import {Color} from "../color/color.service";
 import {Game, GameService, InfoElement, InventoryItem, Ply, Vector2} from "../game/game.service";
 import {PlayerService} from "../player/player.service";
 import {ChatService} from "../chat/chat.service";
+import {PreferencesService} from "../preferences/preferences.service";
 import {SetPlayerCommand} from "./commands/set-player-command";
 import {UpdatePlayersCommand} from "./commands/update-players-command";
+import {PlayerJoinedCommand} from "./commands/player-joined-command";
+import {PlayerChangedCommand} from "./commands/player-changed-command";
+import {PlayerLeftCommand} from "./commands/player-left-command";
 import {CommandService} from "./command.service";
 import {UpdatePackDataCommand} from "./commands/update-pack-data-command";
 import {UpdateGameMetadataCommand} from "./commands/update-game-metadata-command";
+import {GameAddedCommand} from "./commands/game-added-command";
+import {GameChangedCommand} from "./commands/game-changed-command";
+import {GameRemovedCommand} from "./commands/game-removed-command";
+import {GamesChangedCommand} from "./commands/games-changed-command";
 import {FocusGameCommand} from "./commands/focus-game-command";
 import {UpdateGameDataCommand} from "./commands/update-game-data-command";
 import {UpdateDecoratorsCommand} from "./commands/update-decorators-command";
@@ -38,13 +46,21 @@ export class ApiService {
         private packService: PackService,
         private playerService: PlayerService,
         private chatService: ChatService,
+        private preferencesService: PreferencesService,
 
         private commandService: CommandService,
         private setPlayerCommand: SetPlayerCommand,
         private focusGameCommand: FocusGameCommand,
         private updatePlayersCommand: UpdatePlayersCommand,
+        private playerJoinedCommand: PlayerJoinedCommand,
+        private playerChangedCommand: PlayerChangedCommand,
+        private playerLeftCommand: PlayerLeftCommand,
         private updatePackDataCommand: UpdatePackDataCommand,
         private updateGameMetadataCommand: UpdateGameMetadataCommand,
+        private gameAddedCommand: GameAddedCommand,
+        private gameChangedCommand: GameChangedCommand,
+        private gameRemovedCommand: GameRemovedCommand,
+        private gamesChangedCommand: GamesChangedCommand,
         private updateGameDataCommand: UpdateGameDataCommand,
         private updateDecoratorsCommand: UpdateDecoratorsCommand,
         private updateInfoCommand: UpdateInfoCommand,
@@ -65,7 +81,15 @@ export class ApiService {
     }
 
     connect(address: string, nickname: string): void {
-        this.socket = webSocket(`ws://${address}/display_name=${nickname}`);
+        let query = `display_name=${nickname}`;
+
+        // The server only resends the pack data when the cached copy is out of date.
+        if (this.preferencesService.packHash && this.preferencesService.packs) {
+            query += `&pack_hash=${this.preferencesService.packHash}`;
+        }
+
+        this.packService.serverUrl = `http://${address}`;
+        this.socket = webSocket(`ws://${address}/${query}`);
 
         this.socket.pipe(
             filter(message => message.hasOwnProperty('error'))
@@ -91,8 +115,15 @@ export class ApiService {
             setPlayer: this.setPlayerCommand.subject,
             focusGame: this.focusGameCommand.subject,
             updatePlayers: this.updatePlayersCommand.subject,
+            playerJoined: this.playerJoinedCommand.subject,
+            playerChanged: this.playerChangedCommand.subject,
+            playerLeft: this.playerLeftCommand.subject,
             updatePackData: this.updatePackDataCommand.subject,
             updateGameMetadata: this.updateGameMetadataCommand.subject,
+            gameAdded: this.gameAddedCommand.subject,
+            gameChanged: this.gameChangedCommand.subject,
+            gameRemoved: this.gameRemovedCommand.subject,
+            gamesChanged: this.gamesChangedCommand.subject,
             updateGameData: this.updateGameDataCommand.subject,
             updateDecorators: this.updateDecoratorsCommand.subject,
             updateInfo: this.updateInfoCommand.subject,
@@ -109,7 +140,14 @@ export class ApiService {
         this.getCommand('focus_game').subscribe(this.focusGameCommand.run);
         this.getCommand('update_pack_data').subscribe(this.updatePackDataCommand.run);
         this.getCommand('update_players').subscribe(this.updatePlayersCommand.run);
+        this.getCommand('player_joined').subscribe(this.playerJoinedCommand.run);
+        this.getCommand('player_changed').subscribe(this.playerChangedCommand.run);
+        this.getCommand('player_left').subscribe(this.playerLeftCommand.run);
         this.getCommand('update_game_metadata').subscribe(this.updateGameMetadataCommand.run);
+        this.getCommand('game_added').subscribe(this.gameAddedCommand.run);
+        this.getCommand('game_changed').subscribe(this.gameChangedCommand.run);
+        this.getCommand('game_removed').subscribe(this.gameRemovedCommand.run);
+        this.getCommand('games_changed').subscribe(this.gamesChangedCommand.run);
         this.getCommand('update_game_data').subscribe(this.updateGameDataCommand.run);
         this.getCommand('update_decorators').subscribe(this.updateDecoratorsCommand.run);
         this.getCommand('update_info_elements').subscribe(this.updateInfoCommand.run);
@@ -197,39 +235,11 @@ export class ApiService {
         });
     }
 
-    submitPly(game: Game, from: Vector2, to: Vector2, ply: Ply): void {
+    submitPly(game: Game, ply: Ply): void {
+        // The server remembers the plies it offered, so only the chosen one's id is sent back.
         this.run('submit_ply', {
             game_id: game.id,
-            from_row: from.row,
-            from_col: from.col,
-            to_row: to.row,
-            to_col: to.col,
-            ply: {
-                name: ply.name,
-                actions: ply.actions.map(action => {
-                    const result = {
-                        type: action.type,
-                        to_pos_row: action.toPos.row,
-                        to_pos_col: action.toPos.col,
-                    };
-
-                    if (action.fromPos) {
-                        result['from_pos_row'] = action.fromPos.row;
-                        result['from_pos_col'] = action.fromPos.col;
-                    }
-
-                    if (action.pieceType) {
-                        result['piece'] = {
-                            pack_id: action.pieceType.pack.id,
-                            piece_type_id: action.pieceType.id,
-                            color: action.color,
-                            direction: action.direction,
-                        };
-                    }
-
-                    return result;
-                }),
-            },
+            ply_id: ply.id,
         });
     }
 
@@ -1,8 +1,15 @@
 import {Injectable} from "@angular/core";
 import {SetPlayerParameters} from "./commands/set-player-command";
 import {UpdatePlayersParameters} from "./commands/update-players-command";
+import {PlayerJoinedParameters} from "./commands/player-joined-command";
+import {PlayerChangedParameters} from "./commands/player-changed-command";
+import {PlayerLeftParameters} from "./commands/player-left-command";
 import {UpdatePackDataParameters} from "./commands/update-pack-data-command";
 import {UpdateGameMetadataParameters} from "./commands/update-game-metadata-command";
+import {GameAddedParameters} from "./commands/game-added-command";
+import {GameChangedParameters} from "./commands/game-changed-command";
+import {GameRemovedParameters} from "./commands/game-removed-command";
+import {GamesChangedParameters} from "./commands/games-changed-command";
 import {FocusGameParameters} from "./commands/focus-game-command";
 import {ReplaySubject, Subject} from "rxjs";
 import {UpdateGameDataParameters} from "./commands/update-game-data-command";
@@ -20,8 +27,15 @@ export type Subjects = {
     setPlayer: Subject<SetPlayerParameters>;
     focusGame: Subject<FocusGameParameters>;
     updatePlayers: Subject<UpdatePlayersParameters>;
+    playerJoined: Subject<PlayerJoinedParameters>;
+    playerChanged: Subject<PlayerChangedParameters>;
+    playerLeft: Subject<PlayerLeftParameters>;
     updatePackData: Subject<UpdatePackDataParameters>;
     updateGameMetadata: Subject<UpdateGameMetadataParameters>;
+    gameAdded: Subject<GameAddedParameters>;
+    gameChanged: Subject<GameChangedParameters>;
+    gameRemoved: Subject<GameRemovedParameters>;
+    gamesChanged: Subject<GamesChangedParameters>;
     updateGameData: Subject<UpdateGameDataParameters>;
     updateDecorators: Subject<UpdateDecoratorsParameters>;
     updateInfo: Subject<UpdateInfoParameters>;
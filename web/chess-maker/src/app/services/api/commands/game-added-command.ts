@@ -0,0 +1,32 @@
+import {Injectable} from "@angular/core";
+import {GameMetadata} from "../../game/game.service";
+import {PlayerService} from "../../player/player.service";
+import {PackService} from "../../pack/pack.service";
+import {Command} from "../command.service";
+import {parseGameMetadata, RawGameMetadata} from "./update-game-metadata-command";
+
+export type RawGameAddedParameters = {
+    game_id: string;
+    game_metadata: RawGameMetadata;
+};
+
+export type GameAddedParameters = {
+    id: string;
+    metadata: GameMetadata;
+};
+
+@Injectable({providedIn: 'root'})
+export class GameAddedCommand extends Command<RawGameAddedParameters, GameAddedParameters> {
+    constructor(
+        private playerService: PlayerService,
+        private packService: PackService,
+    ) {
+        super();
+    }
+
+    parse = (parameters: RawGameAddedParameters): GameAddedParameters => {
+        const metadata = parseGameMetadata(parameters.game_metadata, this.playerService, this.packService);
+
+        return {id: parameters.game_id, metadata};
+    };
+}
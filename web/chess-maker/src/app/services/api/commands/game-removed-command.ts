@@ -0,0 +1,17 @@
+import {Injectable} from "@angular/core";
+import {Command} from "../command.service";
+
+export type RawGameRemovedParameters = {
+    game_id: string;
+};
+
+export type GameRemovedParameters = {
+    id: string;
+};
+
+@Injectable({providedIn: 'root'})
+export class GameRemovedCommand extends Command<RawGameRemovedParameters, GameRemovedParameters> {
+    parse = (parameters: RawGameRemovedParameters): GameRemovedParameters => {
+        return {id: parameters.game_id};
+    };
+}
@@ -0,0 +1,34 @@
+import {Injectable} from "@angular/core";
+import {GameMetadata} from "../../game/game.service";
+import {PlayerService} from "../../player/player.service";
+import {PackService} from "../../pack/pack.service";
+import {Command} from "../command.service";
+import {parseGameMetadata, RawGameMetadata} from "./update-game-metadata-command";
+
+export type RawGamesChangedParameters = {
+    game_metadata: {[id: string]: RawGameMetadata};
+};
+
+export type GamesChangedParameters = {
+    games: {[key: string]: GameMetadata};
+};
+
+@Injectable({providedIn: 'root'})
+export class GamesChangedCommand extends Command<RawGamesChangedParameters, GamesChangedParameters> {
+    constructor(
+        private playerService: PlayerService,
+        private packService: PackService,
+    ) {
+        super();
+    }
+
+    parse = (parameters: RawGamesChangedParameters): GamesChangedParameters => {
+        const games: {[key: string]: GameMetadata} = {};
+
+        for (const [id, rawGame] of Object.entries(parameters.game_metadata)) {
+            games[id] = parseGameMetadata(rawGame, this.playerService, this.packService);
+        }
+
+        return {games};
+    };
+}
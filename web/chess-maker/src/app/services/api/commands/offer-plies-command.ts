@@ -10,7 +10,7 @@ export type RawOfferPliesParameters = {
     from_col: number;
     to_row: number;
     to_col: number;
-    plies: RawPly[];
+    plies: (RawPly & {id: string})[];
 };
 
 export type OfferPliesParameters = {
@@ -62,6 +62,7 @@ export class OfferPliesCommand extends Command<RawOfferPliesParameters, OfferPli
             plies.push(new Ply(
                 rawPly.name,
                 actions,
+                rawPly.id,
             ));
         }
 
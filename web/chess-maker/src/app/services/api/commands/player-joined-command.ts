@@ -0,0 +1,28 @@
+import {Player} from "../../player/player.service";
+import {Injectable} from "@angular/core";
+import {Command} from "../command.service";
+import {RawPlayer} from "./update-players-command";
+
+export type RawPlayerJoinedParameters = {
+    version: number;
+    player_id: string;
+    player: RawPlayer;
+};
+
+export type PlayerJoinedParameters = {
+    version: number;
+    player: Player;
+};
+
+@Injectable({providedIn: 'root'})
+export class PlayerJoinedCommand extends Command<RawPlayerJoinedParameters, PlayerJoinedParameters> {
+    parse = (parameters: RawPlayerJoinedParameters): PlayerJoinedParameters => {
+        const player = new Player(
+            parameters.player_id,
+            parameters.player.display_name,
+            parameters.player.active,
+        );
+
+        return {version: parameters.version, player};
+    };
+}
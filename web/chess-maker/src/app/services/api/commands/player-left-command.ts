@@ -0,0 +1,19 @@
+import {Injectable} from "@angular/core";
+import {Command} from "../command.service";
+
+export type RawPlayerLeftParameters = {
+    version: number;
+    player_id: string;
+};
+
+export type PlayerLeftParameters = {
+    version: number;
+    id: string;
+};
+
+@Injectable({providedIn: 'root'})
+export class PlayerLeftCommand extends Command<RawPlayerLeftParameters, PlayerLeftParameters> {
+    parse = (parameters: RawPlayerLeftParameters): PlayerLeftParameters => {
+        return {version: parameters.version, id: parameters.player_id};
+    };
+}
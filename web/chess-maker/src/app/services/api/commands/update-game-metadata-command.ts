@@ -5,20 +5,41 @@ import {Color} from "../../color/color.service";
 import {PackService} from "../../pack/pack.service";
 import {Command} from "../command.service";
 
+export type RawGameMetadata = {
+    display_name: string;
+    creator: string;
+    controller_pack_id: string;
+    controller_id: string;
+    players: {[id: number]: string};
+};
+
 export type RawUpdateGameMetadataParameters = {
-    game_metadata: {[id: string]: {
-        display_name: string;
-        creator: string;
-        controller_pack_id: string;
-        controller_id: string;
-        players: {[id: number]: string};
-    }};
+    game_metadata: {[id: string]: RawGameMetadata};
 };
 
 export type UpdateGameMetadataParameters = {
     games: {[key: string]: GameMetadata};
 };
 
+export function parseGameMetadata(
+    rawGame: RawGameMetadata,
+    playerService: PlayerService,
+    packService: PackService,
+): GameMetadata {
+    const players: {[color in Color]?: Player} = {};
+
+    for (const [color, playerId] of Object.entries(rawGame.players)) {
+        players[color] = playerService.get(playerId);
+    }
+
+    return new GameMetadata(
+        rawGame.display_name,
+        playerService.get(rawGame.creator),
+        packService.getController(rawGame.controller_pack_id, rawGame.controller_id),
+        players,
+    );
+}
+
 @Injectable({providedIn: 'root'})
 export class UpdateGameMetadataCommand extends Command<RawUpdateGameMetadataParameters, UpdateGameMetadataParameters> {
     constructor(
@@ -32,18 +53,7 @@ export class UpdateGameMetadataCommand extends Command<RawUpdateGameMetadataPara
         const games: {[key: string]: GameMetadata} = {};
 
         for (const [id, rawGame] of Object.entries(parameters.game_metadata)) {
-            const players: {[color in Color]?: Player} = {};
-
-            for (const [color, playerId] of Object.entries(rawGame.players)) {
-                players[color] = this.playerService.get(playerId);
-            }
-
-            games[id] = new GameMetadata(
-                rawGame.display_name,
-                this.playerService.get(rawGame.creator),
-                this.packService.getController(rawGame.controller_pack_id, rawGame.controller_id),
-                players,
-            );
+            games[id] = parseGameMetadata(rawGame, this.playerService, this.packService);
         }
 
         return {games};
@@ -1,25 +1,31 @@
 import {Injectable} from "@angular/core";
-import {Controller, DecoratorType, Pack, PieceType} from "../../pack/pack.service";
+import {Controller, DecoratorType, Pack, PackService, PieceType} from "../../pack/pack.service";
 import {Vector2} from "../../game/game.service";
 import {Command} from "../command.service";
+import {PreferencesService} from "../../preferences/preferences.service";
 
-export type RawUpdatePackDataParameters = {
-    packs: {[id: string]: {
+type RawPacks = {[id: string]: {
+    display_name: string;
+    controllers: {[id: string]: {
         display_name: string;
-        controllers: {[id: string]: {
-            display_name: string;
-            rows: number;
-            cols: number;
-            colors: number[];
-            options: {[id: string]: any};
-        }};
-        pieces: {[id: string]: {
-            image: string;
-        }};
-        decorators: {[id: string]: {
-            image: string;
-        }};
+        rows: number;
+        cols: number;
+        colors: number[];
+        options: {[id: string]: any};
+    }};
+    pieces: {[id: string]: {
+        image_url: string;
+    }};
+    decorators: {[id: string]: {
+        // Null for decorators that are not drawn.
+        image_url: string | null;
     }};
+}};
+
+export type RawUpdatePackDataParameters = {
+    pack_hash: string;
+    // Left out when the pack data is the same as what the client has cached.
+    packs?: RawPacks;
 };
 
 export type UpdatePackDataParameters = {
@@ -28,10 +34,23 @@ export type UpdatePackDataParameters = {
 
 @Injectable({providedIn: 'root'})
 export class UpdatePackDataCommand extends Command<RawUpdatePackDataParameters, UpdatePackDataParameters> {
+    constructor(private packService: PackService, private preferencesService: PreferencesService) {
+        super();
+    }
+
     parse = (parameters: RawUpdatePackDataParameters): UpdatePackDataParameters => {
+        let rawPacks = parameters.packs;
+
+        if (rawPacks === undefined) {
+            rawPacks = JSON.parse(this.preferencesService.packs) as RawPacks;
+        } else {
+            this.preferencesService.packs = JSON.stringify(rawPacks);
+            this.preferencesService.packHash = parameters.pack_hash;
+        }
+
         const packs: {[key: string]: Pack} = {};
 
-        for (const [packId, rawPack] of Object.entries(parameters.packs)) {
+        for (const [packId, rawPack] of Object.entries(rawPacks)) {
             packs[packId] = new Pack(
                 packId,
                 rawPack.display_name,
@@ -55,7 +74,7 @@ export class UpdatePackDataCommand extends Command<RawUpdatePackDataParameters,
                 packs[packId].pieceTypes[pieceTypeId] = new PieceType(
                     pieceTypeId,
                     packs[packId],
-                    pieceType.image,
+                    this.packService.getImageUrl(pieceType.image_url),
                 );
             }
 
@@ -63,7 +82,7 @@ export class UpdatePackDataCommand extends Command<RawUpdatePackDataParameters,
                 packs[packId].decoratorTypes[decoratorTypeId] = new DecoratorType(
                     decoratorTypeId,
                     packs[packId],
-                    decoratorType.image,
+                    decoratorType.image_url === null ? null : this.packService.getImageUrl(decoratorType.image_url),
                 );
             }
         }
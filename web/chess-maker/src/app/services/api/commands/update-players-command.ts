@@ -2,14 +2,18 @@ import {Player} from "../../player/player.service";
 import {Injectable} from "@angular/core";
 import {Command} from "../command.service";
 
+export type RawPlayer = {
+    display_name: string;
+    active: boolean;
+};
+
 export type RawUpdatePlayersParameters = {
-    players: {[id: string]: {
-        display_name: string;
-        active: boolean;
-    }};
+    version: number;
+    players: {[id: string]: RawPlayer};
 };
 
 export type UpdatePlayersParameters = {
+    version: number;
     players: {[key: string]: Player};
 };
 
@@ -26,6 +30,6 @@ export class UpdatePlayersCommand extends Command<RawUpdatePlayersParameters, Up
             );
         }
 
-        return {players};
+        return {version: parameters.version, players};
     };
 }
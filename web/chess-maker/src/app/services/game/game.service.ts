@@ -7,6 +7,10 @@ import {ChatMessage} from "../chat/chat.service";
 import {AudioService} from "../audio/audio.service";
 import {CommandService, Subjects} from "../api/command.service";
 import {UpdateGameMetadataParameters} from "../api/commands/update-game-metadata-command";
+import {GameAddedParameters} from "../api/commands/game-added-command";
+import {GameChangedParameters} from "../api/commands/game-changed-command";
+import {GameRemovedParameters} from "../api/commands/game-removed-command";
+import {GamesChangedParameters} from "../api/commands/games-changed-command";
 import {UpdateGameDataParameters} from "../api/commands/update-game-data-command";
 import {UpdateDecoratorsParameters} from "../api/commands/update-decorators-command";
 import {UpdateInfoParameters} from "../api/commands/update-info-command";
@@ -129,6 +133,8 @@ export class Ply {
     constructor(
         public name: string,
         public actions: Action[],
+        // Set on plies the server offered to choose from, which are submitted by their id.
+        public id: string | null = null,
     ) {}
 }
 
@@ -207,6 +213,10 @@ export class GameService extends ItemService<Game> {
 
         commandService.ready.subscribe((subjects: Subjects) => {
             subjects.updateGameMetadata.subscribe(this.updateGameMetadata);
+            subjects.gameAdded.subscribe(this.setGameMetadata);
+            subjects.gameChanged.subscribe(this.setGameMetadata);
+            subjects.gameRemoved.subscribe(this.removeGame);
+            subjects.gamesChanged.subscribe(this.setGamesMetadata);
             subjects.updateGameData.subscribe(this.updateGameData);
             subjects.updateDecorators.subscribe(this.updateDecorators);
             subjects.updateInfo.subscribe(this.updateInfo);
@@ -252,29 +262,55 @@ export class GameService extends ItemService<Game> {
     private updateGameMetadata = (parameters: UpdateGameMetadataParameters): void => {
         for (const gameId in this.items) {
             if (!(gameId in parameters.games)) {
-                if (this.selectedGame && this.selectedGame.id == gameId) {
-                    this.selectedGame = undefined;
-                }
-                delete this.items[gameId];
+                this.deleteGame(gameId);
             }
         }
 
         for (const [id, metadata] of Object.entries(parameters.games)) {
-            if (id in this.items) {
-                this.items[id].metadata = metadata;
-            } else {
-                this.items[id] = new Game(
-                    id,
-                    metadata,
-                    new GameData(new PieceMap(), [], [], [], [], []),
-                    new RenderData(new Vector2(0, 0), Direction.NORTH, 80),
-                )
-            }
+            this.setMetadata(id, metadata);
+        }
+
+        this.updateAvailableColors();
+    };
+
+    private setGameMetadata = (parameters: GameAddedParameters | GameChangedParameters): void => {
+        this.setMetadata(parameters.id, parameters.metadata);
+        this.updateAvailableColors();
+    };
+
+    private setGamesMetadata = (parameters: GamesChangedParameters): void => {
+        // Unlike the full list, games left out here are unchanged rather than removed.
+        for (const [id, metadata] of Object.entries(parameters.games)) {
+            this.setMetadata(id, metadata);
         }
 
         this.updateAvailableColors();
     };
 
+    private removeGame = (parameters: GameRemovedParameters): void => {
+        this.deleteGame(parameters.id);
+    };
+
+    private setMetadata(id: string, metadata: GameMetadata): void {
+        if (id in this.items) {
+            this.items[id].metadata = metadata;
+        } else {
+            this.items[id] = new Game(
+                id,
+                metadata,
+                new GameData(new PieceMap(), [], [], [], [], []),
+                new RenderData(new Vector2(0, 0), Direction.NORTH, 80),
+            )
+        }
+    }
+
+    private deleteGame(id: string): void {
+        if (this.selectedGame && this.selectedGame.id == id) {
+            this.selectedGame = undefined;
+        }
+        delete this.items[id];
+    }
+
     private updateGameData = (parameters: UpdateGameDataParameters): void => {
         const game = this.items[parameters.id];
 
@@ -6,10 +6,15 @@ import {Subjects, CommandService} from "../api/command.service";
 import {UpdatePackDataParameters} from "../api/commands/update-pack-data-command";
 import {RawDecorators} from "../api/parameter-types";
 
-function getImage(rawImage: string, color: Color = Color.White): HTMLImageElement {
-    const image = new Image();
-    image.src = `data:image/svg+xml,${rawImage.replace(/white/g, SVG_COLORS[color])}`;
-    return image;
+// The raw image of decorators that are not drawn, which the server sends without an image url.
+export const NO_DRAW = 'NO DRAW';
+
+function getImageSource(rawImage: string, color: Color = Color.White): string {
+    return `data:image/svg+xml,${rawImage.replace(/white/g, SVG_COLORS[color])}`;
+}
+
+function loadRawImage(imageUrl: string): Promise<string> {
+    return fetch(imageUrl).then(response => response.text());
 }
 
 export class Pack implements Identifiable {
@@ -24,27 +29,46 @@ export class Pack implements Identifiable {
 
 export class PieceType implements Identifiable {
     images: {[color in Color]?: HTMLImageElement} = {};
+    rawImage = '';
 
     constructor(
         public id: string,
         public pack: Pack,
-        public rawImage: string,
+        public imageUrl: string,
     ) {
         for (let color = 0; color < 8; ++color) {
-            this.images[color] = getImage(rawImage, color);
+            this.images[color] = new Image();
         }
+
+        // Images are shared by every color, so the svg is downloaded once and recolored here.
+        loadRawImage(imageUrl).then(rawImage => {
+            this.rawImage = rawImage;
+
+            for (let color = 0; color < 8; ++color) {
+                this.images[color].src = getImageSource(rawImage, color);
+            }
+        });
     }
 }
 
 export class DecoratorType implements Identifiable {
-    image: HTMLImageElement;
+    image = new Image();
+    rawImage = '';
 
     constructor(
         public id: string,
         public pack: Pack,
-        public rawImage: string,
+        public imageUrl: string | null,
     ) {
-        this.image = getImage(rawImage);
+        if (imageUrl === null) {
+            this.rawImage = NO_DRAW;
+            return;
+        }
+
+        loadRawImage(imageUrl).then(rawImage => {
+            this.rawImage = rawImage;
+            this.image.src = getImageSource(rawImage);
+        });
     }
 }
 
@@ -69,10 +93,17 @@ export class PackService extends ItemService<Pack> {
         });
     }
 
+    // Where images are downloaded from, which is the server the client is connected to.
+    serverUrl = '';
+
     private updatePackData = (parameters: UpdatePackDataParameters): void => {
         this.items = parameters.packs;
     };
 
+    getImageUrl(path: string): string {
+        return `${this.serverUrl}${path}`;
+    }
+
     fillDecoratorLayers(rawDecoratorLayers: RawDecorators, decorators: {[layer: number]: Decorator[]}): void {
         for (const [layer, rawDecorators] of Object.entries(rawDecoratorLayers)) {
             if (!(layer in decorators)) {
@@ -2,6 +2,9 @@ import {Injectable} from '@angular/core';
 import {Identifiable, ItemService} from "../item-service";
 import {SetPlayerParameters} from "../api/commands/set-player-command";
 import {UpdatePlayersParameters} from "../api/commands/update-players-command";
+import {PlayerJoinedParameters} from "../api/commands/player-joined-command";
+import {PlayerChangedParameters} from "../api/commands/player-changed-command";
+import {PlayerLeftParameters} from "../api/commands/player-left-command";
 import {Subjects, CommandService} from "../api/command.service";
 
 export class Player implements Identifiable {
@@ -20,20 +23,49 @@ export class PlayerService extends ItemService<Player> {
         commandService.ready.subscribe((subjects: Subjects) => {
             subjects.setPlayer.subscribe(this.setPlayer);
             subjects.updatePlayers.subscribe(this.updatePlayers);
+            subjects.playerJoined.subscribe(this.setPlayerData);
+            subjects.playerChanged.subscribe(this.setPlayerData);
+            subjects.playerLeft.subscribe(this.removePlayer);
         });
     }
 
     currentPlayer: Player | undefined;
 
+    // Version of the player list the server last sent, so changes that are older than the full list are skipped.
+    private version = 0;
+
     private setPlayer = (parameters: SetPlayerParameters): void => {
         this.currentPlayer = parameters.player;
     };
 
     private updatePlayers = (parameters: UpdatePlayersParameters): void => {
+        this.version = parameters.version;
         this.items = parameters.players;
 
         if (this.currentPlayer) {
             this.currentPlayer = parameters.players[this.currentPlayer.id];
         }
     };
+
+    private setPlayerData = (parameters: PlayerJoinedParameters | PlayerChangedParameters): void => {
+        if (parameters.version <= this.version) return;
+        this.version = parameters.version;
+
+        const player = this.items[parameters.player.id];
+
+        if (player) {
+            // Games refer to their players, so the existing player is updated instead of replaced.
+            player.displayName = parameters.player.displayName;
+            player.active = parameters.player.active;
+        } else {
+            this.items[parameters.player.id] = parameters.player;
+        }
+    };
+
+    private removePlayer = (parameters: PlayerLeftParameters): void => {
+        if (parameters.version <= this.version) return;
+        this.version = parameters.version;
+
+        delete this.items[parameters.id];
+    };
 }
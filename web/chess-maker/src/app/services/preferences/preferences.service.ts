@@ -14,4 +14,11 @@ export class PreferencesService {
 
     set address(value: string) {localStorage.setItem('address', value);}
     set displayName(value: string) {localStorage.setItem('displayName', value);}
+
+    // The last pack data received from the server, which it skips resending while its hash is unchanged.
+    get packHash() {return localStorage.getItem('packHash');}
+    get packs() {return localStorage.getItem('packs');}
+
+    set packHash(value: string) {localStorage.setItem('packHash', value);}
+    set packs(value: string) {localStorage.setItem('packs', value);}
 }